@@ -1,25 +1,51 @@
 import json
-import requests
 from tqdm import tqdm
 from sys import argv
-from time import sleep
-from os import path, makedirs, replace
-from datetime import datetime, time
+from os import path, makedirs, remove, environ
+from datetime import datetime, time, timezone
 from pathlib import Path
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
 from ansi import ANSI
-
-API_KEY:str = open('admin/api_key.txt').read()        #  ** Replace with your API_KEY **
-USER_AGENT:str = open('admin/user_agent.txt').read()  #  ** Replace with your USER_AGENT **
+from rate_limiter import TokenBucket
+from lastfm_client import LastfmClient
+from scrobble_writer import ScrobbleWriter
+from segment_manifest import SegmentManifest
+from metadata_cache import MetadataCache, normalize
+
+# the environment variables are mainly used to point Fetch.fm at the local
+# stand-in server (see lastfm_standin.py) without needing real credentials
+API_KEY:str = environ.get('LASTFM_API_KEY') or open('admin/api_key.txt').read()        #  ** Replace with your API_KEY **
+USER_AGENT:str = environ.get('LASTFM_USER_AGENT') or open('admin/user_agent.txt').read()  #  ** Replace with your USER_AGENT **
+API_URL:str = environ.get('LASTFM_API_URL', 'https://ws.audioscrobbler.com/2.0/')
+DATA_DIR:str = environ.get('FETCHFM_DATA_DIR',
+                           path.abspath(path.join(path.dirname(__file__), '..')))
 
 USERNAME = ''
-song_length_cache = {}
+song_length_cache = {}    # {(song, artist): (song, artist, time)} w/ norm keys
+song_length_aliases = {}  # {(song, artist): key in song_length_cache}
+metadata_cache = None  # persistent MetadataCache, opened on first use
+_metadata_cache_lock = Lock()
+_prog_bar_lock = Lock()  # fetch workers adjust the shared progress bar
+ALBUM_CACHE_TTL = 86400  # seconds
+INVALID_PARAMETERS_ERROR = 6  # Last.fm's error code for unknown items
+_NOT_FOUND = {}  # sentinel returned by _fetch_metadata for unknown items
+
+FETCH_WORKERS = 4      # size of the worker pool used for parallel fetching
+REQUESTS_PER_SEC = 5   # Last.fm asks that we average <= 5 requests/second
+PAGES_PER_WINDOW = 10  # target num of pages fetched per timestamp window
+rate_limiter = TokenBucket(REQUESTS_PER_SEC, REQUESTS_PER_SEC)
+client = LastfmClient(API_URL, API_KEY, USER_AGENT, rate_limiter=rate_limiter,
+                      pool_size=FETCH_WORKERS * 2)
 
 
 # =========== [1] fetch_scrobbled_data() ====================================
 
 def fetch_scrobbled_data(username):
     '''
-    Handles the process of fetching all of the user's Last.fm data
+    Handles the process of fetching all of the user's Last.fm data. Returns
+    the path of the new segment an incremental sync saved, or None if it
+    didn't save one (e.g. for a full fetch, or if there was nothing new)
     '''
     if username == '':
         # only occurs when user ran 'python api_handler.py fetch'
@@ -37,8 +63,9 @@ def fetch_scrobbled_data(username):
     global USERNAME
     USERNAME = username
     _init_user_info_file()
-    _get_recent_tracks()
+    new_segment_file = _get_recent_tracks()
     print()
+    return new_segment_file
 
 
 def _init_user_info_file():
@@ -80,52 +107,257 @@ def _init_user_info_file():
 
 def _get_recent_tracks():
     '''
-    Retrieves all of the user's scrobbled data and stores it to a text file
+    Retrieves all of the user's scrobbled data and stores it to a text file.
+    Returns the path of the new segment an incremental sync saved (if any)
     '''
     # Inform the user the fetching process is about to begin
     print(f'\n >> {ANSI.WHITE_UNDERLINED}Please hold tight as we fetch '
           f'{USERNAME}\'s data from Last.fm!{ANSI.RESET}\n')
     # Ensure we've created the user's scrobbled_data text file
     scrobbled_data_txt_file = get_path('scrobbled_data', f'{USERNAME}.txt')
-    Path(scrobbled_data_txt_file).touch()
+    if not path.exists(scrobbled_data_txt_file):
+        Path(scrobbled_data_txt_file).touch()
+    _remove_stray_temp_file()
     ''' Begin the process of fetching data from Last.fm '''
-    page = 1
-    total_pages = _get_num_total_pages()
-    last_saved_scrob, reached = _get_last_saved_scrob(scrobbled_data_txt_file)
-    prog_bar = tqdm(total=total_pages)  # creates instance of the progress bar
-    while page <= total_pages and not reached:
-        prog_bar.update(1)
+    manifest = SegmentManifest(scrobbled_data_txt_file)
+    last_saved_uts, saved_scrobs = _get_last_saved_uts(manifest,
+                                                       scrobbled_data_txt_file)
+    if last_saved_uts is None:
+        # nothing has been saved yet, fetch the full history in parallel
+        writer = ScrobbleWriter(scrobbled_data_txt_file)
+        _get_recent_tracks_parallel(writer, writer.resume(), manifest)
+        return None
+    # only fetch what's new, saving it as a new segment
+    writer = ScrobbleWriter(manifest.next_segment_file())
+    return _get_new_recent_tracks(writer, writer.resume(), manifest,
+                                  last_saved_uts, saved_scrobs)
+
+
+def _get_new_recent_tracks(writer, checkpoint, manifest, from_uts,
+                           saved_scrobs):
+    '''
+    Retrieves only the scrobbles the user has made since their newest saved
+    scrobble (via the API's `from` parameter), one page at a time, and saves
+    them as a new segment. Older segments are never reread or rewritten.
+    Returns the new segment's path, or None if nothing was saved
+    '''
+    if (checkpoint is not None and checkpoint['mode'] == 'incremental'
+            and checkpoint['from'] == from_uts):
+        # resume the interrupted fetch from the page after the checkpoint
+        progress = checkpoint
+    else:
+        writer.discard()
+        progress = {
+            'mode': 'incremental',
+            'from': from_uts,
+            'to': int(datetime.now().timestamp()),
+            'page': 0,
+            'count': 0,
+            'newest_uts': None
+        }
+    # fixing the `to` bound keeps page boundaries stable between runs
+    total_pages = _get_num_total_pages(progress['to'], from_uts)
+    if total_pages < 0:
+        # keep any checkpoint so the next run can resume
+        writer.flush()
+        _print_fetch_failed_msg()
+        return None
+    page = progress['page'] + 1
+    prog_bar = tqdm(total=total_pages, initial=page - 1)
+    while page <= total_pages:
         payload = {
             'method': 'user.getRecentTracks',
             'limit': 200,
             'user': USERNAME,
-            'page': page
+            'page': page,
+            'from': from_uts,
+            'to': progress['to']
         }
         response = _lastfm_get(payload)
         if response is None:
             break
-        # loop through the tracks listed on this page
-        j_tracks = response.json()['recenttracks']['track']
-        reached = _write_scrobs_to_file(j_tracks, last_saved_scrob)
-        if reached:
-            ''' we've reached the last saved scrobble. now let's combine the
-                new scrobbles with the old scrobbles into a single text file
-            '''
-            temp_file = get_path('scrobbled_data', 'temp.txt')
-            with open(scrobbled_data_txt_file, 'r') as f:
-                old_scrobbles = f.read()
-            with open(temp_file, 'a') as f:
-                f.write(old_scrobbles)
-            replace(temp_file, scrobbled_data_txt_file)
-        else:
-            ''' proceed as normal '''
-            sleep(0.25)  # rate limiting
-            page += 1
-    ''' end of while-loop, terminate the progress bar '''
-    if page != total_pages:
-        # we were able to speed up the process by caching old scrobs
-        prog_bar.update(total_pages - page)
+        progress = dict(progress, page=page)
+        progress = _write_scrobs_to_file(_get_page_tracks(response), writer,
+                                         progress, from_uts, saved_scrobs)
+        prog_bar.update(1)
+        page += 1
+    prog_bar.close()
+    ''' end of while-loop, save what we've fetched '''
+    if page <= total_pages:
+        # a request failed, keep the checkpoint so the next run can resume
+        writer.flush()
+        _print_fetch_failed_msg()
+        return None
+    if progress['count'] == 0:
+        # no new scrobbles since the last sync
+        writer.discard()
+        return None
+    segment_file = manifest.next_segment_file()
+    writer.commit()
+    manifest.add_segment(segment_file, progress['count'],
+                         progress['newest_uts'])
+    return segment_file
+
+
+def _get_recent_tracks_parallel(writer, checkpoint, manifest):
+    '''
+    Retrieves the user's full scrobble history by splitting it into `from`/`to`
+    timestamp windows, which are fetched concurrently by a bounded pool of
+    workers sharing a single rate limiter. Windows are split by time (rather
+    than by page number) since page boundaries shift whenever new scrobbles
+    arrive during a long fetch
+    '''
+    if checkpoint is not None and checkpoint['mode'] == 'full':
+        # resume the interrupted fetch, recreating the exact same windows
+        progress = checkpoint
+    else:
+        writer.discard()
+        to_uts = int(datetime.now().timestamp())
+        total_pages = _get_num_total_pages(to_uts)
+        if total_pages < 0:
+            _print_fetch_failed_msg()
+            return
+        if total_pages == 0:
+            return  # nothing's been scrobbled yet
+        progress = {
+            'mode': 'full',
+            'from': _get_registered_uts(),
+            'to': to_uts,
+            'num_windows': max(FETCH_WORKERS,
+                               -(-total_pages // PAGES_PER_WINDOW)),
+            'windows_done': 0,
+            'total_pages': total_pages,
+            'pages_done': 0,
+            'count': 0,
+            'newest_uts': None
+        }
+    windows = _split_into_windows(progress['from'], progress['to'],
+                                  progress['num_windows'])
+    windows = windows[progress['windows_done']:]
+    # the page count is only an estimate until each window reports its own,
+    # so every window starts out with an even share of the pages left
+    pages_left = max(0, progress['total_pages'] - progress['pages_done'])
+    num_left = max(1, len(windows))
+    estimates = [pages_left // num_left + (i < pages_left % num_left)
+                 for i in range(len(windows))]
+    prog_bar = tqdm(total=progress['pages_done'] + pages_left,
+                    initial=progress['pages_done'])
+    completed = True
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+        futures = [pool.submit(_fetch_window, window, prog_bar, estimate)
+                   for window, estimate in zip(windows, estimates)]
+        # hand each window to the writer in order (newest window first) so the
+        # txt file stays in reverse-chronological order
+        for future in futures:
+            result = future.result()
+            if result is None:
+                # a request failed, stop here so we don't leave a gap
+                pool.shutdown(cancel_futures=True)
+                completed = False
+                break
+            j_tracks, num_pages = result
+            progress = dict(progress,
+                            windows_done=progress['windows_done'] + 1,
+                            pages_done=progress['pages_done'] + num_pages)
+            progress = _write_scrobs_to_file(j_tracks, writer, progress)
+    if completed:
+        writer.commit()
+        manifest.set_base(progress['count'], progress['newest_uts'])
+    else:
+        # keep the checkpoint so the next run can resume
+        writer.flush()
     prog_bar.close()
+    if not completed:
+        _print_fetch_failed_msg()
+
+
+def _print_fetch_failed_msg():
+    '''
+    Lets the user know a request to Last.fm failed partway through a fetch
+    '''
+    print('\n * Sorry, but a request to Last.fm failed. Everything fetched '
+          'so far has been kept, run a sync again to pick up from there')
+
+
+def _fetch_window(window, prog_bar, estimate):
+    '''
+    Fetches every page of scrobbles within the given (from, to) window. Returns
+    a tuple of the window's tracks (sorted newest-first) and the number of
+    pages fetched, or None if a request failed. The window's `estimate` of
+    pages on the progress bar is swapped for its real page count as soon as
+    the first page arrives
+    '''
+    start, end = window
+    j_window_tracks = []
+    page = 1
+    total_pages = 1
+    while page <= total_pages:
+        payload = {
+            'method': 'user.getRecentTracks',
+            'limit': 200,
+            'user': USERNAME,
+            'page': page,
+            'from': max(0, start - 1),  # widened by a second on both ends,
+            'to': end                   # the exact bounds get enforced below
+        }
+        response = _lastfm_get(payload)
+        if response is None:
+            return None
+        j_recenttracks = response.json()['recenttracks']
+        total_pages = int(j_recenttracks['@attr']['totalPages'])
+        if page == 1:
+            with _prog_bar_lock:
+                prog_bar.total += max(1, total_pages) - estimate
+                prog_bar.refresh()
+        for track in _get_page_tracks(response):
+            date = track.get('date')
+            if date is not None and start <= int(date['uts']) < end:
+                j_window_tracks.append(track)
+        prog_bar.update(1)
+        page += 1
+    j_window_tracks.sort(key=lambda track: int(track['date']['uts']),
+                         reverse=True)
+    return j_window_tracks, page - 1
+
+
+def _split_into_windows(from_uts, to_uts, num_windows):
+    '''
+    Splits the range [from_uts, to_uts) into `num_windows` equally sized
+    timestamp windows, returned as a list of (start, end) tuples ordered
+    newest-first. The oldest window is left open-ended (starts at 0) so that
+    scrobbles predating the user's registration aren't lost, and the newest
+    window ends a second after `to_uts` so that a scrobble at exactly
+    `to_uts` isn't either
+    '''
+    span = max(1, to_uts - from_uts)
+    step = max(1, -(-span // num_windows))  # ceiling division
+    windows = []
+    start = from_uts
+    while start < to_uts:
+        end = min(start + step, to_uts)
+        windows.append((start, end))
+        start = end
+    if not windows:
+        windows.append((from_uts, to_uts))
+    windows[0] = (0, windows[0][1])
+    windows[-1] = (windows[-1][0], to_uts + 1)
+    windows.reverse()
+    return windows
+
+
+def _get_registered_uts():
+    '''
+    Returns the unix timestamp of when the user registered with Last.fm, which
+    is used as the lower bound of the parallel fetch
+    '''
+    response = _lastfm_get({
+        'method': 'user.getInfo',
+        'user': USERNAME
+    })
+    if response is None:
+        return 0
+    j_registered = response.json()['user'].get('registered', {})
+    return int(j_registered.get('unixtime', 0))
 
 
 def _get_username():
@@ -141,11 +373,17 @@ def _get_username():
     return user_input
 
 
-def _write_scrobs_to_file(j_tracks, last_saved_scrob):
+def _write_scrobs_to_file(j_tracks, writer, progress, after_uts=None,
+                          saved_scrobs=frozenset()):
     '''
     Receives as input a list of tracks (in json) and aims to convert each into
-    the 'scrobble' format and write it into the user's scrobbled_data txt file
+    the 'scrobble' format and hand them to the writer as a single page. Only
+    tracks scrobbled after `after_uts` (and not found in `saved_scrobs`) are
+    kept. Returns the progress dict updated with the scrobble count and the
+    newest `uts` written so far
     '''
+    lines = []
+    newest_uts = progress.get('newest_uts')
     for track in j_tracks:
         album = track['album']['#text']
         artist = track['artist']['#text']
@@ -153,35 +391,57 @@ def _write_scrobs_to_file(j_tracks, last_saved_scrob):
         date = track.get('date')  # check that this scrob contains 'date' key
         if date is not None:
             # this disregards tracks that are currently being scrobbled
+            uts = int(date['uts'])
+            if after_uts is not None and uts <= after_uts:
+                continue  # we already have this scrobble saved
             date = date['#text']
             scrob = date + '\t' + artist + '\t' + album + '\t' + song
-            if last_saved_scrob is None:
-                # case 1: append scrobbles to user's txt file as expected
-                scrobbled_data_txt_file = get_path('scrobbled_data', 
-                                                   f'{USERNAME}.txt')
-                with open(scrobbled_data_txt_file, 'a') as f:
-                    f.write(f'{scrob}\n')   
-            else:
-                # case 2: append new scrobbles to a temp txt file until the
-                #           current scrob equals the last_saved_scrob
-                if scrob == last_saved_scrob:
-                    return True
-                temp_txt_file = get_path('scrobbled_data', 'temp.txt')
-                with open(temp_txt_file, 'a') as f:
-                    f.write(f'{scrob}\n')
-    return False
+            if scrob in saved_scrobs:
+                continue
+            lines.append(scrob)
+            if newest_uts is None or uts > newest_uts:
+                newest_uts = uts
+    progress = dict(progress, count=progress.get('count', 0) + len(lines),
+                    newest_uts=newest_uts)
+    writer.write_page(lines, progress)
+    return progress
+
+
+def _get_page_tracks(response):
+    '''
+    Returns the list of tracks (in json) from a `user.getRecentTracks` page
+    '''
+    j_tracks = response.json()['recenttracks']['track']
+    if isinstance(j_tracks, dict):
+        # Last.fm returns a lone track as an object rather than a list
+        j_tracks = [j_tracks]
+    return j_tracks
 
 
-def _get_num_total_pages():
+def _remove_stray_temp_file():
     '''
-    Returns the user's overall `totalPages` used to instantiate progress bar
+    Older versions of Fetch.fm staged new scrobbles in scrobbled_data/temp.txt,
+    which an interrupted run could leave behind. Remove it if it's there
+    '''
+    temp_txt_file = get_path('scrobbled_data', 'temp.txt')
+    if path.exists(temp_txt_file):
+        remove(temp_txt_file)
+
+
+def _get_num_total_pages(to_uts, from_uts=None):
+    '''
+    Returns the user's overall `totalPages` (counting only scrobbles made
+    within the given timestamps) used to instantiate progress bar
     '''
     payload = {
         'method': 'user.getRecentTracks',
         'limit': 200,
         'user': USERNAME,
-        'page': 1
+        'page': 1,
+        'to': to_uts
     }
+    if from_uts is not None:
+        payload['from'] = from_uts
     response = _lastfm_get(payload)
     if response is None:
         return -1
@@ -189,20 +449,32 @@ def _get_num_total_pages():
     return int(j_recenttracks['@attr']['totalPages'])
 
 
-def _get_last_saved_scrob(scrobbled_data_txt_file):
+def _get_last_saved_uts(manifest, scrobbled_data_txt_file):
     '''
     In order to only make API calls for those scrobbles which we don't already
-    have saved in the user's scrobbled_data txt file, let's store the 'last 
-    saved scrobble' into a variable so that we can check if we've reached the
-    point in the fetching process where we can stop making API calls since we
-    already have the rest of the remaining scrobbled data
-    '''
+    have saved, returns a tuple containing...
+        - `int`: `uts` of the newest saved scrobble (None if nothing's saved)
+        - `set`: saved scrobbles which may share that `uts`
+    Data saved before the manifest existed only has minute precision, so the
+    newest minute's scrobbles are returned to filter out duplicates
+    '''
+    newest_uts = manifest.get_newest_uts()
+    if newest_uts is not None:
+        return newest_uts, frozenset()
     with open(scrobbled_data_txt_file, 'r') as f:
-        last_saved = f.readline().strip()
-    if last_saved == '':
-        return None, False
-    # we assume that the read-in scrobble is formatted correctly
-    return last_saved, False
+        last_saved = f.readline().rstrip('\n')
+        if last_saved == '':
+            return None, frozenset()
+        # we assume that the read-in scrobble is formatted correctly
+        date_text = last_saved.split('\t')[0]
+        saved_scrobs = {last_saved}
+        for line in f:
+            if line.split('\t')[0] != date_text:
+                break
+            saved_scrobs.add(line.rstrip('\n'))
+    term = datetime.strptime(date_text, '%d %b %Y, %H:%M')
+    minute_uts = int(term.replace(tzinfo=timezone.utc).timestamp())
+    return minute_uts - 1, frozenset(saved_scrobs)
 
 
 # =========== [2] artist.getCorrection ======================================
@@ -210,12 +482,15 @@ def _get_last_saved_scrob(scrobbled_data_txt_file):
 def fetch_artist_name_corrected(artist) -> tuple[str, bool]:
     '''
     Makes an API request to check if the supplied artist has a correction to a 
-    canonical Last.fm artist
+    canonical Last.fm artist (results are kept in the metadata cache)
     -----
     Returns a tuple containing...
         - `str`: artist name (formatted correctly if found)
         - `bool`: indicates if the returned artist name is formatted correctly
     '''
+    found, value = _get_metadata_cache().get('artist.getCorrection', artist)
+    if found:
+        return value['artist'], value['corrected']
     payload = {
         'method': 'artist.getCorrection',
         'artist': artist
@@ -226,17 +501,24 @@ def fetch_artist_name_corrected(artist) -> tuple[str, bool]:
     # Now let's check if the JSON response actually contains desired fields
     j_res = response.json()
     if 'corrections' not in j_res or 'correction' not in j_res['corrections']:
-        return artist, False
-    # If we get here, we have a valid JSON response with desired fields
-    formatted_artist = j_res['corrections']['correction']['artist']['name']
-    return formatted_artist, True
+        result = artist, False
+    else:
+        # If we get here, we have a valid JSON response with desired fields
+        formatted_artist = j_res['corrections']['correction']['artist']['name']
+        result = formatted_artist, True
+    _get_metadata_cache().put('artist.getCorrection', artist, '',
+                              {'artist': result[0], 'corrected': result[1]})
+    return result
     
 
 # =========== [3] track.getInfo / album.getInfo =============================
     
-def fetch_song_duration(song, artist, user) -> tuple[str, str, time]:
+def fetch_song_duration(song, artist, user, artist_is_corrected=False) \
+        -> tuple[str, str, time]:
     '''
     Makes an API request to retrieve the song length for the provided track.
+    Pass `artist_is_corrected` when the artist name has already been through
+    fetch_artist_name_corrected() to skip that extra lookup
     -----
     Returns a tuple containing...
         - `str`: song name (formatted correctly if found)
@@ -244,15 +526,24 @@ def fetch_song_duration(song, artist, user) -> tuple[str, str, time]:
         - `time`: track length (as a datetime.time object)
     '''
     # check the track length cache to see if we've made this request before
-    if song_length_cache:
-        for (cache_song, cache_artist), time_obj in song_length_cache.items():
-            if (cache_song.lower() == song.lower() and
-                    cache_artist.lower() == artist.lower()):
-                # we found a match for the given request
-                return cache_song, cache_artist, time_obj
+    cached = _lookup_song_length(song, artist)
+    if cached is not None:
+        return cached
+    # next, check the persistent metadata cache (from previous sessions)
+    cache = _get_metadata_cache()
+    found, value = cache.get('track.getInfo', song, artist)
+    if found:
+        if value is None:
+            # Last.fm didn't know about this track last time we asked
+            return song, artist, None
+        time_obj = _create_time_obj_from_seconds(value['seconds'])
+        return _store_song_length(song, artist, value['song'],
+                                  value['artist'], time_obj)
     ''' if we get here, make an API request for a track we haven't cached '''
-    j_response = _fetch_song_metadata(song, artist, user)
-    if j_response is None:
+    j_response = _fetch_song_metadata(song, artist, user, artist_is_corrected)
+    if j_response is _NOT_FOUND:
+        cache.put('track.getInfo', song, artist, None)
+    if not j_response:
         return song, artist, None
     ''' if we get here, we know we have a valid json format '''
     duration = j_response['track']['duration']
@@ -260,8 +551,17 @@ def fetch_song_duration(song, artist, user) -> tuple[str, str, time]:
     retrieved_song = j_response['track']['name']
     retrieved_artist = j_response['track']['artist']['name']
     time_obj = _create_time_obj_from_milliseconds(duration)
-    # store the successful track length info into the cache
-    song_length_cache[(retrieved_song, retrieved_artist)] = time_obj
+    # store the successful track length info into the caches, under both the
+    # requested and corrected names
+    _store_song_length(song, artist, retrieved_song, retrieved_artist,
+                       time_obj)
+    value = {
+        'song': retrieved_song,
+        'artist': retrieved_artist,
+        'seconds': int(duration) / 1000
+    }
+    cache.put('track.getInfo', song, artist, value)
+    cache.put('track.getInfo', retrieved_song, retrieved_artist, value)
     return retrieved_song, retrieved_artist, time_obj
     
 
@@ -275,39 +575,98 @@ def fetch_album_duration(album, artist, user) -> tuple[str, str, dict, int]:
         - `dict`: track listings of the form {song_name: datetime.time obj}
         - `int`: user's playcount for the album
     '''
+    cache = _get_metadata_cache()
+    found, value = cache.get('album.getInfo', album, artist)
+    if found:
+        if value is None:
+            return album, artist, None, 0
+        result = {song_name: _create_time_obj_from_seconds(seconds)
+                  for song_name, seconds in value['tracks']}
+        return value['album'], value['artist'], result, value['userplaycount']
     j_response = _fetch_album_metadata(album, artist, user)
-    if j_response is None:
+    if j_response is _NOT_FOUND:
+        cache.put('album.getInfo', album, artist, None)
+    if not j_response:
         return album, artist, None, 0
     ''' if we get here, we know we have a valid json format '''
     j_album = j_response['album']
     track_list = j_album['tracks']['track']  # python list
     result = {}
+    tracks = []
     for track in track_list:
         # find the duration of each track in the track list
         song_name = track['name']
         song_duration = 0 if track['duration'] is None else track['duration']
         result[song_name] = _create_time_obj_from_seconds(song_duration)
+        tracks.append((song_name, int(song_duration)))
     corrected_album = j_album['name']
     corrected_artist = j_album['artist']
     userplaycount = j_album['userplaycount']
+    # the user's playcount goes stale quickly, so keep album info for a day
+    value = {
+        'album': corrected_album,
+        'artist': corrected_artist,
+        'tracks': tracks,
+        'userplaycount': userplaycount
+    }
+    cache.put('album.getInfo', album, artist, value, ALBUM_CACHE_TTL)
     return corrected_album, corrected_artist, result, userplaycount
 
 
-def _fetch_song_metadata(song, artist, user):
-    return _fetch_metadata('track.getInfo', song, artist, user)
+def _lookup_song_length(song, artist):
+    '''
+    Looks up the track length cache by normalized (song, artist), following
+    any recorded alias (i.e. a misspelling Last.fm autocorrected). Returns the
+    cached (song, artist, time) tuple, or None if it isn't cached
+    '''
+    key = song_length_aliases.get((normalize(song), normalize(artist)))
+    if key is None:
+        return None
+    return song_length_cache.get(key)
+
+
+def _store_song_length(song, artist, retrieved_song, retrieved_artist,
+                       time_obj):
+    '''
+    Stores a track length under the corrected (song, artist) spelling and
+    records the requested spelling as an alias of it. Returns the entry
+    '''
+    key = (normalize(retrieved_song), normalize(retrieved_artist))
+    entry = (retrieved_song, retrieved_artist, time_obj)
+    song_length_cache[key] = entry
+    song_length_aliases[key] = key
+    song_length_aliases[(normalize(song), normalize(artist))] = key
+    return entry
+
+
+def metadata_cache_stats() -> dict:
+    '''
+    Returns the hit/miss statistics of the persistent metadata cache
+    '''
+    return _get_metadata_cache().stats()
+
+
+def _fetch_song_metadata(song, artist, user, artist_is_corrected=False):
+    return _fetch_metadata('track.getInfo', song, artist, user,
+                           artist_is_corrected)
     
 
 def _fetch_album_metadata(album, artist, user):
     return _fetch_metadata('album.getInfo', album, artist, user)
 
 
-def _fetch_metadata(method, item, artist, user) -> json:
+def _fetch_metadata(method, item, artist, user, artist_is_corrected=False) \
+        -> json:
     '''
     Makes an API request to retrieve the Last.fm metadata for the given item; 
-    currently item must either be a 'song' or 'album' name
+    currently item must either be a 'song' or 'album' name. Returns None if
+    the request failed, or `_NOT_FOUND` if Last.fm doesn't know the item
     '''
     item_key = 'track' if method == 'track.getInfo' else 'album'
-    formatted_artist = fetch_artist_name_corrected(artist)[0]
+    if artist_is_corrected:
+        formatted_artist = artist
+    else:
+        formatted_artist = fetch_artist_name_corrected(artist)[0]
     payload = {
         'method': method,
         item_key: item,
@@ -315,10 +674,31 @@ def _fetch_metadata(method, item, artist, user) -> json:
         'username': user,
         'autocorrect': True
     }
-    response = _lastfm_get(payload)
-    if response is None or item_key not in response.json():
+    response = client.get(payload)
+    if response is None:
         return None
-    return response.json()
+    try:
+        j_res = response.json()
+    except ValueError:
+        return None
+    if not _is_api_error(response) and item_key in j_res:
+        return j_res
+    if j_res.get('error') == INVALID_PARAMETERS_ERROR:
+        # this is how Last.fm reports an item it doesn't know about
+        return _NOT_FOUND
+    return None
+
+
+def _get_metadata_cache() -> MetadataCache:
+    '''
+    Returns the persistent metadata cache, opening it on first use
+    '''
+    global metadata_cache
+    with _metadata_cache_lock:  # lookups may come from several threads
+        if metadata_cache is None:
+            cache_file = get_path('cache', 'metadata.sqlite3')
+            metadata_cache = MetadataCache(cache_file)
+    return metadata_cache
 
 
 def _create_time_obj_from_seconds(seconds):
@@ -343,11 +723,9 @@ def _create_time_obj_from_milliseconds(milliseconds):
 def get_path(subdir, file):
     '''
     Returns the absolute path for a newly created file in the specified 
-    subdirectory
+    subdirectory (of the repo root, unless FETCHFM_DATA_DIR says otherwise)
     '''
-    scripts_dir = path.dirname(__file__)
-    parent_path = path.abspath(path.join(scripts_dir, '..'))
-    subdir_path = path.join(parent_path, subdir)
+    subdir_path = path.join(DATA_DIR, subdir)
     if not path.exists(subdir_path):
         # If the subdirectory doesn't exist, create it dynamically
         makedirs(subdir_path)
@@ -388,16 +766,10 @@ def get_ansi_bytey(ansi, aligned):
 
 def _lastfm_get(payload):
     '''
-    Generalized function for making a Last.fm API request
+    Generalized function for making a Last.fm API request (the shared client
+    handles connection pooling, timeouts, retries and rate limiting)
     '''
-    # Define headers and URL
-    headers = {'user-agent': USER_AGENT}
-    url = 'https://ws.audioscrobbler.com/2.0/'
-    # Add API key and format to the payload
-    payload['api_key'] = API_KEY
-    payload['format'] = 'json'
-    # Generate the request
-    response = requests.get(url, headers=headers, params=payload)
+    response = client.get(payload)
     if _is_api_error(response):
         return None
     return response
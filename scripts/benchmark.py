@@ -0,0 +1,432 @@
+import argparse
+from os import environ
+from io import StringIO
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import perf_counter
+from contextlib import redirect_stdout, redirect_stderr
+
+
+'''
+------------------------------------------------------------------------------
+Benchmarks and load harnesses for Fetch.fm. Run `python benchmark.py -h` for
+the list of available benchmarks, e.g.
+    python benchmark.py fetch --sizes 1000 10000 100000 --latency 0.02
+    python benchmark.py parse --lines 1000000
+    python benchmark.py memory --lines 1000000
+    python benchmark.py startup --lines 1000000
+    python benchmark.py ingest --sizes 250000 500000 1000000 2000000
+    python benchmark.py parallel --lines 4000000 --workers 2 4 8
+------------------------------------------------------------------------------
+'''
+
+
+# =========== [1] fetch: =====================================================
+
+def bench_fetch(args):
+    '''
+    Drives fetch_scrobbled_data() against the local Last.fm stand-in server
+    for histories of different sizes, reporting pages/sec, requests/sec and
+    total wall time for a full fetch followed by an incremental sync
+    '''
+    data_dir = mkdtemp(prefix='fetchfm_bench_')
+    # these need to be set before api_handler gets imported
+    environ['FETCHFM_DATA_DIR'] = data_dir
+    environ['LASTFM_API_KEY'] = 'standin'
+    environ['LASTFM_USER_AGENT'] = 'standin'
+    import api_handler
+    from lastfm_client import LastfmClient
+    from rate_limiter import TokenBucket
+    from segment_manifest import SegmentManifest
+    from lastfm_standin import StandinServer, SyntheticHistory
+    api_handler.FETCH_WORKERS = args.workers
+    print(f'{"scrobbles":>10} {"sync":>12} {"pages":>7} {"requests":>9} '
+          f'{"wall (s)":>9} {"pages/s":>8} {"req/s":>8} {"retries":>8} '
+          f'{"ok":>3}')
+    try:
+        for size in args.sizes:
+            history = SyntheticHistory(size, seed=size)
+            server = StandinServer(history, latency=args.latency,
+                                   error_rate=args.error_rate,
+                                   rate_limit=args.server_rate_limit).start()
+            rate_limiter = TokenBucket(args.rate, args.rate)
+            api_handler.rate_limiter = rate_limiter
+            api_handler.client = LastfmClient(
+                server.url, 'standin', 'standin', rate_limiter=rate_limiter,
+                pool_size=args.workers * 2, backoff_base=0.05, backoff_cap=1)
+            username = f'standin_{size}'
+            txt_file = api_handler.get_path('scrobbled_data', f'{username}.txt')
+            num_new = max(1, size // 100)
+            for sync in ('full', 'incremental'):
+                if sync == 'incremental':
+                    history.add_scrobbles(num_new)
+                server.reset_stats()
+                retries = api_handler.client.stats()['retries']
+                start = perf_counter()
+                with redirect_stdout(StringIO()), redirect_stderr(StringIO()):
+                    api_handler.fetch_scrobbled_data(username)
+                wall = perf_counter() - start
+                stats = server.stats()
+                num_pages = stats.get('user.getRecentTracks', 0)
+                num_requests = stats.get('requests', 0)
+                # what got saved has to match the history line for line
+                saved = [f'{line}\n' for line
+                         in SegmentManifest(txt_file).iter_lines()]
+                matches = saved == history.lines()
+                retries = api_handler.client.stats()['retries'] - retries
+                print(f'{size:>10,} {sync:>12} {num_pages:>7,} '
+                      f'{num_requests:>9,} {wall:>9.2f} '
+                      f'{num_pages / wall:>8.1f} {num_requests / wall:>8.1f} '
+                      f'{retries:>8,} {"✓" if matches else "✗":>3}')
+            api_handler.client.close()
+            server.stop()
+    finally:
+        rmtree(data_dir, ignore_errors=True)
+
+
+# =========== [2] parse: =====================================================
+
+def bench_parse(args):
+    '''
+    Compares parsing a scrobbled_data txt file one Scrobble per line the way
+    Catalog used to (with the original Scrobble, see parse_line_before)
+    against today's slimmer Scrobble and the bulk parser, in lines/sec. The
+    speedup is the bulk parser's over the original per-line parse
+    '''
+    from datetime import datetime, date, time
+    from scrobble import Scrobble
+    from track_info import TrackInfo
+    from scrobble_parser import parse_file, parse_lines
+    data_dir = mkdtemp(prefix='fetchfm_bench_')
+    try:
+        txt_file = _make_txt_file(data_dir, args.lines)
+        with open(txt_file, 'r') as f:
+            lines = f.readlines()
+        print(f'{"parser":>28} {"lines":>11} {"secs":>7} {"lines/sec":>11}')
+        timings = {}
+        MONTHS_BEFORE = ['', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul',
+                         'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+        def parse_line_before(line):
+            # the same work per line as the original Scrobble.__init__ did:
+            # a month lookup by list index, a datetime, date and time per
+            # line and an un-interned TrackInfo (None if info is missing)
+            data = line.split()
+            day = int(data[0])
+            month = MONTHS_BEFORE.index(data[1])
+            year = int(data[2][:4])
+            hour = int(data[3][:2])
+            minute = int(data[3][3:5])
+            data = line.split('\t')
+            if '' in data:
+                return None
+            return (datetime(year, month, day, hour, minute),
+                    date(year, month, day), time(hour, minute),
+                    TrackInfo(data[1], data[2], data[3][:-1]))
+
+        for name, parse in (
+                ('original Scrobble per line', lambda: [
+                    scrob for scrob in map(parse_line_before, lines)
+                    if scrob is not None]),
+                ('Scrobble per line', lambda: [
+                    scrob for scrob in map(Scrobble, lines)
+                    if scrob.is_valid]),
+                ('bulk (lines)', lambda: parse_lines(lines)),
+                ('bulk (file, incl. read)', lambda: parse_file(txt_file))):
+            start = perf_counter()
+            num_parsed = len(parse())
+            secs = perf_counter() - start
+            timings[name] = secs
+            print(f'{name:>28} {num_parsed:>11,} {secs:>7.2f} '
+                  f'{len(lines) / secs:>11,.0f}')
+        speedup = (timings['original Scrobble per line']
+                   / timings['bulk (lines)'])
+        print(f'bulk parser speedup over the original per-line parse: '
+              f'{speedup:.1f}x')
+    finally:
+        rmtree(data_dir, ignore_errors=True)
+
+
+# =========== [3] memory: ====================================================
+
+def bench_memory(args):
+    '''
+    Reports the memory used per scrobble (in bytes) by each of the ways a
+    history can be held in memory
+    '''
+    import gc
+    import tracemalloc
+    from os import path
+    from scrobble import Scrobble
+    from scrobble_parser import parse_file
+    from columnar_store import write_columns, open_columns
+    data_dir = mkdtemp(prefix='fetchfm_bench_')
+    try:
+        txt_file = _make_txt_file(data_dir, args.lines)
+        col_file = path.join(data_dir, 'standin.cols')
+        write_columns(parse_file(txt_file), col_file)
+        with open(txt_file, 'r') as f:
+            lines = f.readlines()
+
+        def measure(build):
+            gc.collect()
+            tracemalloc.start()
+            result = build()
+            used, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            return used, result
+
+        columns = open_columns(col_file)
+        print(f'{"representation":>32} {"bytes/scrobble":>15}')
+        for name, build in (
+                ('Scrobble per line', lambda: [
+                    scrob for scrob in map(Scrobble, lines)
+                    if scrob.is_valid]),
+                ('columns (parsed)', lambda: parse_file(txt_file)),
+                ('columns (mmap, excl. page cache)',
+                 lambda: open_columns(col_file)),
+                ('Scrobbles from columns', lambda: [
+                    columns.scrobble(i) for i in range(len(columns))])):
+            used, _ = measure(build)
+            print(f'{name:>32} {used / len(lines):>15.1f}')
+        print(f'{"columnar file on disk":>32} '
+              f'{path.getsize(col_file) / len(lines):>15.1f}')
+    finally:
+        rmtree(data_dir, ignore_errors=True)
+
+
+def _make_txt_file(data_dir, num_lines) -> str:
+    '''
+    Writes a synthetic scrobbled_data txt file with the given number of lines
+    and returns its path
+    '''
+    from os import path
+    from lastfm_standin import SyntheticHistory
+    txt_file = path.join(data_dir, 'standin.txt')
+    with open(txt_file, 'w') as f:
+        f.writelines(SyntheticHistory(num_lines, avg_gap_secs=300).lines())
+    return txt_file
+
+
+# =========== [4] startup: ===================================================
+
+def bench_startup(args):
+    '''
+    Times launching fetchfm (building or loading the catalog, the way
+    fetchfm._create_catalog does) right after a sync and on unchanged data,
+    along with the first round of queries and saving the snapshot on exit
+    '''
+    environ['LASTFM_API_KEY'] = environ.get('LASTFM_API_KEY', 'standin')
+    environ['LASTFM_USER_AGENT'] = environ.get('LASTFM_USER_AGENT', 'standin')
+    from os import path, utime
+    from catalog import Catalog
+    from columnar_store import convert_txt_file, needs_conversion, \
+        default_col_file, txt_fingerprint
+    from snapshot_store import default_snapshot_file
+    data_dir = mkdtemp(prefix='fetchfm_bench_')
+    try:
+        txt_file = _make_txt_file(data_dir, args.lines)
+        col_file = default_col_file(txt_file)
+        snapshot_file = default_snapshot_file(col_file)
+
+        def launch():
+            if needs_conversion(txt_file):
+                fingerprint = txt_fingerprint(txt_file)
+                convert_txt_file(txt_file)
+                catalog = Catalog.open('standin', col_file)
+                catalog.save_snapshot(snapshot_file, fingerprint)
+            else:
+                catalog = Catalog.open('standin', col_file)
+            return catalog
+
+        def first_queries(catalog):
+            catalog.num_plays_for_song('Song 1')
+            catalog.num_plays_for_artist('Artist 1')
+            catalog.num_plays_for_album_on_date('Album 1', 1, 1, 2024)
+            catalog.most_streamed_day_for_artist('Artist 1')
+            catalog.most_consecutive_song()
+            catalog.top_artists(10)
+
+        print(f'{"launch":>24} {"launch secs":>12} {"queries secs":>13} '
+              f'{"exit secs":>10}')
+        for name in ('after a sync', 'unchanged data', 'after a sync (touch)',
+                     'unchanged data'):
+            if name.endswith('(touch)'):
+                utime(txt_file)
+            start = perf_counter()
+            catalog = launch()
+            launch_secs = perf_counter() - start
+            start = perf_counter()
+            with redirect_stdout(StringIO()):
+                first_queries(catalog)
+            queries_secs = perf_counter() - start
+            # the indexes the queries built get saved on exit
+            start = perf_counter()
+            catalog.save_snapshot(snapshot_file, txt_fingerprint(txt_file))
+            print(f'{name:>24} {launch_secs:>12.3f} {queries_secs:>13.3f} '
+                  f'{perf_counter() - start:>10.3f}')
+        print(f'snapshot on disk: {path.getsize(snapshot_file) / 2**20:.1f} MiB')
+    finally:
+        rmtree(data_dir, ignore_errors=True)
+
+
+# =========== [5] ingest: ====================================================
+
+def bench_ingest(args):
+    '''
+    Measures the peak memory of loading a history by reading every line up
+    front (f.readlines(), the way fetchfm used to) against streaming the file
+    into the parser in byte chunks
+    '''
+    import multiprocessing
+    from os import path
+    # every file is generated and every load run in a fresh process, so the
+    # peak RSS of a load is its own (Linux carries it over fork and exec)
+    context = multiprocessing.get_context('spawn')
+    data_dir = mkdtemp(prefix='fetchfm_bench_')
+    try:
+        print(f'{"loader":>10} {"scrobbles":>11} {"file MiB":>9} '
+              f'{"peak RSS MiB":>13} {"columns MiB":>12} '
+              f'{"transient MiB":>14}')
+        for size in args.sizes:
+            with context.Pool(1) as pool:
+                txt_file = pool.apply(_make_txt_file, (data_dir, size))
+            file_mib = path.getsize(txt_file) / 2**20
+            for loader in ('readlines', 'streamed'):
+                with context.Pool(1) as pool:
+                    num_rows, peak_rss, retained, peak = pool.apply(
+                        _measure_load, (loader, txt_file, args.chunk_size))
+                print(f'{loader:>10} {num_rows:>11,} {file_mib:>9.1f} '
+                      f'{peak_rss / 2**20:>13.1f} {retained / 2**20:>12.1f} '
+                      f'{(peak - retained) / 2**20:>14.1f}')
+        print('transient: memory only held while loading (the text and the '
+              'parser\'s name dictionaries)')
+    finally:
+        rmtree(data_dir, ignore_errors=True)
+
+
+def _measure_load(loader, txt_file, chunk_size) -> tuple:
+    '''
+    Loads the txt file into columns the given way. Returns the number of
+    rows, the process' peak RSS, and the memory (traced by tracemalloc) the
+    columns retain and the load peaked at, all in bytes
+    '''
+    import sys
+    import resource
+    import tracemalloc
+    from scrobble_parser import parse_lines, iter_file_lines
+    tracemalloc.start()
+    if loader == 'readlines':
+        with open(txt_file, 'r') as f:
+            lines = f.readlines()
+        columns = parse_lines(lines)
+        del lines
+    else:
+        columns = parse_lines(iter_file_lines(txt_file, chunk_size))
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        peak_rss *= 1024  # Linux reports KiB, macOS bytes
+    return len(columns), peak_rss, retained, peak
+
+
+# =========== [6] parallel: ==================================================
+
+def bench_parallel(args):
+    '''
+    Times parsing a large history serially against parsing it in shards
+    with pools of 2, 4, ... worker processes, in lines/sec
+    '''
+    from os import cpu_count
+    import scrobble_parser
+    from scrobble_parser import parse_files
+    data_dir = mkdtemp(prefix='fetchfm_bench_')
+    try:
+        txt_file = _make_txt_file(data_dir, args.lines)
+        num_cores = cpu_count() or 1
+        pool_sizes = args.workers or [1 << i for i in range(
+            1, max(2, num_cores.bit_length()))]
+        # shard even a small file, so that the pool is what's measured
+        scrobble_parser.PARALLEL_MIN_BYTES = 0
+        print(f'{num_cores} cores')
+        print(f'{"workers":>8} {"lines":>11} {"secs":>7} {"lines/sec":>11} '
+              f'{"speedup":>8}')
+        serial_secs = None
+        for workers in [1, *pool_sizes]:
+            start = perf_counter()
+            columns = parse_files([txt_file], workers=workers)
+            secs = perf_counter() - start
+            serial_secs = serial_secs or secs
+            label = 'serial' if workers == 1 else workers
+            print(f'{label:>8} {len(columns):>11,} {secs:>7.2f} '
+                  f'{len(columns) / secs:>11,.0f} '
+                  f'{serial_secs / secs:>7.1f}x')
+    finally:
+        rmtree(data_dir, ignore_errors=True)
+
+
+# =========== [7] Main: ======================================================
+
+def main():
+    parser = argparse.ArgumentParser(description='Fetch.fm benchmarks')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+    fetch = subparsers.add_parser(
+        'fetch', help='time a full fetch and an incremental sync against the '
+        'local Last.fm stand-in')
+    fetch.add_argument('--sizes', type=int, nargs='+',
+                       default=[1_000, 10_000, 100_000],
+                       help='history sizes (num of scrobbles) to fetch')
+    fetch.add_argument('--latency', type=float, default=0.02,
+                       help='seconds the stand-in delays every response by')
+    fetch.add_argument('--error-rate', type=float, default=0.0,
+                       help='fraction of requests answered with an error')
+    fetch.add_argument('--server-rate-limit', type=float, default=None,
+                       help='requests/sec the stand-in allows (error 29)')
+    fetch.add_argument('--rate', type=float, default=1000,
+                       help='requests/sec allowed by the client side limiter')
+    fetch.add_argument('--workers', type=int, default=4,
+                       help='size of the parallel fetch worker pool')
+    fetch.set_defaults(func=bench_fetch)
+    parse = subparsers.add_parser(
+        'parse', help='compare parsing one Scrobble per line against the '
+        'bulk parser')
+    parse.add_argument('--lines', type=int, default=1_000_000,
+                       help='number of lines in the synthetic txt file')
+    parse.set_defaults(func=bench_parse)
+    memory = subparsers.add_parser(
+        'memory', help='report the memory used per scrobble by each way of '
+        'holding a history')
+    memory.add_argument('--lines', type=int, default=1_000_000,
+                        help='number of scrobbles in the synthetic history')
+    memory.set_defaults(func=bench_memory)
+    startup = subparsers.add_parser(
+        'startup', help='time launching fetchfm after a sync and on '
+        'unchanged data')
+    startup.add_argument('--lines', type=int, default=1_000_000,
+                         help='number of scrobbles in the synthetic history')
+    startup.set_defaults(func=bench_startup)
+    ingest = subparsers.add_parser(
+        'ingest', help='compare the peak memory of reading every line up '
+        'front against streaming')
+    ingest.add_argument('--sizes', type=int, nargs='+',
+                        default=[250_000, 500_000, 1_000_000, 2_000_000],
+                        help='history sizes (num of scrobbles) to load')
+    ingest.add_argument('--chunk-size', type=int, default=1 << 20,
+                        help='bytes read at a time when streaming')
+    ingest.set_defaults(func=bench_ingest)
+    parallel = subparsers.add_parser(
+        'parallel', help='time parsing serially against parsing in shards '
+        'with a process pool')
+    parallel.add_argument('--lines', type=int, default=4_000_000,
+                          help='number of scrobbles in the synthetic history')
+    parallel.add_argument('--workers', type=int, nargs='+', default=None,
+                          help='pool sizes to time (default: 2, 4, ... up '
+                          'to the num of cores)')
+    parallel.set_defaults(func=bench_parallel)
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,48 +1,103 @@
 from tqdm import tqdm
+from array import array
 from time import sleep
-from datetime import date, time, timedelta
-from collections import OrderedDict
+from os.path import exists
+from datetime import datetime, date, time, timedelta
+from functools import cached_property
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from ansi import ANSI
-from scrobble import Scrobble
+from scrobble_columns import ScrobbleColumns, to_datetime
+from scrobble_parser import parse_lines
+from posting_index import PostingIndex
+from day_index import DayIndex
+from run_length_index import RunLengthIndex
+from entity_day_index import EntityDayIndex
+from numpy_engine import NumpyEngine, numpy_available
+from top_k import Ranking, heap_select
+from query_cache import QueryCache
+from columnar_store import open_columns, write_columns
+from rollup_store import Rollups, build_rollups, open_rollups, \
+    write_rollups, default_rollup_file
+from snapshot_store import write_snapshot, read_fingerprint, open_snapshot, \
+    default_snapshot_file
 from api_handler import fetch_song_duration, fetch_album_duration, \
-    fetch_artist_name_corrected
+    fetch_artist_name_corrected, FETCH_WORKERS
+
+
+# the (lazily built) indexes a snapshot can hold, by their snapshot prefix
+SNAPSHOT_INDEXES = ('day_index', 'song_index', 'artist_index', 'album_index',
+                    'song_runs', 'artist_runs', 'album_runs', 'song_days',
+                    'artist_days', 'album_days')
 
 
 '''
 ------------------------------------------------------------------------------
 Instance Variables:
-    Catalogs:
-        ->  __stnd_catalog              list(Scrobble)
-        ->  __daily_catalog             OrderedDict(datetime, list(Scrobble))
-        ->  __alpha_song_catalog        OrderedDict(str, list(Scrobble))
-        ->  __alpha_artist_catalog      "
-        ->  __alpha_album_catalog       "
+    Columns:
+        ->  __columns                   ScrobbleColumns
+    Indexes (built from the columns the first time they're needed, unless
+    they're restored from a snapshot):
+        ->  __day_index                 DayIndex
+        ->  __song_index                PostingIndex
+        ->  __artist_index              "
+        ->  __album_index               "
+        ->  __song_runs                 RunLengthIndex
+        ->  __artist_runs               "
+        ->  __album_runs                "
+        ->  __song_days                 EntityDayIndex
+        ->  __artist_days               "
+        ->  __album_days                "
+        ->  __engine                    NumpyEngine (None without NumPy)
+        ->  __rollups                   Rollups
+        ->  __rankings                  dict[str, Ranking] (by kind)
+    Query results (memoized per version of the data):
+        ->  __query_cache               QueryCache
     Miscellaneous:
         ->  __username                  str
-        ->  __num_distinct_days         int
+        ->  __rollup_file               str (None if not opened from a file)
+        ->  __snapshot                  dict (the snapshot's arrays, by index)
+        ->  __version                   int (bumped when the data changes)
+------------------------------------------------------------------------------
+'''
+
+'''
+------------------------------------------------------------------------------
+Constructors:
+    -  Catalog(username, lines_of_text)
+    -  Catalog.from_columns(username, columns) -> Catalog
+    -  Catalog.open(username, col_file) -> Catalog
 ------------------------------------------------------------------------------
 '''
 
 '''
 ------------------------------------------------------------------------------
 Public Methods:
-    -  song_length(song, artist) ->  -> tuple[str, str, time]
+    -  song_length(song, artist, artist_is_corrected) -> tuple[str, str, time]
   /
     -  song_listening_time(song, artist) -> tuple[str, str, float]
     -  artist_listening_time(artist) -> tuple[str, float, bool]
     -  album_listening_time(album, artist) -> tuple[str, str, float, int, bool]
   /
-    -  top_songs(n) -> list[tuple[str, int]]
-    -  top_artists(n) -> list[tuple[str, int]]
-    -  top_albums(n) -> list[tuple[str, int]]
+    -  top_songs(n, start) -> list[tuple[str, int]]
+    -  top_artists(n, start) -> list[tuple[str, int]]
+    -  top_albums(n, start) -> list[tuple[str, int]]
+  /
+    -  top_songs_in_year(n, year) -> list[tuple[str, int]]
+    -  top_artists_in_year(n, year) -> list[tuple[str, int]]
+    -  top_albums_in_year(n, year) -> list[tuple[str, int]]
+    -  top_songs_between_months(n, start_month, start_year, end_month,
+                                end_year) -> list[tuple[str, int]]
+    -  top_artists_between_months(...) -> list[tuple[str, int]]
+    -  top_albums_between_months(...) -> list[tuple[str, int]]
   /
-    -  num_plays_for_song(song) -> int
+    -  num_plays_for_song(song, artist) -> int
     -  num_plays_for_artist(artist) -> int
-    -  num_plays_for_album(album) -> int
+    -  num_plays_for_album(album, artist) -> int
   /
-    -  num_plays_for_song_on_date(song, month, day, year) -> int
+    -  num_plays_for_song_on_date(song, month, day, year, artist) -> int
     -  num_plays_for_artist_on_date(artist, month, day, year) -> int
-    -  num_plays_for_album_on_date(album, month, day, year) -> int
+    -  num_plays_for_album_on_date(album, month, day, year, artist) -> int
   /
     -  most_played_song() -> tuple[list, int]
     -  most_played_artist() -> tuple[list, int]
@@ -55,15 +110,29 @@ Public Methods:
     -  most_consecutive_song() -> tuple[list, int]
     -  most_consecutive_artist() -> tuple[list, int]
     -  most_consecutive_album() -> tuple[list, int]
+  /
+    -  top_consecutive_songs(n) -> list[tuple[str, int, datetime, datetime]]
+    -  top_consecutive_artists(n) -> list[tuple[str, int, datetime, datetime]]
+    -  top_consecutive_albums(n) -> list[tuple[str, int, datetime, datetime]]
+  /
+    -  streaks_for_song(song, min_length, artist) -> list[tuple[int, datetime, datetime]]
+    -  streaks_for_artist(artist, min_length) -> list[tuple[int, datetime, datetime]]
+    -  streaks_for_album(album, min_length, artist) -> list[tuple[int, datetime, datetime]]
   /
     -  most_streamed_day_overall() -> tuple[list, int]
   /
-    -  most_streamed_day_for_song(song) -> tuple[list, int]
+    -  most_streamed_day_for_song(song, artist) -> tuple[list, int]
     -  most_streamed_day_for_artist(artist) -> tuple[list, int]
-    -  most_streamed_day_for_album(album) -> tuple[list, int]
+    -  most_streamed_day_for_album(album, artist) -> tuple[list, int]
   /
     -  get_scrobbles_on_date(month, day, year) -> []
     -  print_scrobbles_on_date(month, day, year) -> void
+  /
+    -  get_scrobbles_between(start, end) -> []
+    -  num_scrobbles_between(start, end) -> int
+    -  num_plays_for_song_between(song, start, end, artist) -> int
+    -  num_plays_for_artist_between(artist, start, end) -> int
+    -  num_plays_for_album_between(album, start, end, artist) -> int
   /
     -  get_avg_daily_scrobbles() -> int
     -  get_total_num_scrobbles() -> int
@@ -73,6 +142,16 @@ Public Methods:
     -  print_song_catalog() -> void
     -  print_artist_catalog() -> void
     -  print_album_catalog() -> void
+  /
+    -  append(lines_of_text) -> int
+    -  save_columns(col_file) -> void
+    -  query_cache_info(name) -> CacheInfo
+    -  save_snapshot(snapshot_file, fingerprint) -> void
+------------------------------------------------------------------------------
+Songs and albums are keyed on (title, artist). Methods taking a song/album
+title also take an optional `artist`; without one they cover every artist's
+song/album of that title. Songs and albums in results are named along with
+their artist, as "title — artist"
 ------------------------------------------------------------------------------
 '''
 
@@ -84,31 +163,60 @@ class Catalog():
 
     def __init__(self, username, lines_of_text:list):
         '''
-        Create a new catalog of Scrobble objects
+        Create a new catalog of Scrobble objects from lines of scrobbled_data
+        text (scrobbles missing any track info are left out)
         '''
         self.__username = username
-        self.__stnd_catalog = []
-        for line in lines_of_text:
-            scrob = Scrobble(line)
-            if scrob.is_valid:
-                # only append scrobbles if they're not missing any info
-                self.__stnd_catalog.append(scrob)
-        # use standard catalog to generate other variants
-        self.__make_daily_catalog()
-        self.__make_alphabetized_catalogs()
+        self.__columns = parse_lines(lines_of_text)
+        self.__rollup_file = None
+        self.__version = 0
+        self.__rankings = {}
+        self.__query_cache = QueryCache()
+        self.__snapshot = {}
+
+    @classmethod
+    def from_columns(cls, username, columns:ScrobbleColumns):
+        '''
+        Create a new catalog on top of already encoded scrobble columns
+        '''
+        catalog = cls.__new__(cls)
+        catalog.__username = username
+        catalog.__columns = columns
+        catalog.__rollup_file = None
+        catalog.__version = 0
+        catalog.__rankings = {}
+        catalog.__query_cache = QueryCache()
+        catalog.__snapshot = {}
+        return catalog
+
+    @classmethod
+    def open(cls, username, col_file):
+        '''
+        Create a new catalog from a columnar file (see columnar_store.py). The
+        file is memory-mapped, nothing gets parsed up front. The rollup file
+        written next to it is read the first time it's needed, and the
+        indexes are restored from its snapshot file (if there is a valid one)
+        instead of being rebuilt
+        '''
+        catalog = cls.from_columns(username, open_columns(col_file))
+        catalog.__rollup_file = default_rollup_file(col_file)
+        catalog.__load_snapshot(default_snapshot_file(col_file))
+        return catalog
 
 # =========== [1] Data Retrieval: ===========================================
 
-    def song_length(self, song, artist):
+    def song_length(self, song, artist, artist_is_corrected=False):
         '''
-        Returns a tuple of 'track length info' for the provided track
+        Returns a tuple of 'track length info' for the provided track. Pass
+        `artist_is_corrected` if the artist name has already been corrected
         ------
         Returns a tuple containing...
             - `str`: song name (formatted correctly if found)
             - `str`: artist name (formatted correctly if found)
             - `time`: track length (as a datetime.time object)
         '''
-        return fetch_song_duration(song, artist, self.__username)
+        return fetch_song_duration(song, artist, self.__username,
+                                   artist_is_corrected)
     
 
     def song_listening_time(self, song, artist):
@@ -126,14 +234,17 @@ class Catalog():
             # unable to find the given song in the Last.fm database
             return song, artist, 0
         # we know the user requested a valid song
-        num_plays = self.num_plays_for_song(result[0])  # correctly formatted
+        # correctly formatted, only counting this artist's song
+        num_plays = self.num_plays_for_song(result[0], result[1])
         total_time = self.__calc_song_total_time(result[2], num_plays)
         return result[0], result[1], total_time
     
 
     def artist_listening_time(self, artist) -> tuple[str, float, bool]:
         '''
-        Calculates the total time the user has listened to the given artist
+        Calculates the total time the user has listened to the given artist.
+        Each distinct song is only looked up once (concurrently, through a
+        bounded pool of workers) and weighted by its number of plays
         ------
         Returns a tuple containing...
             - `str`: artist name (formatted correctly if found)
@@ -141,31 +252,41 @@ class Catalog():
             - `bool`: indicates if Last.fm had any missing time info
         '''
         corrected_artist, _ = fetch_artist_name_corrected(artist)
-        if corrected_artist not in self.__alpha_artist_catalog:
+        artist_ids = self.__columns.ids_of('artist', corrected_artist)
+        if not artist_ids:
             return corrected_artist, 0, False
-        # inform the user that the calculation process is about to begin
-        display_prog_bool = self.num_plays_for_artist(corrected_artist) > 50
+        # count the plays of each distinct song by this artist
+        song_ids = self.__columns.song_ids
+        song_plays = Counter(song_ids[row] for row
+                             in self.__artist_index.rows_of_id(artist_ids[0]))
+        # inform the user the calculation process is about to begin
+        display_prog_bool = len(song_plays) > 50
         if display_prog_bool:
             # display progress bar
             ansi_msg = (' "Hold tight as I calculate the total time you\'ve '
                         f'listened to {corrected_artist}" -Fetch\n')
             print(f'\n{ansi_msg}')
-            num_scrobs = len(self.__alpha_artist_catalog[corrected_artist])
-            prog_bar = tqdm(total=num_scrobs)
-        # iterate over user's alpha artist catalog, summing up total time
+            prog_bar = tqdm(total=len(song_plays))
+        # resolve the length of every distinct song, summing up total time
         missing_time_flag = False
         total_time = timedelta(seconds=0)
-        for scrob in self.__alpha_artist_catalog[corrected_artist]:
-            if display_prog_bool:
-                # update progress bar
-                prog_bar.update(1)
-            song = scrob.get_track().get_song() 
-            _, _, length = self.song_length(song, corrected_artist)
-            if self.__has_zero_time(length):
-                missing_time_flag = True
-            else:
-                song_seconds = self.__dt_obj_to_seconds(length)
-                total_time += timedelta(seconds=song_seconds)
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+            futures = {
+                pool.submit(self.song_length, self.__columns.songs[song_id],
+                            corrected_artist, True): num_plays
+                for song_id, num_plays in song_plays.items()
+            }
+            for future in as_completed(futures):
+                if display_prog_bool:
+                    # update progress bar
+                    prog_bar.update(1)
+                _, _, length = future.result()
+                if length is None or self.__has_zero_time(length):
+                    missing_time_flag = True
+                else:
+                    song_seconds = self.__calc_song_total_time(
+                        length, futures[future])
+                    total_time += timedelta(seconds=song_seconds)
         if display_prog_bool:
             # close progress bar
             prog_bar.close()
@@ -194,7 +315,8 @@ class Catalog():
                 if self.__has_zero_time(time_obj):
                     missing_time_flag = True
                     continue
-                num_plays = self.num_plays_for_song(song)
+                # only count the plays of this artist's song
+                num_plays = self.num_plays_for_song(song, result[1])
                 if num_plays <= 0:
                     continue
                 # calculate the total time spent listening to this song
@@ -227,120 +349,172 @@ class Catalog():
     
     ''''''
 
-    def top_songs(self, n):
+    def top_songs(self, n, start=0):
         '''
-        Returns the user's top N songs as a list of tuples containing:
-            * `str`: song name
+        Returns the user's top N songs (ranked `start` + 1 onwards, for
+        paging) as a list of tuples containing:
+            * `str`: song name and artist ("song — artist")
             * `int`: playcount
         '''
-        return self.__top_items(self.__alpha_song_catalog, n)
+        return self.__cached(self.__top_items, 'song', n, start)
     
-    def top_artists(self, n):
+    def top_artists(self, n, start=0):
         ''''
-        Returns the user's top N artists as a list of tuples containing:
+        Returns the user's top N artists (ranked `start` + 1 onwards, for
+        paging) as a list of tuples containing:
             * `str`: artist name
             * `int`: playcount
         '''
-        return self.__top_items(self.__alpha_artist_catalog, n)
+        return self.__cached(self.__top_items, 'artist', n, start)
 
-    def top_albums(self, n):
+    def top_albums(self, n, start=0):
         '''
-        Returns the user's top N albums as a list of tuples containing:
-            * `str`: album name
+        Returns the user's top N albums (ranked `start` + 1 onwards, for
+        paging) as a list of tuples containing:
+            * `str`: album name and artist ("album — artist")
             * `int`: playcount
         '''
-        return self.__top_items(self.__alpha_album_catalog, n)
+        return self.__cached(self.__top_items, 'album', n, start)
     
-    def __top_items(self, catalog, n) -> list[tuple[str, int]]:
-        my_key = self.__by_num_scrobs
-        sorted_items = sorted(catalog.items(), key=my_key, reverse=True)
-        top_n = [(item, len(scrobs)) for item, scrobs in sorted_items[:n]]
-        return top_n
+    def __top_items(self, kind, n, start=0) -> list[tuple[str, int]]:
+        ranked_ids = self.__ranking(kind).top(n, start)
+        label_of = self.__columns.label_of
+        if self.__engine is not None:
+            counts = self.__engine.counts(kind)
+            return [(label_of(kind, item_id), int(counts[item_id]))
+                    for item_id in ranked_ids]
+        index = self.__index(kind)
+        return [(label_of(kind, item_id), index.count_of_id(item_id))
+                for item_id in ranked_ids]
+
+    ''''''
+
+    def top_songs_in_year(self, n, year):
+        ''' Returns the user's top N songs of the given year '''
+        return self.__top_between_months('song', n, 1, year, 12, year)
+
+    def top_artists_in_year(self, n, year):
+        ''' Returns the user's top N artists of the given year '''
+        return self.__top_between_months('artist', n, 1, year, 12, year)
 
-    def __by_num_scrobs(self, alpha_catalog_item):
-        return len(alpha_catalog_item[1])
+    def top_albums_in_year(self, n, year):
+        ''' Returns the user's top N albums of the given year '''
+        return self.__top_between_months('album', n, 1, year, 12, year)
+
+    def top_songs_between_months(self, n, start_month, start_year,
+                                 end_month, end_year):
+        '''
+        Returns the user's top N songs between two months (both inclusive)
+        as a list of ("song — artist", playcount) tuples
+        '''
+        return self.__top_between_months('song', n, start_month, start_year,
+                                         end_month, end_year)
+
+    def top_artists_between_months(self, n, start_month, start_year,
+                                   end_month, end_year):
+        '''
+        Returns the user's top N artists between two months (both inclusive)
+        as a list of (artist name, playcount) tuples
+        '''
+        return self.__top_between_months('artist', n, start_month, start_year,
+                                         end_month, end_year)
+
+    def top_albums_between_months(self, n, start_month, start_year,
+                                  end_month, end_year):
+        '''
+        Returns the user's top N albums between two months (both inclusive)
+        as a list of ("album — artist", playcount) tuples
+        '''
+        return self.__top_between_months('album', n, start_month, start_year,
+                                         end_month, end_year)
+
+    def __top_between_months(self, kind, n, start_month, start_year,
+                             end_month, end_year) -> list[tuple[str, int]]:
+        # merges the month/year rollups, never touching the scrobbles
+        return self.__rollups.top_between(kind, n, (start_month, start_year),
+                                          (end_month, end_year))
 
     ''''''
 
-    def num_plays_for_song(self, song):
-        return self.__num_plays(song, self.__alpha_song_catalog)
+    def num_plays_for_song(self, song, artist=None):
+        return self.__num_plays(song, 'song', artist)
     
     def num_plays_for_artist(self, artist):
-        return self.__num_plays(artist, self.__alpha_artist_catalog)
+        return self.__num_plays(artist, 'artist')
     
-    def num_plays_for_album(self, album):
-        return self.__num_plays(album, self.__alpha_album_catalog)
+    def num_plays_for_album(self, album, artist=None):
+        return self.__num_plays(album, 'album', artist)
+
+    def __num_plays(self, item, kind, artist=None) -> int:
+        index = self.__index(kind)
+        return sum(index.count_of_id(item_id) for item_id
+                   in self.__columns.ids_of(kind, item, artist))
 
-    def __num_plays(self, item, catalog):
-        scrobs = catalog.get(item)
-        if scrobs:
-            return len(scrobs)
-        else:
-            return 0
-    
     ''''''
 
-    def num_plays_for_song_on_date(self, song, month, day, year):
-        get_field = self.__by_song
-        return self.__num_plays_on_date(song, month, day, year, get_field)
+    def num_plays_for_song_on_date(self, song, month, day, year,
+                                   artist=None):
+        return self.__num_plays_on_date(song, month, day, year, 'song',
+                                        artist)
 
     def num_plays_for_artist_on_date(self, artist, month, day, year):
-        get_field = self.__by_artist
-        return self.__num_plays_on_date(artist, month, day, year, get_field)
+        return self.__num_plays_on_date(artist, month, day, year, 'artist')
 
-    def num_plays_for_album_on_date(self, album, month, day, year):
-        get_field = self.__by_album
-        return self.__num_plays_on_date(album, month, day, year, get_field)
+    def num_plays_for_album_on_date(self, album, month, day, year,
+                                    artist=None):
+        return self.__num_plays_on_date(album, month, day, year, 'album',
+                                        artist)
 
-    def __num_plays_on_date(self, item, month, day, year, get_field):
-        scrobs = self.get_scrobbles_on_date(month, day, year)
-        if len(scrobs) == 0:
+    def __num_plays_on_date(self, item, month, day, year, kind, artist=None):
+        requested_date = self.__validate_date(month, day, year)
+        if requested_date is None:
             return 0
-        num_plays = 0
-        for scrob in scrobs:
-            if item == get_field(scrob):
-                num_plays += 1
-        return num_plays
+        days = self.__days(kind)
+        return sum(days.count_on(item_id, requested_date.toordinal())
+                   for item_id in self.__columns.ids_of(kind, item, artist))
 
     ''''''
 
     def most_played_song(self):
         '''
         Returns a list of song name(s) which were the user's most listened 
-        to and also the number of listens for the most listened to song(s)
+        to and also the number of listens for the most listened to song(s).
+        Songs come with their artist ("song — artist")
         '''
-        catalog = self.__alpha_song_catalog
-        return self.__most_played(self.__by_song, catalog)
+        return self.__cached(self.__most_played, 'song')
     
     def most_played_artist(self):
         '''
         Returns a list of artist name(s) which were the user's most listened 
         to and also the number of listens for the most listened to artist(s)
         '''
-        catalog = self.__alpha_artist_catalog
-        return self.__most_played(self.__by_artist, catalog)
+        return self.__cached(self.__most_played, 'artist')
     
     def most_played_album(self):
         '''
         Returns a list of album name(s) which were the user's most listened 
-        to and also the number of listens for the most listened to album(s)
+        to and also the number of listens for the most listened to album(s).
+        Albums come with their artist ("album — artist")
         '''
-        catalog = self.__alpha_album_catalog
-        return self.__most_played(self.__by_album, catalog)
+        return self.__cached(self.__most_played, 'album')
     
-    def __most_played(self, get_field, alpha_catalog):
+    def __most_played(self, kind):
+        if self.__engine is not None:
+            return self.__engine.most_played(kind)
+        index = self.__index(kind)
+        label_of = self.__columns.label_of
         result = []
         max_so_far = 0
-        for _, scrobs in alpha_catalog.items():
-            num_listens = len(scrobs)
+        for item_id in index.sorted_ids():
+            num_listens = index.count_of_id(item_id)
             if num_listens > max_so_far:
                 # we found a new max number of listens
                 max_so_far = num_listens
-                result = [get_field(scrobs[0])]
+                result = [label_of(kind, item_id)]
             elif num_listens == max_so_far:
                 # at least 2 items (song, artist, or album) have the same
                 # max number of listens, we want to record both in our result
-                result.append(get_field(scrobs[0]))
+                result.append(label_of(kind, item_id))
         return result, max_so_far
 
     ''''''
@@ -349,112 +523,147 @@ class Catalog():
         '''
         Returns a list of song(s) which were the user's most listened to for
         a given date and also the number of listens for the most freq song(s)
+        (as "song — artist")
         '''
-        return self.__most_played_on_date(month, day, year, self.__by_song)
+        return self.__most_played_on_date(month, day, year, 'song')
     
     def most_played_artist_on_date(self, month, day, year):
         '''
         Returns a list of artist(s) which were the user's most listened to for
         a given date and also the number of listens for the most freq artist(s)
         '''
-        return self.__most_played_on_date(month, day, year, self.__by_artist)
+        return self.__most_played_on_date(month, day, year, 'artist')
     
     def most_played_album_on_date(self, month, day, year):
         '''
         Returns a list of album(s) which were the user's most listened to for
         a given date and also the number of listens for the most freq album(s)
+        (as "album — artist")
         '''
-        return self.__most_played_on_date(month, day, year, self.__by_album)
-
-    def __most_played_on_date(self, m, d, y, get_field) -> tuple[list, int]:
-        freqs = {}
-        scrobs = self.get_scrobbles_on_date(m, d, y)
-        # generate item frequencies
-        for scrob in scrobs:
-            item = get_field(scrob)
-            if item not in freqs:
-                freqs[item] = [0]
-            freqs.get(item)[0] += 1
+        return self.__most_played_on_date(month, day, year, 'album')
+
+    def __most_played_on_date(self, m, d, y, kind) -> tuple[list, int]:
+        rows = self.__rows_on_date(m, d, y)
+        if self.__engine is not None:
+            return self.__engine.most_played_in_rows(kind, rows)
+        # generate item frequencies (in order of first play that day)
+        ids = self.__columns.ids(kind)
+        freqs = Counter(ids[row] for row in rows)
         ''' time to figure out max frequency '''
         if not freqs:
             return [], 0
         # if we get here, we know there won't be a ValueError for empty dict
         max_freq = max(freqs.values())
-        result = [item for item, freq in freqs.items() if freq == max_freq]
+        label_of = self.__columns.label_of
+        result = [label_of(kind, item_id) for item_id, freq in freqs.items()
+                  if freq == max_freq]
         return result, max_freq
     
     ''''''
 
     def most_consecutive_song(self):
-        return self.__most_consecutive(self.__by_song)
+        return self.__cached(self.__most_consecutive, 'song')
 
     def most_consecutive_artist(self):
-        return self.__most_consecutive(self.__by_artist)
+        return self.__cached(self.__most_consecutive, 'artist')
 
     def most_consecutive_album(self):
-        return self.__most_consecutive(self.__by_album)
+        return self.__cached(self.__most_consecutive, 'album')
 
-    def __most_consecutive(self, get_field) -> tuple[list, int]:
+    def __most_consecutive(self, kind) -> tuple[list, int]:
         '''
         Returns a list of item names (song, artist, or album names) which 
-        the user has listened to the most times in a row. Also returns an int
-        signif the number of plays for longest consecutively listened to S/A/A
+        the user has listened to the most times in a row (in the order those
+        streaks happened). Also returns an int signif the number of plays for
+        longest consecutively listened to S/A/A
         '''
-        result = []
-        # variables used to keep track of current longest consecutive item
-        longest_length = 0
-        consec_item = ''
-        # variables needed when replacing the above two variables (i.e., when
-        # we find a NEW more consecutive item)
-        second_length = 0
-        second_item = ''
-        # iterate through the entire standard catalog
-        for i in range(len(self.__stnd_catalog)):
-            curr = get_field(self.__stnd_catalog[i])
-            if i == 0:
-                # base case, only happens to initialize variables
-                longest_length = 1
-                consec_item = curr
-                result.append(consec_item)
-            elif self.__is_consecutive(i, longest_length, consec_item, 
-                                       get_field):
-                # we now know that the curr item IS consecutive
-                longest_length += 1
-                if longest_length > second_length:
-                    # we've found a completely NEW more consecutive streak
-                    second_length = 0  # reset
-                    second_item = ''  # reset
-                    result = [consec_item]  # update the result list
-            elif self.__is_consecutive(i, second_length, second_item, 
-                                       get_field):
-                '''
-                If we get here we know curr item is NOT part of the longest
-                consecutive streak. But, we do know that the curr item is 
-                contributing toward the second_item's consecutive streak
-                '''
-                second_length += 1
-                if second_length == longest_length:
-                    # we only get here when second_song now has the same
-                    # number of consecutive streaks as most consecutive_song
-                    consec_item = second_item
-                    result.append(second_item)
-            else:
-                # if we get here, we need to initialize our 'second' variables
-                # with their new values
-                second_length = 1
-                second_item = curr
-        return result, longest_length
-                
-    def __is_consecutive(self, i, length, most_consec, get_field):
-        if most_consec != get_field(self.__stnd_catalog[i]):
-            return False
-        # iterate over the length for the most consecutive item so far
-        for offset in range(1, length):
-            item1 = get_field(self.__stnd_catalog[i])
-            item2 = get_field(self.__stnd_catalog[i - offset])
-            if item1 != item2:
-                return False
-        return True
+        runs = self.__runs(kind)
+        longest = runs.longest()
+        if not longest:
+            return [], 0
+        label_of = self.__columns.label_of
+        # an item may have had more than one streak of the longest length
+        item_ids = dict.fromkeys(runs.item_id(run) for run in longest)
+        result = [label_of(kind, item_id) for item_id in item_ids]
+        return result, runs.length(longest[0])
+
+    ''''''
+
+    def top_consecutive_songs(self, n):
+        '''
+        Returns the user's N longest streaks of listening to the same song as
+        a list of tuples containing:
+            * `str`: song name and artist ("song — artist")
+            * `int`: number of plays in a row
+            * `datetime`: start of the streak
+            * `datetime`: end of the streak (the last play's term)
+        '''
+        return self.__cached(self.__top_consecutive, 'song', n)
+
+    def top_consecutive_artists(self, n):
+        '''
+        Returns the user's N longest streaks of listening to the same artist
+        (see top_consecutive_songs)
+        '''
+        return self.__cached(self.__top_consecutive, 'artist', n)
+
+    def top_consecutive_albums(self, n):
+        '''
+        Returns the user's N longest streaks of listening to the same album
+        (see top_consecutive_songs)
+        '''
+        return self.__cached(self.__top_consecutive, 'album', n)
+
+    def __top_consecutive(self, kind, n) -> list[tuple]:
+        # longest first, equally long streaks in the order they happened
+        runs = self.__runs(kind)
+        label_of = self.__columns.label_of
+        return [(label_of(kind, runs.item_id(run)),
+                 *self.__describe_run(runs, run)) for run in runs.top(n)]
+
+    ''''''
+
+    def streaks_for_song(self, song, min_length=2, artist=None):
+        '''
+        Returns every streak (of at least `min_length` plays in a row) of
+        listening to the given song, chronologically, as tuples containing:
+            * `int`: number of plays in a row
+            * `datetime`: start of the streak
+            * `datetime`: end of the streak (the last play's term)
+        '''
+        return self.__streaks_for(song, 'song', min_length, artist)
+
+    def streaks_for_artist(self, artist, min_length=2):
+        '''
+        Returns every streak of listening to the given artist (see
+        streaks_for_song)
+        '''
+        return self.__streaks_for(artist, 'artist', min_length)
+
+    def streaks_for_album(self, album, min_length=2, artist=None):
+        '''
+        Returns every streak of listening to the given album (see
+        streaks_for_song)
+        '''
+        return self.__streaks_for(album, 'album', min_length, artist)
+
+    def __streaks_for(self, tgt, kind, min_length, artist=None) \
+            -> list[tuple]:
+        runs = self.__runs(kind)
+        # runs are numbered chronologically, so sorting merges the runs of
+        # every artist's song/album of that title back into order
+        matching_runs = sorted(
+            run for item_id in self.__columns.ids_of(kind, tgt, artist)
+            for run in runs.runs_of(item_id))
+        return [self.__describe_run(runs, run) for run in matching_runs
+                if runs.length(run) >= min_length]
+
+    def __describe_run(self, runs:RunLengthIndex, run) \
+            -> tuple[int, datetime, datetime]:
+        rows = runs.rows(run)
+        uts = self.__columns.uts
+        return (len(rows), to_datetime(uts[rows.start]),
+                to_datetime(uts[rows.stop - 1]))
 
     ''''''
 
@@ -463,45 +672,49 @@ class Catalog():
         Returns a list of day(s) in which the user scrobbled the most, also
         returns the number of scrobbles listened to on the most streamed day(s)
         '''
+        return self.__cached(self.__most_streamed_day_overall)
+
+    def __most_streamed_day_overall(self) -> tuple[list, int]:
+        if self.__engine is not None:
+            result, max_so_far = self.__engine.most_streamed_days()
+            return [date.fromordinal(ordinal) for ordinal in result], max_so_far
         max_so_far = 0
         result = []
-        for dt, scrobs in self.__daily_catalog.items():
-            num_scrobs = len(scrobs)
+        for ordinal, num_scrobs in self.__day_index.counts():
             if num_scrobs > max_so_far:
                 max_so_far = num_scrobs
-                result = [dt]
+                result = [ordinal]
             elif num_scrobs == max_so_far:
-                result.append(dt)
-        return result, max_so_far
+                result.append(ordinal)
+        return [date.fromordinal(ordinal) for ordinal in result], max_so_far
     
     ''''''
 
-    def most_streamed_day_for_song(self, song):
+    def most_streamed_day_for_song(self, song, artist=None):
         '''
         Returns a list of date(s) the user listened to a given song the most
         and the number of listens recorded for that song on those date(s)
         '''
-        catalog = self.__alpha_song_catalog
-        return self.__most_streamed_day_for(song, catalog, self.__by_song)
+        return self.__most_streamed_day_for(song, 'song', artist)
     
     def most_streamed_day_for_artist(self, artist):
         '''
         Returns a list of date(s) the user listened to a given artist the most
         and the number of listens recorded for that artist on those date(s)
         '''
-        catalog = self.__alpha_artist_catalog
-        return self.__most_streamed_day_for(artist, catalog, self.__by_artist)
+        return self.__most_streamed_day_for(artist, 'artist')
     
-    def most_streamed_day_for_album(self, album):
+    def most_streamed_day_for_album(self, album, artist=None):
         '''
         Returns a list of date(s) the user listened to a given album the most
         and the number of listens recorded for that album on those date(s)
         '''
-        catalog = self.__alpha_album_catalog
-        return self.__most_streamed_day_for(album, catalog, self.__by_album)
+        return self.__most_streamed_day_for(album, 'album', artist)
 
-    def __most_streamed_day_for(self, tgt, cat, get_field) -> tuple[list, int]:
-        if tgt not in cat.keys():
+    def __most_streamed_day_for(self, tgt, kind, artist=None) \
+            -> tuple[list, int]:
+        item_ids = self.__columns.ids_of(kind, tgt, artist)
+        if not item_ids:
             # print a message that the user hasn't listened to this tgt yet
             ansi_tgt = f'{ANSI.BRIGHT_CYAN}{tgt}{ANSI.RESET}'
             msg = (f' * Sorry, but we couldn\'t find {ansi_tgt} in your '
@@ -509,16 +722,8 @@ class Catalog():
             print(msg)
             return [], 0
         # if we get here, we know the user has listened to the given tgt
-        freqs = {}
-        for date, scrobs in self.__daily_catalog.items():
-            n_listens = sum(1 for scrob in scrobs if get_field(scrob) == tgt)
-            if n_listens > 0:
-                # only add if this item was listened to on this date
-                freqs[date] = n_listens
-        assert freqs
-        max_freq = max(freqs.values())
-        result = [date for date, freq in freqs.items() if freq == max_freq]
-        return result, max_freq
+        ordinals, max_freq = self.__days(kind).busiest_days(item_ids)
+        return [date.fromordinal(ordinal) for ordinal in ordinals], max_freq
 
     ''''''
 
@@ -526,21 +731,69 @@ class Catalog():
         '''
         Returns a list of all Scrobbles listened to on a given date (M/D/Y)
         '''
+        columns = self.__columns
+        return [columns.scrobble(row)
+                for row in self.__rows_on_date(month, day, year)]
+
+    def get_scrobbles_between(self, start:date, end:date) -> list:
+        '''
+        Returns a list of all Scrobbles listened to between two dates (both
+        inclusive), oldest first
+        '''
+        columns = self.__columns
+        return [columns.scrobble(row)
+                for row in self.__day_index.rows_between(start, end)]
+
+    def num_scrobbles_between(self, start:date, end:date) -> int:
+        '''
+        Returns the number of Scrobbles between two dates (both inclusive)
+        '''
+        return len(self.__day_index.rows_between(start, end))
+
+    def num_plays_for_song_between(self, song, start:date, end:date,
+                                   artist=None):
+        return self.__num_plays_between(song, start, end, 'song', artist)
+
+    def num_plays_for_artist_between(self, artist, start:date, end:date):
+        return self.__num_plays_between(artist, start, end, 'artist')
+
+    def num_plays_for_album_between(self, album, start:date, end:date,
+                                    artist=None):
+        return self.__num_plays_between(album, start, end, 'album', artist)
+
+    def __num_plays_between(self, item, start:date, end:date, kind,
+                            artist=None) -> int:
+        days = self.__days(kind)
+        return sum(days.count_between(item_id, start.toordinal(),
+                                      end.toordinal())
+                   for item_id in self.__columns.ids_of(kind, item, artist))
+
+    def __rows_on_date(self, month, day, year) -> range:
+        '''
+        Returns the range of rows listened to on a given date (M/D/Y)
+        '''
+        requested_date = self.__validate_date(month, day, year)
+        if requested_date is None:
+            return range(0)
+        return self.__day_index.rows_on(requested_date)
+
+    def __validate_date(self, month, day, year):
+        '''
+        Returns the given date (M/D/Y) as a date object, or prints a message
+        and returns None if it's invalid or outside of the user's data
+        '''
         if not self.__is_valid_date(month, day, year):
             invalid_date = f'{month}/{day}/{year}'
             ansi_date = f'{ANSI.BRIGHT_CYAN_BOLD}{invalid_date}{ANSI.RESET}'
             print(f' * Sorry, but {ansi_date} is not a valid date!')
-            return []
+            return None
         # if we get here we have a valid date
         requested_date = date(year, month, day)
         if not self.__is_within_user_bounds(requested_date):
             self.__print_oob_date_error_msg(requested_date)
-            return []
+            return None
         # if we get here we have a date that falls within user's bounds
-        if requested_date in self.__daily_catalog:
-            return self.__daily_catalog.get(requested_date)
-        else:
-            return []
+        return requested_date
 
     def __is_valid_date(self, month, day, year):
         if month < 1 or day < 1 or year < 0 or month > 12 or day > 31:
@@ -579,8 +832,7 @@ class Catalog():
         Checks if the requested date falls within the bounds set by the user's
         Last.fm catalog information
         '''
-        start_range = self.__stnd_catalog[-1].get_date()
-        end_range = self.__stnd_catalog[0].get_date()
+        start_range, end_range = self.__date_range()
         return requested_date >= start_range and requested_date <= end_range
 
     def __print_oob_date_error_msg(self, requested_date):
@@ -590,8 +842,7 @@ class Catalog():
         '''
         TEMPLATE = '%-m/%-d/%Y'
         # define the range of available scrobbles [start, end]
-        start_range = self.__stnd_catalog[-1].get_date()
-        end_range = self.__stnd_catalog[0].get_date()
+        start_range, end_range = self.__date_range()
         # format the dates to follow above template
         formatted_date = requested_date.strftime(TEMPLATE)
         formatted_start = start_range.strftime(TEMPLATE)
@@ -605,21 +856,119 @@ class Catalog():
         ansi_start_date = f'{ANSI.BRIGHT_CYAN}{formatted_start}{ANSI.RESET}'
         ansi_end_date = f'{ANSI.BRIGHT_CYAN}{formatted_end}{ANSI.RESET}'
         print(f'{ansi_start_date} - {ansi_end_date}.')
+
+    def __date_range(self) -> tuple[date, date]:
+        '''
+        Returns the dates of the user's oldest and newest Scrobbles
+        '''
+        uts = self.__columns.uts
+        return to_datetime(uts[0]).date(), to_datetime(uts[-1]).date()
  
     ''''''
 
     def get_avg_daily_scrobbles(self):
         ''' Returns the user's average daily Scrobbles as a whole number '''
-        average = len(self.__stnd_catalog) / self.__num_distinct_days
+        average = len(self.__columns) / len(self.__day_index)
         return round(average)
 
     def get_total_num_scrobbles(self):
         ''' Returns the total number of Scrobbles the user has listened to '''
-        return len(self.__stnd_catalog)
+        return len(self.__columns)
 
     def get_total_num_distinct_days(self):
         ''' Returns the total num of distinct days the user has Scrobbled '''
-        return self.__num_distinct_days
+        return len(self.__day_index)
+
+    def append(self, lines_of_text:list) -> int:
+        '''
+        Adds newly scrobbled lines of text (newest-first, like the rest of
+        scrobbled_data, and all newer than the catalog's newest Scrobble) to
+        the catalog in place, returning the number of Scrobbles added. The
+        columns, the rollups and every index that's been built (or is in the
+        snapshot) take in just the new rows, and the data's version is bumped
+        so that the rankings and cached query results are computed again
+        '''
+        built = self.__dict__
+        # the indexes in the snapshot are restored (zero-copy) to take in
+        # the new rows too, rather than being rebuilt from scratch later on
+        for prefix in SNAPSHOT_INDEXES:
+            if prefix in self.__snapshot:
+                getattr(self, f'_Catalog__{prefix}')
+        # as are the rollups in the rollup file (while it matches the columns)
+        rollups = None
+        if '_Catalog__rollups' in built or (
+                self.__rollup_file is not None and exists(self.__rollup_file)):
+            rollups = self.__rollups
+        # the engine's arrays (and the rankings selecting with them) are
+        # zero-copy views of the columns, which can't grow while they're
+        # around. They're rebuilt when next needed
+        built.pop('_Catalog__engine', None)
+        self.__rankings = {}
+        columns = self.__columns
+        rows = columns.extend(parse_lines(lines_of_text))
+        if not rows:
+            return 0
+        if rollups is not None:
+            rollups.extend(rows.start)
+        if '_Catalog__day_index' in built:
+            self.__day_index.extend(columns.uts, rows.start)
+        for kind in ScrobbleColumns.KINDS:
+            ids, names = columns.ids(kind), columns.table(kind)
+            if f'_Catalog__{kind}_index' in built:
+                self.__index(kind).extend(ids, rows.start, names,
+                                          columns.sort_key(kind))
+            if f'_Catalog__{kind}_runs' in built:
+                self.__runs(kind).extend(ids, rows.start, names)
+            if f'_Catalog__{kind}_days' in built:
+                self.__days(kind).extend(ids, columns.uts, rows.start)
+        # the snapshot no longer matches the columns
+        self.__snapshot = {}
+        self.__version += 1
+        return len(rows)
+
+    def save_columns(self, col_file):
+        '''
+        Writes the catalog's columns (e.g. once new scrobbles have been
+        appended) to a columnar file, along with their rollups (see
+        columnar_store.py)
+        '''
+        rollup_file = default_rollup_file(col_file)
+        write_columns(self.__columns, col_file)
+        write_rollups(self.__rollups, self.__columns, rollup_file)
+        self.__rollup_file = rollup_file
+
+    def save_snapshot(self, snapshot_file, fingerprint:bytes):
+        '''
+        Saves the indexes built so far to a snapshot file (see
+        snapshot_store.py), for Catalog.open to restore them from. Nothing
+        gets built just to be saved: indexes that haven't been needed are
+        carried over from the current snapshot, or left out. The fingerprint
+        identifies the data the catalog was built from
+        '''
+        built = self.__dict__
+        new_indexes = [prefix for prefix in SNAPSHOT_INDEXES
+                       if f'_Catalog__{prefix}' in built
+                       and prefix not in self.__snapshot]
+        if not new_indexes and self.__snapshot \
+                and read_fingerprint(snapshot_file) == fingerprint:
+            return  # the snapshot on disk already has everything
+        arrays = {'catalog.shape': array('Q', self.__shape())}
+        for prefix in SNAPSHOT_INDEXES:
+            index = built.get(f'_Catalog__{prefix}')
+            if index is not None:
+                fields = index.to_arrays()
+            else:
+                fields = self.__snapshot.get(prefix, {})
+            for field, values in fields.items():
+                arrays[f'{prefix}.{field}'] = values
+        write_snapshot(snapshot_file, fingerprint, arrays)
+
+    def query_cache_info(self, name=None):
+        '''
+        Returns the query cache's hit/miss counters, overall or for a single
+        query (e.g. 'most_played', 'top_items' or 'catalog_lines')
+        '''
+        return self.__query_cache.info(name)
     
 # =========== [2] Printing: =================================================
 
@@ -638,114 +987,225 @@ class Catalog():
     def print_chronological_catalog(self):
         ''' Prints the user's full chronological catalog '''
         print()
-        for _, scrobs in self.__daily_catalog.items():
-            for scrob in scrobs:
-                print(scrob)
+        columns = self.__columns
+        for row in range(len(columns)):
+            print(columns.scrobble(row))
         print()
 
     def print_song_catalog(self):
         '''
         Prints the user's alphabetized-catalog based on song name
         '''
-        most_listened_func = lambda: self.most_played_song()
-        catalog = self.__alpha_song_catalog
-        self.__print_catalog(most_listened_func, catalog, False)
+        self.__print_catalog('song')
     
     def print_artist_catalog(self):
         '''
         Prints the user's alphabetized-catalog based on artist name
         '''
-        most_listened_func = lambda: self.most_played_artist()
-        catalog = self.__alpha_artist_catalog
-        self.__print_catalog(most_listened_func, catalog, True)
+        self.__print_catalog('artist')
 
     def print_album_catalog(self):
         '''
         Prints the user's alphabetized-catalog based on album name
         '''
-        most_listened_func = lambda: self.most_played_album()
-        catalog = self.__alpha_album_catalog
-        self.__print_catalog(most_listened_func, catalog, False)
+        self.__print_catalog('album')
+
+    def __print_catalog(self, kind):
+        print()
+        for line in self.__cached(self.__catalog_lines, kind):
+            print(line)
+        print()
 
-    def __print_catalog(self, most_listened_func, alpha_catalog, 
-                        is_artist_catalog_request:bool):
+    def __catalog_lines(self, kind) -> list[str]:
+        '''
+        Formats every line of the alphabetized catalog of the given kind
+        '''
         ''' Get the length of most listened to item # including commas '''
-        _, max_length = most_listened_func()
+        _, max_length = self.__cached(self.__most_played, kind)
         max_length_with_commas = f'{max_length:,}'
         max_length = len(max_length_with_commas)
         FORMATTING = f'%{max_length}s'  # right-justified formatting
-        ''' Print the output to the screen '''
-        print()
-        for key, scrobs in alpha_catalog.items():
-            num_listens_with_commas = f'{len(scrobs):,d}'
+        ''' Format each line of output '''
+        columns = self.__columns
+        index = self.__index(kind)
+        lines = []
+        for item_id in index.sorted_ids():
+            key = index.name_of(item_id)
+            num_listens_with_commas = f'{index.count_of_id(item_id):,d}'
             formatted_num_listens = f'{FORMATTING % num_listens_with_commas}'
-            print(f'{ANSI.BRIGHT_WHITE_BOLD}{formatted_num_listens}', end='')
-            if is_artist_catalog_request:
+            line = f'{ANSI.BRIGHT_WHITE_BOLD}{formatted_num_listens}'
+            if kind == 'artist':
                 # Behavior when printing ARTIST-sorted catalog requests only
-                print(f'{ANSI.RESET} {key}')
+                line += f'{ANSI.RESET} {key}'
             else:
                 key_portion = f'{ANSI.BRIGHT_CYAN}  {key}{ANSI.RESET}'
-                artist_name = f'{scrobs[0].get_track().get_artist()}'
-                print(f'{key_portion} [{artist_name}]')
-        print()
+                # songs and albums are keyed on (title, artist)
+                artist_id = columns.artist_id_of(kind, item_id)
+                artist_name = f'{columns.artists[artist_id]}'
+                line += f'{key_portion} [{artist_name}]'
+            lines.append(line)
+        return lines
 
 # =========== [3] Utility: ==================================================
 
-    def __by_song(self, scrobble:Scrobble):
-        return scrobble.get_track().get_song()
+    def __index(self, kind) -> PostingIndex:
+        # only builds the requested index
+        if kind == 'song':
+            return self.__song_index
+        if kind == 'artist':
+            return self.__artist_index
+        return self.__album_index
 
-    def __by_artist(self, scrobble:Scrobble):
-        return scrobble.get_track().get_artist()
-    
-    def __by_album(self, scrobble:Scrobble):
-        return scrobble.get_track().get_album()
+    def __runs(self, kind) -> RunLengthIndex:
+        # only builds the requested index
+        if kind == 'song':
+            return self.__song_runs
+        if kind == 'artist':
+            return self.__artist_runs
+        return self.__album_runs
+
+    def __ranking(self, kind) -> Ranking:
+        '''
+        Returns the (cached) playcount ranking of the given kind, ranking
+        again if the data has changed since it was cached
+        '''
+        ranking = self.__rankings.get(kind)
+        if ranking is None or ranking.version != self.__version:
+            if self.__engine is not None:
+                engine = self.__engine
+                select = lambda k: engine.top_ids(kind, k)
+            else:
+                select = heap_select(self.__index(kind))
+            num_items = len(self.__columns.table(kind))
+            ranking = Ranking(select, num_items, self.__version)
+            self.__rankings[kind] = ranking
+        return ranking
+
+    def __cached(self, query, *args):
+        '''
+        Returns query(*args), memoized in the query cache for the current
+        version of the data
+        '''
+        name = query.__name__.lstrip('_')
+        return self.__query_cache.get(self.__version, (name, args),
+                                      lambda: query(*args))
+
+    def __load_snapshot(self, snapshot_file):
+        '''
+        Maps in the given snapshot, as long as it was built from the same
+        columns (otherwise the indexes just get rebuilt)
+        '''
+        if read_fingerprint(snapshot_file) is None:
+            return
+        snapshot = open_snapshot(snapshot_file)
+        shape = snapshot.get('catalog', {}).get('shape')
+        if shape is not None and tuple(shape) == self.__shape():
+            self.__snapshot = snapshot
+
+    def __shape(self) -> tuple:
+        ''' The num rows and num artists/albums/songs of the columns '''
+        columns = self.__columns
+        return (len(columns), len(columns.artists), len(columns.albums),
+                len(columns.songs))
+
+    def __days(self, kind) -> EntityDayIndex:
+        # only builds the requested index
+        if kind == 'song':
+            return self.__song_days
+        if kind == 'artist':
+            return self.__artist_days
+        return self.__album_days
 
 # =========== [4] Catalogs: =================================================
-        
-    def __make_daily_catalog(self):
-        '''
-        Generates a one-to-many daily catalog of Scrobbles (grouped by date).
-        The internal data structure is an OrderedDict (maintains insertion
-        order). The key is is a datetime object (the term) and the value is a
-        list of Scrobbles. Catalog is sorted in chronological order, meaning 
-        oldest Scrobbles come at the beginning of the catalog.
-        '''
-        self.__daily_catalog = OrderedDict()
-        num_distinct_days = 0
-        for scrob in reversed(self.__stnd_catalog):
-            date = scrob.get_date()
-            if date not in self.__daily_catalog:
-                num_distinct_days += 1
-                self.__daily_catalog[date] = []
-            self.__daily_catalog[date].append(scrob)
-        self.__num_distinct_days = num_distinct_days
-
-    def __make_alphabetized_catalogs(self):
-        '''
-        Generates 3 new catalogs alphabetically-sorted by song name, artist
-        name, and album name.
-        '''
-        # assign to local variables
-        song_catalog = self.__make_alpha_catalog(self.__by_song)
-        artist_catalog = self.__make_alpha_catalog(self.__by_artist)
-        album_catalog = self.__make_alpha_catalog(self.__by_album)
-        # assign to instance variables
-        self.__alpha_song_catalog = song_catalog
-        self.__alpha_artist_catalog = artist_catalog
-        self.__alpha_album_catalog = album_catalog
-
-    def __make_alpha_catalog(self, get_field):
-        '''
-        Returns a new catalog alphabetically-sorted by the specified get_field
-        (either song, artist, or album name)
-        '''
-        temp_catalog = self.__stnd_catalog.copy()
-        temp_catalog.sort(key=get_field)
-        alpha_catalog = OrderedDict()
-        for scrob in temp_catalog:
-            item = get_field(scrob)
-            if item not in alpha_catalog:
-                alpha_catalog[item] = []
-            alpha_catalog[item].append(scrob)
-        return alpha_catalog
-     
\ No newline at end of file
+
+    @cached_property
+    def __day_index(self) -> DayIndex:
+        arrays = self.__snapshot.get('day_index')
+        if arrays is not None:
+            return DayIndex.from_arrays(arrays)
+        return DayIndex(self.__columns.uts)
+
+    @cached_property
+    def __song_index(self) -> PostingIndex:
+        arrays = self.__snapshot.get('song_index')
+        if arrays is not None:
+            return PostingIndex.from_arrays(arrays, self.__columns.songs)
+        return PostingIndex(self.__columns.song_ids, self.__columns.songs,
+                            self.__columns.sort_key('song'))
+
+    @cached_property
+    def __artist_index(self) -> PostingIndex:
+        arrays = self.__snapshot.get('artist_index')
+        if arrays is not None:
+            return PostingIndex.from_arrays(arrays, self.__columns.artists)
+        return PostingIndex(self.__columns.artist_ids, self.__columns.artists,
+                            self.__columns.sort_key('artist'))
+
+    @cached_property
+    def __album_index(self) -> PostingIndex:
+        arrays = self.__snapshot.get('album_index')
+        if arrays is not None:
+            return PostingIndex.from_arrays(arrays, self.__columns.albums)
+        return PostingIndex(self.__columns.album_ids, self.__columns.albums,
+                            self.__columns.sort_key('album'))
+
+    @cached_property
+    def __song_runs(self) -> RunLengthIndex:
+        arrays = self.__snapshot.get('song_runs')
+        if arrays is not None:
+            return RunLengthIndex.from_arrays(arrays, self.__columns.songs)
+        return RunLengthIndex(self.__columns.song_ids, self.__columns.songs)
+
+    @cached_property
+    def __artist_runs(self) -> RunLengthIndex:
+        arrays = self.__snapshot.get('artist_runs')
+        if arrays is not None:
+            return RunLengthIndex.from_arrays(arrays, self.__columns.artists)
+        return RunLengthIndex(self.__columns.artist_ids, self.__columns.artists)
+
+    @cached_property
+    def __album_runs(self) -> RunLengthIndex:
+        arrays = self.__snapshot.get('album_runs')
+        if arrays is not None:
+            return RunLengthIndex.from_arrays(arrays, self.__columns.albums)
+        return RunLengthIndex(self.__columns.album_ids, self.__columns.albums)
+
+    @cached_property
+    def __song_days(self) -> EntityDayIndex:
+        arrays = self.__snapshot.get('song_days')
+        if arrays is not None:
+            return EntityDayIndex.from_arrays(arrays)
+        return EntityDayIndex(self.__song_index, self.__columns.uts)
+
+    @cached_property
+    def __artist_days(self) -> EntityDayIndex:
+        arrays = self.__snapshot.get('artist_days')
+        if arrays is not None:
+            return EntityDayIndex.from_arrays(arrays)
+        return EntityDayIndex(self.__artist_index, self.__columns.uts)
+
+    @cached_property
+    def __album_days(self) -> EntityDayIndex:
+        arrays = self.__snapshot.get('album_days')
+        if arrays is not None:
+            return EntityDayIndex.from_arrays(arrays)
+        return EntityDayIndex(self.__album_index, self.__columns.uts)
+
+    @cached_property
+    def __rollups(self) -> Rollups:
+        # prefer the rollups persisted next to the columnar file, as long as
+        # they were built from the same columns
+        rollups = None
+        if self.__rollup_file is not None and exists(self.__rollup_file):
+            rollups = open_rollups(self.__rollup_file, self.__columns)
+        return rollups or build_rollups(self.__columns)
+
+    @cached_property
+    def __engine(self):
+        '''
+        The NumPy engine used for aggregations, or None if NumPy isn't
+        installed (the pure-Python indexes are used instead)
+        '''
+        if not numpy_available():
+            return None
+        return NumpyEngine(self.__columns)
@@ -0,0 +1,229 @@
+import mmap
+import struct
+from sys import argv, byteorder
+from array import array
+from os import path, replace, fsync, remove
+from scrobble_columns import ScrobbleColumns
+from scrobble_parser import parse_files
+from segment_manifest import SegmentManifest
+from rollup_store import build_rollups, write_rollups, default_rollup_file
+from snapshot_store import source_fingerprint, read_fingerprint, \
+    default_snapshot_file
+
+
+'''
+------------------------------------------------------------------------------
+A binary, columnar alternative to the scrobbled_data txt files. Layout (every
+section starts on an 8 byte boundary):
+    header          magic, byte order, num rows, num artists/albums/songs
+    uts             int64[num rows]        (epoch seconds, oldest-first)
+    artist_ids      uint32[num rows]
+    album_ids       uint32[num rows]
+    song_ids        uint32[num rows]
+    artists         uint64[num artists + 1] offsets, then the utf-8 blob
+    albums          "
+    songs           "
+    album_artists   uint32[num albums]     (the artist id of every album id)
+    song_artists    uint32[num songs]      (the artist id of every song id)
+Files are opened with mmap and the columns are zero-copy memoryviews, so
+opening even a multi-million scrobble history doesn't parse anything. The
+month/year rollups (see rollup_store.py) are written alongside. Usage:
+    python columnar_store.py <scrobbled_data txt file> [<columnar file>]
+------------------------------------------------------------------------------
+'''
+
+MAGIC = b'FFMCOLS2'
+HEADER = struct.Struct('<8s8sQQQQ')
+ALIGNMENT = 8
+
+
+class StringTable():
+    '''
+    A read-only table of strings backed by a mapped offsets array and utf-8
+    blob. Strings are only decoded when first accessed
+    '''
+
+    def __init__(self, offsets, blob):
+        self.__offsets = offsets
+        self.__blob = blob
+        self.__decoded = [None] * (len(offsets) - 1)
+
+    def __len__(self):
+        return len(self.__decoded)
+
+    def __getitem__(self, i):
+        name = self.__decoded[i]
+        if name is None:
+            start, end = self.__offsets[i], self.__offsets[i + 1]
+            name = str(self.__blob[start:end], 'utf-8')
+            self.__decoded[i] = name
+        return name
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+def write_columns(columns:ScrobbleColumns, col_file):
+    '''
+    Writes the columns to the given file (atomically, via a temp file)
+    '''
+    temp_file = f'{col_file}.tmp'
+    tables = [columns.artists, columns.albums, columns.songs]
+    with open(temp_file, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, byteorder.encode().ljust(8, b'\0'),
+                            len(columns), *(len(table) for table in tables)))
+        for values, typecode in ((columns.uts, 'q'),
+                                 (columns.artist_ids, 'I'),
+                                 (columns.album_ids, 'I'),
+                                 (columns.song_ids, 'I')):
+            _write_aligned(f, array(typecode, values).tobytes())
+        for table in tables:
+            encoded = [name.encode() for name in table]
+            offsets = array('Q', [0])
+            for name in encoded:
+                offsets.append(offsets[-1] + len(name))
+            _write_aligned(f, offsets.tobytes())
+            _write_aligned(f, b''.join(encoded))
+        for values in (columns.album_artist_ids, columns.song_artist_ids):
+            _write_aligned(f, array('I', values).tobytes())
+        f.flush()
+        fsync(f.fileno())
+    replace(temp_file, col_file)
+
+
+def open_columns(col_file) -> ScrobbleColumns:
+    '''
+    Maps the given columnar file into memory and returns its columns as
+    zero-copy views. Files written on a machine with a different byte order
+    are still readable, they just get copied (and byteswapped) instead
+    '''
+    with open(col_file, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(buffer)
+    magic, order, num_rows, *table_sizes = HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise ValueError(f'{col_file} is not a columnar scrobble file')
+    swap = order.rstrip(b'\0').decode() != byteorder
+    pos = _align(HEADER.size)
+
+    def take(typecode, count):
+        nonlocal pos
+        size = count * array(typecode).itemsize
+        section = view[pos:pos + size]
+        pos = _align(pos + size)
+        if not swap:
+            return section.cast(typecode)
+        values = array(typecode, section)
+        values.byteswap()
+        return values
+
+    uts = take('q', num_rows)
+    ids = [take('I', num_rows) for _ in range(3)]
+    tables = []
+    for num_names in table_sizes:
+        offsets = take('Q', num_names + 1)
+        blob = view[pos:pos + offsets[-1]]
+        pos = _align(pos + offsets[-1])
+        tables.append(StringTable(offsets, blob))
+    album_artist_ids = take('I', table_sizes[1])
+    song_artist_ids = take('I', table_sizes[2])
+    return ScrobbleColumns(uts, *ids, *tables, album_artist_ids,
+                           song_artist_ids)
+
+
+def convert_txt_file(txt_file, col_file=None) -> str:
+    '''
+    Converts a user's scrobbled_data txt file (along with any newer segments
+    listed in its manifest) into a columnar file and its rollup file. Returns
+    the columnar file's path, which defaults to the txt file's path with a
+    `.cols` extension
+    '''
+    if col_file is None:
+        col_file = default_col_file(txt_file)
+    # the segments are streamed straight into the parser (a pool of them,
+    # for a large history), so the text is never held in memory all at once
+    columns = parse_files([
+        file for file in SegmentManifest(txt_file).segment_files()
+        if path.exists(file)])
+    write_columns(columns, col_file)
+    write_rollups(build_rollups(columns), columns,
+                  default_rollup_file(col_file))
+    # a snapshot of the old columns' indexes is of no use anymore
+    snapshot_file = default_snapshot_file(col_file)
+    if path.exists(snapshot_file):
+        remove(snapshot_file)
+    return col_file
+
+
+def needs_conversion(txt_file, col_file=None) -> bool:
+    '''
+    Checks if the columnar (or rollup) file is missing or in an older
+    format, or if the txt file's segments no longer match the fingerprint
+    saved in the snapshot (i.e. a sync has happened since it was written)
+    '''
+    if col_file is None:
+        col_file = default_col_file(txt_file)
+    if not _has_columns(col_file):
+        return True
+    snapshot_file = default_snapshot_file(col_file)
+    return read_fingerprint(snapshot_file) != txt_fingerprint(txt_file)
+
+
+def can_extend(txt_file, segment_file, col_file=None) -> bool:
+    '''
+    Checks if the columnar file holds every segment of the txt file except
+    the given (newest) one, i.e. a sync's new segment can be appended to it
+    (see Catalog.append) instead of converting everything again
+    '''
+    if col_file is None:
+        col_file = default_col_file(txt_file)
+    if not _has_columns(col_file) or not path.exists(segment_file):
+        return False
+    snapshot_file = default_snapshot_file(col_file)
+    older = [file for file in SegmentManifest(txt_file).segment_files()
+             if file != segment_file and path.exists(file)]
+    return read_fingerprint(snapshot_file) == source_fingerprint(older)
+
+
+def txt_fingerprint(txt_file) -> bytes:
+    '''
+    Fingerprints every existing segment of the given scrobbled_data txt file
+    (see snapshot_store.source_fingerprint)
+    '''
+    return source_fingerprint(
+        file for file in SegmentManifest(txt_file).segment_files()
+        if path.exists(file))
+
+
+def default_col_file(txt_file) -> str:
+    root, _ = path.splitext(txt_file)
+    return f'{root}.cols'
+
+
+def _has_columns(col_file) -> bool:
+    '''
+    Checks that the columnar file and its rollup file exist, and that the
+    columnar file is in the current format
+    '''
+    if not path.exists(col_file) or \
+            not path.exists(default_rollup_file(col_file)):
+        return False
+    with open(col_file, 'rb') as f:
+        # (an older version of the format has a different magic)
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _align(pos):
+    return -(-pos // ALIGNMENT) * ALIGNMENT
+
+
+def _write_aligned(f, data):
+    f.write(data)
+    padding = _align(f.tell()) - f.tell()
+    f.write(b'\0' * padding)
+
+
+if __name__ == '__main__':
+    txt_file = argv[1]
+    col_file = convert_txt_file(txt_file, argv[2] if len(argv) > 2 else None)
+    print(f'Wrote {len(open_columns(col_file)):,} scrobbles to {col_file}')
@@ -0,0 +1,83 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+from scrobble_columns import growable
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+class DayIndex():
+    '''
+    A compressed-sparse-row style index of the days a user scrobbled on.
+    `days` holds the sorted, distinct date ordinals and `offsets` the row
+    each of them starts at in the (chronologically sorted) columns, so the
+    rows of day `days[i]` are `range(offsets[i], offsets[i + 1])`. A day or a
+    range of days resolves to a contiguous range of rows by binary search
+    '''
+
+    def __init__(self, uts):
+        '''
+        Build the index from a sorted column of epoch timestamps
+        '''
+        self.__days = array('q')
+        self.__offsets = array('Q', [0])
+        self.extend(uts, 0)
+
+    @classmethod
+    def from_arrays(cls, arrays:dict):
+        ''' Restore an index from the arrays saved by to_arrays '''
+        index = cls.__new__(cls)
+        index.__days = arrays['days']
+        index.__offsets = arrays['offsets']
+        return index
+
+    def to_arrays(self) -> dict:
+        return {'days': self.__days, 'offsets': self.__offsets}
+
+    def extend(self, uts, start):
+        '''
+        Indexes the rows of the (extended) column of epoch timestamps from
+        `start` on, in O(new days). Rows on the last indexed day just move
+        its end
+        '''
+        days = self.__days = growable(self.__days)
+        offsets = self.__offsets = growable(self.__offsets)
+        row = start
+        while row < len(uts):
+            epoch_day = uts[row] // 86400
+            # jump straight to the first row of the next day
+            row = bisect_left(uts, (epoch_day + 1) * 86400, row)
+            if days and days[-1] == EPOCH_ORDINAL + epoch_day:
+                offsets[-1] = row
+            else:
+                days.append(EPOCH_ORDINAL + epoch_day)
+                offsets.append(row)
+
+    def __len__(self):
+        ''' Returns the number of distinct days '''
+        return len(self.__days)
+
+    def rows_on(self, day:date) -> range:
+        '''
+        Returns the rows scrobbled on the given day (empty if there are none)
+        '''
+        return self.rows_between(day, day)
+
+    def rows_between(self, start:date, end:date) -> range:
+        '''
+        Returns the rows scrobbled between the given days (both inclusive)
+        '''
+        lo = bisect_left(self.__days, start.toordinal())
+        hi = bisect_right(self.__days, end.toordinal())
+        if hi <= lo:
+            return range(0)
+        return range(self.__offsets[lo], self.__offsets[hi])
+
+    def counts(self):
+        '''
+        Yields a (date ordinal, num rows) tuple for every day, in
+        chronological order
+        '''
+        offsets = self.__offsets
+        for i, ordinal in enumerate(self.__days):
+            yield ordinal, offsets[i + 1] - offsets[i]
@@ -0,0 +1,154 @@
+from array import array
+from collections import Counter
+from bisect import bisect_left, bisect_right
+from day_index import EPOCH_ORDINAL
+from posting_index import PostingIndex
+
+
+class EntityDayIndex():
+    '''
+    A sparse entity x day matrix of play counts for one kind of item (artist,
+    album or song), stored row by row: for every item id, `days` holds the
+    sorted date ordinals it was played on, `offsets[id]:offsets[id + 1]`
+    being the slice for that id. Rather than the counts themselves,
+    `cumulative[i]` holds the number of plays in every entry before `i`, so
+    the plays of an item over any range of days is the difference of two
+    prefix sums, found by binary search. Plays appended with `extend` are
+    kept the same way in small per-id overflow arrays, which `to_arrays`
+    folds back in
+    '''
+
+    def __init__(self, postings:PostingIndex, uts):
+        '''
+        Build the index from a PostingIndex (whose posting lists are sorted
+        chronologically) and the column of epoch timestamps
+        '''
+        self.__days = array('I')
+        self.__cumulative = array('Q')
+        self.__offsets = array('Q', [0])
+        days, cumulative = self.__days, self.__cumulative
+        row_count = 0
+        for item_id in range(len(postings)):
+            prev_day = None
+            for row in postings.rows_of_id(item_id):
+                day = EPOCH_ORDINAL + uts[row] // 86400
+                if day != prev_day:
+                    # every play counted so far precedes this entry
+                    days.append(day)
+                    cumulative.append(row_count)
+                    prev_day = day
+                row_count += 1
+            self.__offsets.append(len(days))
+        cumulative.append(row_count)
+        self.__extra = {}
+
+    @classmethod
+    def from_arrays(cls, arrays:dict):
+        ''' Restore an index from the arrays saved by to_arrays '''
+        index = cls.__new__(cls)
+        index.__days = arrays['days']
+        index.__cumulative = arrays['cumulative']
+        index.__offsets = arrays['offsets']
+        index.__extra = {}
+        return index
+
+    def to_arrays(self) -> dict:
+        if self.__extra:
+            self.__compact()
+        return {'days': self.__days, 'cumulative': self.__cumulative,
+                'offsets': self.__offsets}
+
+    def extend(self, ids, uts, start):
+        '''
+        Counts the plays in the rows of the (extended) id and timestamp
+        columns from `start` on, in O(new rows)
+        '''
+        extra = self.__extra
+        for row in range(start, len(ids)):
+            day = EPOCH_ORDINAL + uts[row] // 86400
+            entries = extra.get(ids[row])
+            if entries is None:
+                entries = extra[ids[row]] = (array('I'), array('Q', [0]))
+            days, cumulative = entries
+            if days and days[-1] == day:
+                cumulative[-1] += 1
+            else:
+                days.append(day)
+                cumulative.append(cumulative[-1] + 1)
+
+    def count_on(self, item_id, ordinal) -> int:
+        '''
+        Returns the number of plays of the given item on the given day (date
+        ordinal), found by binary search within the item's days
+        '''
+        return self.count_between(item_id, ordinal, ordinal)
+
+    def count_between(self, item_id, start, end) -> int:
+        '''
+        Returns the number of plays of the given item between the given days
+        (date ordinals, both inclusive) in O(log n), however wide the range
+        '''
+        count = 0
+        for days, cumulative, lo, hi in self.__entries(item_id):
+            first = bisect_left(days, start, lo, hi)
+            last = bisect_right(days, end, first, hi)
+            count += cumulative[last] - cumulative[first]
+        return count
+
+    def busiest_days(self, item_ids) -> tuple[list[int], int]:
+        '''
+        Returns the date ordinal(s) the given items (together) were played the
+        most on, chronologically, along with the number of plays on those days
+        '''
+        counts = Counter()
+        for item_id in item_ids:
+            for days, cumulative, lo, hi in self.__entries(item_id):
+                for i in range(lo, hi):
+                    counts[days[i]] += cumulative[i + 1] - cumulative[i]
+        if not counts:
+            return [], 0
+        max_count = max(counts.values())
+        return sorted(day for day, count in counts.items()
+                      if count == max_count), max_count
+
+    def __entries(self, item_id) -> list[tuple]:
+        '''
+        Returns the (days, cumulative, lo, hi) slices holding the item's
+        entries: its slice of the indexed arrays, then its overflow arrays
+        '''
+        offsets = self.__offsets
+        entries = []
+        if item_id + 1 < len(offsets):
+            entries.append((self.__days, self.__cumulative, offsets[item_id],
+                            offsets[item_id + 1]))
+        extra = self.__extra.get(item_id)
+        if extra is not None:
+            days, cumulative = extra
+            entries.append((days, cumulative, 0, len(days)))
+        return entries
+
+    def __compact(self):
+        '''
+        Folds the overflow arrays back into the indexed arrays
+        '''
+        days = array('I')
+        cumulative = array('Q')
+        offsets = array('Q', [0])
+        num_ids = max(len(self.__offsets) - 1, max(self.__extra) + 1)
+        row_count = 0
+        for item_id in range(num_ids):
+            for entry_days, entry_cumulative, lo, hi in \
+                    self.__entries(item_id):
+                for i in range(lo, hi):
+                    count = entry_cumulative[i + 1] - entry_cumulative[i]
+                    if len(days) > offsets[-1] and days[-1] == entry_days[i]:
+                        row_count += count  # the same day, merged
+                        continue
+                    days.append(entry_days[i])
+                    cumulative.append(row_count)
+                    row_count += count
+            offsets.append(len(days))
+        cumulative.append(row_count)
+        self.__days, self.__cumulative, self.__offsets = \
+            days, cumulative, offsets
+        self.__extra = {}
@@ -3,6 +3,10 @@ from time import sleep
 from ansi import ANSI
 from catalog import Catalog
 from my_enums import MainMenuChoices, QueryType
+from columnar_store import convert_txt_file, needs_conversion, \
+    can_extend, default_col_file, txt_fingerprint
+from snapshot_store import default_snapshot_file
+from scrobble_parser import iter_file_lines
 from api_handler import get_path, fetch_scrobbled_data, is_valid_user, \
     get_ansi_bytey
 
@@ -47,9 +51,10 @@ def run_user_interface():
     '''
     Manages the Fetch.fm UI
     '''
+    new_segment_file = None
     if not _DEBUGGING:
-        fetch_scrobbled_data(USERNAME)
-    _create_catalog()
+        new_segment_file = fetch_scrobbled_data(USERNAME)
+    _create_catalog(new_segment_file)
     _bytey_welcome_msg()
     MENU_FUNCTIONS = {
         MainMenuChoices.FUN_FACTS: option_1,
@@ -65,6 +70,7 @@ def run_user_interface():
         if my_choice == 'q':
             break
         MENU_FUNCTIONS[my_choice]()  # call corresponding function (switch)
+    _save_catalog_snapshot()
 
 
 def display_main_menu():
@@ -323,15 +329,43 @@ def _bytey_welcome_msg():
     print_text_animated(f'\n{msg}\n', 0)
 
 
-def _create_catalog():
+def _create_catalog(new_segment_file=None):
     '''
-    Creates the user's global catalog object
+    Creates the user's global catalog object, given the new segment the sync
+    saved (if any)
     '''
     global CATALOG
     file_path = get_path('scrobbled_data', f'{USERNAME}.txt')
-    with open(file_path, 'r') as f:
-        scrobbled_data = f.readlines()
-        CATALOG = Catalog(USERNAME, scrobbled_data)
+    col_file = default_col_file(file_path)
+    if new_segment_file is not None and can_extend(file_path,
+                                                   new_segment_file):
+        # only the sync's new scrobbles are missing from the columnar copy,
+        # so they're appended to it (and to the indexes in its snapshot)
+        # rather than converting the user's whole history again
+        CATALOG = Catalog.open(USERNAME, col_file)
+        CATALOG.append(iter_file_lines(new_segment_file))
+        CATALOG.save_columns(col_file)
+        CATALOG.save_snapshot(default_snapshot_file(col_file),
+                              txt_fingerprint(file_path))
+    elif needs_conversion(file_path):
+        # (re)build the columnar copy of the user's data after a sync. Its
+        # (still empty) snapshot records which data it was built from
+        fingerprint = txt_fingerprint(file_path)
+        convert_txt_file(file_path)
+        CATALOG = Catalog.open(USERNAME, col_file)
+        CATALOG.save_snapshot(default_snapshot_file(col_file), fingerprint)
+    else:
+        CATALOG = Catalog.open(USERNAME, col_file)
+
+
+def _save_catalog_snapshot():
+    '''
+    Saves the indexes the catalog built this session, so later launches just
+    map them back in
+    '''
+    file_path = get_path('scrobbled_data', f'{USERNAME}.txt')
+    snapshot_file = default_snapshot_file(default_col_file(file_path))
+    CATALOG.save_snapshot(snapshot_file, txt_fingerprint(file_path))
 
 
 def _read_user_info_txt_file():
@@ -451,7 +485,7 @@ def _run_option_2_for_songs():
         return
     # if we get here, the user has relevant listening time data
     song, artist, total_seconds = result
-    playcount = CATALOG.num_plays_for_song(song)
+    playcount = CATALOG.num_plays_for_song(song, artist)
     _print_opt2_output(playcount, total_seconds, f'{song} by {artist}')
 
 
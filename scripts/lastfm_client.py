@@ -0,0 +1,147 @@
+import requests
+from random import uniform
+from threading import Lock
+from time import sleep
+from requests.adapters import HTTPAdapter
+
+
+class LastfmClient():
+    '''
+    A pooled, retrying HTTP client used to make every Last.fm API request.
+    Keeps a single keep-alive session, applies per-request timeouts and
+    retries transient failures with jittered exponential backoff
+    '''
+
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+    # 8: operation failed, 11: service offline, 16: temporarily unavailable,
+    # 29: rate limit exceeded
+    RETRY_API_ERRORS = {8, 11, 16, 29}
+    RATE_LIMIT_API_ERROR = 29
+
+    def __init__(self, base_url, api_key, user_agent, rate_limiter=None,
+                 timeout=(3.05, 20), max_retries=5, backoff_base=0.5,
+                 backoff_cap=30, pool_size=10):
+        '''
+        Create a new client. `timeout` is a (connect, read) tuple in seconds
+        and `rate_limiter` (if provided) is acquired before every attempt
+        '''
+        self.__base_url = base_url
+        self.__api_key = api_key
+        self.__rate_limiter = rate_limiter
+        self.__timeout = timeout
+        self.__max_retries = max_retries
+        self.__backoff_base = backoff_base
+        self.__backoff_cap = backoff_cap
+        # a single session means connections (and TLS handshakes) get reused
+        self.__adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.__session = requests.Session()
+        self.__session.mount('http://', self.__adapter)
+        self.__session.mount('https://', self.__adapter)
+        self.__session.headers['user-agent'] = user_agent
+        self.__lock = Lock()
+        self.__counters = {'requests': 0, 'retries': 0, 'rate_limited': 0,
+                           'errors': 0}
+
+    def get(self, payload):
+        '''
+        Makes a GET request for the given payload, retrying transient errors.
+        Returns the final response (which may itself be an error response), or
+        None if no response could be received at all
+        '''
+        params = dict(payload, api_key=self.__api_key, format='json')
+        response = None
+        for attempt in range(self.__max_retries + 1):
+            if self.__rate_limiter is not None:
+                self.__rate_limiter.acquire()
+            self.__count('requests')
+            try:
+                response = self.__session.get(self.__base_url, params=params,
+                                              timeout=self.__timeout)
+            except requests.RequestException:
+                # connection reset, timeout, etc.
+                self.__count('errors')
+                response = None
+            else:
+                if not self.__is_retryable(response):
+                    return response
+            if attempt == self.__max_retries:
+                break
+            self.__count('retries')
+            sleep(self.__get_delay(attempt, response))
+        return response
+
+    def stats(self) -> dict:
+        '''
+        Returns a dict of counters for requests made, retries, rate-limit
+        responses and connection errors, as well as the number of connections
+        opened vs reused by the session's pool
+        '''
+        with self.__lock:
+            result = dict(self.__counters)
+        num_connections = 0
+        num_pool_requests = 0
+        pools = self.__adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                num_connections += pool.num_connections
+                num_pool_requests += pool.num_requests
+        result['connections_opened'] = num_connections
+        result['connections_reused'] = max(0, num_pool_requests
+                                              - num_connections)
+        return result
+
+    def close(self):
+        self.__session.close()
+
+    def __is_retryable(self, response):
+        '''
+        Returns a bool indicating if the response is a transient failure that
+        is worth retrying
+        '''
+        if self.__is_rate_limited(response):
+            self.__count('rate_limited')
+            return True
+        if response.status_code in self.RETRY_STATUS_CODES:
+            return True
+        return self.__get_api_error(response) in self.RETRY_API_ERRORS
+
+    def __is_rate_limited(self, response):
+        return (response.status_code == 429 or self.__get_api_error(response)
+                == self.RATE_LIMIT_API_ERROR)
+
+    def __get_api_error(self, response):
+        '''
+        Returns the Last.fm error code contained in the response body (if any)
+        '''
+        if response.status_code == 200 and b'"error"' not in response.content:
+            return None  # fast path, avoids decoding every successful body
+        try:
+            j_res = response.json()
+        except ValueError:
+            return None
+        if isinstance(j_res, dict) and 'error' in j_res:
+            return int(j_res['error'])
+        return None
+
+    def __get_delay(self, attempt, response):
+        '''
+        Returns how long to sleep before the next attempt, using exponential
+        backoff with full jitter. Rate-limit responses honor `Retry-After` and
+        also pause the shared rate limiter so every worker backs off
+        '''
+        ceiling = min(self.__backoff_cap, self.__backoff_base * 2 ** attempt)
+        delay = uniform(0, ceiling)
+        if response is not None and self.__is_rate_limited(response):
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                delay = max(delay, int(retry_after))
+            else:
+                delay = max(delay, ceiling)
+            if self.__rate_limiter is not None:
+                self.__rate_limiter.pause(delay)
+        return delay
+
+    def __count(self, counter):
+        with self.__lock:
+            self.__counters[counter] += 1
@@ -0,0 +1,374 @@
+import json
+from sys import argv
+from time import sleep
+from random import Random
+from bisect import bisect_left, bisect_right
+from threading import Lock, Thread
+from collections import Counter
+from datetime import datetime, timezone
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from rate_limiter import TokenBucket
+
+
+'''
+------------------------------------------------------------------------------
+A local stand-in for the Last.fm API, serving synthetic (but deterministic)
+responses for the methods Fetch.fm uses:
+    -  user.getRecentTracks
+    -  user.getInfo
+    -  track.getInfo
+    -  album.getInfo
+    -  artist.getCorrection
+Latency, error rates and rate limiting are configurable so the fetching
+pipeline can be measured and regression-tested offline. To run Fetch.fm
+against it, start the server and then set:
+    LASTFM_API_URL=http://127.0.0.1:<port>/2.0/  LASTFM_API_KEY=standin
+    LASTFM_USER_AGENT=standin
+------------------------------------------------------------------------------
+'''
+
+
+class SyntheticHistory():
+    '''
+    A deterministic, randomly generated scrobble history for a single user
+    '''
+
+    SONGS_PER_ALBUM = 10
+    ALBUMS_PER_ARTIST = 3
+
+    def __init__(self, num_scrobbles, seed=0, end_uts=None,
+                 avg_gap_secs=600):
+        '''
+        Generate `num_scrobbles` scrobbles ending at `end_uts` (defaults to
+        now), spaced `avg_gap_secs` apart on average
+        '''
+        self.__rng = Random(seed)
+        self.__num_artists = max(10, num_scrobbles // 200)
+        if end_uts is None:
+            end_uts = int(datetime.now().timestamp()) - 60
+        # scrobbles are stored oldest-first, as (uts, artist, album, song)
+        # indices, which keeps `from`/`to` filtering a binary search
+        self.__uts = []
+        self.__tracks = []
+        start_uts = end_uts - num_scrobbles * avg_gap_secs
+        self.registered_uts = start_uts - 86400
+        self.__lock = Lock()
+        self.__append(num_scrobbles, start_uts, end_uts)
+
+    def add_scrobbles(self, num_scrobbles):
+        '''
+        Appends `num_scrobbles` newer scrobbles (i.e. the user kept listening),
+        squeezed in between the newest scrobble and now
+        '''
+        with self.__lock:
+            start_uts = self.__uts[-1] if self.__uts else 0
+            end_uts = int(datetime.now().timestamp()) - 60
+            self.__append(num_scrobbles, start_uts, end_uts)
+
+    def __len__(self):
+        return len(self.__uts)
+
+    def get_range(self, from_uts, to_uts) -> list[tuple]:
+        '''
+        Returns the scrobbles within [from_uts, to_uts], newest-first
+        '''
+        with self.__lock:
+            lo = 0 if from_uts is None else bisect_left(self.__uts, from_uts)
+            hi = (len(self.__uts) if to_uts is None
+                  else bisect_right(self.__uts, to_uts))
+            rows = [(self.__uts[i], *self.__tracks[i]) for i in range(lo, hi)]
+        rows.reverse()
+        return rows
+
+    def num_artists(self):
+        return self.__num_artists
+
+    def lines(self) -> list[str]:
+        '''
+        Returns the history as scrobbled_data txt lines (newest-first), i.e.
+        exactly what Fetch.fm saves after fetching it
+        '''
+        day_cache = {}
+        lines = []
+        for uts, artist, album, song in self.get_range(None, None):
+            day, minute = divmod(uts, 86400)
+            if day not in day_cache:
+                term = datetime.fromtimestamp(day * 86400, timezone.utc)
+                day_cache[day] = term.strftime('%d %b %Y')
+            lines.append(f'{day_cache[day]}, {minute // 3600:02d}:'
+                         f'{minute % 3600 // 60:02d}\t{_artist_name(artist)}\t'
+                         f'{_album_name(album)}\t{_song_name(song)}\n')
+        return lines
+
+    def __append(self, num_scrobbles, start_uts, end_uts):
+        '''
+        Appends `num_scrobbles` scrobbles with distinct timestamps within
+        (start_uts, end_uts]
+        '''
+        if end_uts - start_uts < num_scrobbles:
+            raise ValueError('not enough room for that many scrobbles')
+        rng = self.__rng
+        for uts in sorted(rng.sample(range(start_uts + 1, end_uts + 1),
+                                     num_scrobbles)):
+            # skew the distribution so a few artists get most of the plays
+            artist = int(self.__num_artists * rng.random() ** 3)
+            album = rng.randrange(self.ALBUMS_PER_ARTIST)
+            song = rng.randrange(self.SONGS_PER_ALBUM)
+            self.__uts.append(uts)
+            self.__tracks.append((artist, album, song))
+
+
+class StandinServer():
+    '''
+    A threaded HTTP server imitating the Last.fm API for a synthetic history
+    '''
+
+    def __init__(self, history, port=0, latency=0.0, error_rate=0.0,
+                 rate_limit=None, seed=0):
+        '''
+        Create (but don't start) a new server. `latency` is the number of
+        seconds each response is delayed by, `error_rate` is the fraction of
+        requests answered with a transient error (a 500 or a Last.fm error
+        29), and `rate_limit` (requests/sec, None for unlimited) makes the
+        server answer with error 29 when clients exceed it
+        '''
+        self.history = history
+        self.latency = latency
+        self.error_rate = error_rate
+        self.__rng = Random(seed)
+        self.__rng_lock = Lock()
+        self.__bucket = (None if rate_limit is None
+                         else TokenBucket(rate_limit, rate_limit))
+        self.__stats_lock = Lock()
+        self.__stats = Counter()
+        self.__httpd = ThreadingHTTPServer(('127.0.0.1', port),
+                                           self.__make_handler())
+        self.__httpd.daemon_threads = True
+        self.__thread = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.__httpd.server_port}/2.0/'
+
+    def start(self):
+        self.__thread = Thread(target=self.__httpd.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        self.__httpd.shutdown()
+        self.__httpd.server_close()
+
+    def stats(self) -> dict:
+        '''
+        Returns counters of requests served (total and per method) as well as
+        the number of injected errors and rate-limit responses
+        '''
+        with self.__stats_lock:
+            return dict(self.__stats)
+
+    def reset_stats(self):
+        with self.__stats_lock:
+            self.__stats.clear()
+
+    def __count(self, *keys):
+        with self.__stats_lock:
+            for key in keys:
+                self.__stats[key] += 1
+
+    def __make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+            def do_GET(self):
+                params = {key: values[0] for key, values
+                          in parse_qs(urlparse(self.path).query).items()}
+                status, j_body = server._respond(params)
+                body = json.dumps(j_body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # keep the terminal quiet
+
+        return Handler
+
+    def _respond(self, params) -> tuple[int, dict]:
+        '''
+        Returns the (status code, json body) for a request
+        '''
+        method = params.get('method', '')
+        self.__count('requests', method)
+        if self.latency:
+            sleep(self.latency)
+        if self.__bucket is not None and not self.__bucket.try_acquire():
+            self.__count('rate_limited')
+            return 429, {'error': 29, 'message': 'Rate Limit Exceeded'}
+        with self.__rng_lock:
+            roll = self.__rng.random()
+            use_500 = self.__rng.random() < 0.5
+        if roll < self.error_rate:
+            self.__count('injected_errors')
+            if use_500:
+                return 500, {'error': 8, 'message': 'Operation failed'}
+            return 200, {'error': 29, 'message': 'Rate Limit Exceeded'}
+        handlers = {
+            'user.getRecentTracks': self.__get_recent_tracks,
+            'user.getInfo': self.__get_user_info,
+            'track.getInfo': self.__get_track_info,
+            'album.getInfo': self.__get_album_info,
+            'artist.getCorrection': self.__get_artist_correction
+        }
+        if method not in handlers:
+            return 400, {'error': 3, 'message': 'Invalid Method'}
+        return handlers[method](params)
+
+    def __get_recent_tracks(self, params):
+        limit = int(params.get('limit', 50))
+        page = int(params.get('page', 1))
+        from_uts = int(params['from']) if 'from' in params else None
+        to_uts = int(params['to']) if 'to' in params else None
+        rows = self.history.get_range(from_uts, to_uts)
+        total_pages = -(-len(rows) // limit)
+        j_tracks = [self.__make_track(row)
+                    for row in rows[(page - 1) * limit:page * limit]]
+        if page == 1 and to_uts is None and rows:
+            # the real API lists whatever is currently playing first
+            j_now_playing = self.__make_track(rows[0])
+            del j_now_playing['date']
+            j_now_playing['@attr'] = {'nowplaying': 'true'}
+            j_tracks.insert(0, j_now_playing)
+        j_attr = {
+            'user': params.get('user', ''),
+            'page': str(page),
+            'perPage': str(limit),
+            'totalPages': str(total_pages),
+            'total': str(len(rows))
+        }
+        return 200, {'recenttracks': {'track': j_tracks, '@attr': j_attr}}
+
+    def __get_user_info(self, params):
+        username = params.get('user', '')
+        registered = self.history.registered_uts
+        j_user = {
+            'name': username,
+            'age': '0',
+            'album_count': str(self.history.num_artists()
+                               * SyntheticHistory.ALBUMS_PER_ARTIST),
+            'artist_count': str(self.history.num_artists()),
+            'country': 'None',
+            'gender': 'n',
+            'playcount': str(len(self.history)),
+            'playlists': '0',
+            'realname': '',
+            'subscriber': '0',
+            'track_count': str(self.history.num_artists()
+                               * SyntheticHistory.ALBUMS_PER_ARTIST
+                               * SyntheticHistory.SONGS_PER_ALBUM),
+            'url': f'https://www.last.fm/user/{username}',
+            'registered': {'unixtime': str(registered), '#text': registered}
+        }
+        return 200, {'user': j_user}
+
+    def __get_track_info(self, params):
+        ids = self.__parse_ids(params.get('artist', ''), None,
+                               params.get('track', ''))
+        if ids is None:
+            return 200, {'error': 6, 'message': 'Track not found'}
+        artist, _, song = ids
+        j_track = {
+            'name': _song_name(song),
+            'duration': str(_song_seconds(artist, song) * 1000),
+            'artist': {'name': _artist_name(artist)}
+        }
+        return 200, {'track': j_track}
+
+    def __get_album_info(self, params):
+        ids = self.__parse_ids(params.get('artist', ''),
+                               params.get('album', ''), None)
+        if ids is None:
+            return 200, {'error': 6, 'message': 'Album not found'}
+        artist, album, _ = ids
+        j_tracks = [{'name': _song_name(song),
+                     'duration': _song_seconds(artist, song)}
+                    for song in range(SyntheticHistory.SONGS_PER_ALBUM)]
+        j_album = {
+            'name': _album_name(album),
+            'artist': _artist_name(artist),
+            'userplaycount': 0,
+            'tracks': {'track': j_tracks}
+        }
+        return 200, {'album': j_album}
+
+    def __get_artist_correction(self, params):
+        ids = self.__parse_ids(params.get('artist', ''), None, None)
+        if ids is None:
+            return 200, {'corrections': '\n '}
+        j_artist = {'name': _artist_name(ids[0])}
+        return 200, {'corrections': {'correction': {'artist': j_artist}}}
+
+    def __parse_ids(self, artist, album, song):
+        '''
+        Maps synthetic names back to (artist, album, song) indices, or returns
+        None if any of the provided names doesn't exist (case-insensitive,
+        imitating Last.fm's autocorrect)
+        '''
+        try:
+            ids = [int(artist.strip().lower().removeprefix('artist '))]
+            for name, prefix in ((album, 'album '), (song, 'song ')):
+                if name is None:
+                    ids.append(None)
+                else:
+                    ids.append(int(name.strip().lower().removeprefix(prefix)))
+        except ValueError:
+            return None
+        if not 0 <= ids[0] < self.history.num_artists():
+            return None
+        return tuple(ids)
+
+    def __make_track(self, row):
+        uts, artist, album, song = row
+        term = datetime.fromtimestamp(uts, timezone.utc)
+        return {
+            'artist': {'#text': _artist_name(artist)},
+            'album': {'#text': _album_name(album)},
+            'name': _song_name(song),
+            'date': {'uts': str(uts), '#text': term.strftime('%d %b %Y, %H:%M')}
+        }
+
+
+def _artist_name(artist):
+    return f'Artist {artist}'
+
+
+def _album_name(album):
+    return f'Album {album}'
+
+
+def _song_name(song):
+    return f'Song {song}'
+
+
+def _song_seconds(artist, song):
+    return 120 + (artist * 31 + song * 17) % 240
+
+
+if __name__ == '__main__':
+    # usage: python lastfm_standin.py [port] [num_scrobbles] [latency_secs]
+    port = int(argv[1]) if len(argv) > 1 else 8008
+    num_scrobbles = int(argv[2]) if len(argv) > 2 else 10_000
+    latency = float(argv[3]) if len(argv) > 3 else 0.0
+    server = StandinServer(SyntheticHistory(num_scrobbles), port, latency)
+    print(f'Serving {num_scrobbles:,} synthetic scrobbles at {server.url}')
+    server.start()
+    try:
+        while True:
+            sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,150 @@
+import json
+import sqlite3
+import unicodedata
+from threading import Lock
+from time import time
+
+
+class MetadataCache():
+    '''
+    A persistent (SQLite-backed) cache of Last.fm metadata lookups such as
+    track durations, album track listings and artist name corrections. Entries
+    are keyed by a normalized (kind, item, artist), expire after a TTL, and the
+    least recently used entries are evicted once the cache grows past its size
+    limit. Lookups Last.fm doesn't know about are cached as negative results
+    '''
+
+    DAY = 86400
+    TOUCH_INTERVAL = 3600  # only rewrite `last_used` once an hour per entry
+
+    def __init__(self, db_file, ttl=30 * DAY, negative_ttl=DAY,
+                 max_entries=100_000):
+        '''
+        Open (or create) the cache stored in the given SQLite file
+        '''
+        self.__ttl = ttl
+        self.__negative_ttl = negative_ttl
+        self.__max_entries = max_entries
+        self.__lock = Lock()
+        self.__counters = {'hits': 0, 'negative_hits': 0, 'misses': 0,
+                           'expired': 0, 'evictions': 0}
+        self.__conn = sqlite3.connect(db_file, check_same_thread=False)
+        with self.__conn:
+            self.__conn.execute('PRAGMA journal_mode=WAL')
+            self.__conn.execute('''
+                CREATE TABLE IF NOT EXISTS metadata (
+                    kind      TEXT NOT NULL,
+                    item      TEXT NOT NULL,
+                    artist    TEXT NOT NULL,
+                    value     TEXT,
+                    expires   REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (kind, item, artist)
+                )''')
+            self.__conn.execute('CREATE INDEX IF NOT EXISTS metadata_lru '
+                                'ON metadata (last_used)')
+        # a running row count, so puts don't need to run `COUNT(*)`
+        self.__num_entries = self.__conn.execute(
+            'SELECT COUNT(*) FROM metadata').fetchone()[0]
+
+    def get(self, kind, item, artist='') -> tuple[bool, object]:
+        '''
+        Looks up a cached result. Returns a tuple containing...
+            - `bool`: indicates if the lookup was found in the cache
+            - `object`: the cached value (None for a negative result)
+        '''
+        key = (kind, normalize(item), normalize(artist))
+        now = time()
+        with self.__lock:
+            row = self.__conn.execute(
+                'SELECT value, expires, last_used FROM metadata '
+                'WHERE kind = ? AND item = ? AND artist = ?', key).fetchone()
+            if row is None:
+                self.__counters['misses'] += 1
+                return False, None
+            value, expires, last_used = row
+            if expires < now:
+                # stale entry, treat it as a miss and let it be refetched
+                self.__counters['expired'] += 1
+                self.__counters['misses'] += 1
+                with self.__conn:
+                    cursor = self.__conn.execute(
+                        'DELETE FROM metadata WHERE kind = ? AND item = ? '
+                        'AND artist = ?', key)
+                self.__num_entries -= cursor.rowcount
+                return False, None
+            if now - last_used > self.TOUCH_INTERVAL:
+                with self.__conn:
+                    self.__conn.execute(
+                        'UPDATE metadata SET last_used = ? WHERE kind = ? '
+                        'AND item = ? AND artist = ?', (now, *key))
+            if value is None:
+                self.__counters['negative_hits'] += 1
+                return True, None
+            self.__counters['hits'] += 1
+            return True, json.loads(value)
+
+    def put(self, kind, item, artist, value, ttl=None):
+        '''
+        Stores a result in the cache. A `value` of None records that Last.fm
+        doesn't know about the given item (a negative result)
+        '''
+        key = (kind, normalize(item), normalize(artist))
+        now = time()
+        if value is None:
+            ttl = self.__negative_ttl
+        elif ttl is None:
+            ttl = self.__ttl
+        encoded = None if value is None else json.dumps(value)
+        with self.__lock, self.__conn:
+            cursor = self.__conn.execute(
+                'INSERT OR IGNORE INTO metadata VALUES (?, ?, ?, ?, ?, ?)',
+                (*key, encoded, now + ttl, now))
+            if cursor.rowcount:
+                self.__num_entries += 1
+            else:
+                # already cached, so overwrite it (the row count is unchanged)
+                self.__conn.execute(
+                    'UPDATE metadata SET value = ?, expires = ?, last_used = ? '
+                    'WHERE kind = ? AND item = ? AND artist = ?',
+                    (encoded, now + ttl, now, *key))
+            self.__evict()
+
+    def stats(self) -> dict:
+        '''
+        Returns a dict of hit/miss counters along with the number of entries
+        '''
+        with self.__lock:
+            result = dict(self.__counters)
+            result['entries'] = self.__num_entries
+        lookups = result['hits'] + result['negative_hits'] + result['misses']
+        num_found = lookups - result['misses']
+        result['hit_rate'] = 0 if lookups == 0 else num_found / lookups
+        return result
+
+    def close(self):
+        with self.__lock:
+            self.__conn.close()
+
+    def __evict(self):
+        '''
+        Deletes the least recently used entries once the cache is over its
+        size limit (makes room for an extra 10% so this doesn't run every put)
+        '''
+        if self.__num_entries <= self.__max_entries:
+            return
+        num_to_evict = self.__num_entries - self.__max_entries \
+            + self.__max_entries // 10
+        cursor = self.__conn.execute(
+            'DELETE FROM metadata WHERE rowid IN (SELECT rowid FROM metadata '
+            'ORDER BY last_used LIMIT ?)', (num_to_evict,))
+        self.__num_entries -= cursor.rowcount
+        self.__counters['evictions'] += cursor.rowcount
+
+
+def normalize(text) -> str:
+    '''
+    Returns the normalized form of an item/artist name used for cache keys:
+    Unicode NFKC, casefolded, with runs of whitespace collapsed
+    '''
+    return ' '.join(unicodedata.normalize('NFKC', text).casefold().split())
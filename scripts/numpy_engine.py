@@ -0,0 +1,116 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Catalog falls back to its pure-Python indexes
+
+from day_index import EPOCH_ORDINAL
+
+
+def numpy_available() -> bool:
+    return np is not None
+
+
+class NumpyEngine():
+    '''
+    Answers Catalog's aggregation queries with NumPy, over (zero-copy) arrays
+    of the columns' entity ids and day numbers. Results match the pure-Python
+    implementation exactly, including the order ties are returned in
+    '''
+
+    KINDS = ('artist', 'album', 'song')
+
+    def __init__(self, columns):
+        self.__columns = columns
+        uts = np.frombuffer(columns.uts, dtype=np.int64)
+        self.__days = uts // 86400
+        self.__ids = {kind: np.frombuffer(columns.ids(kind), dtype=np.uint32)
+                      for kind in self.KINDS}
+        self.__counts = {}
+        self.__ranks = {}
+        self.__day_counts = None
+
+    def counts(self, kind):
+        '''
+        Returns an array of the number of plays of every artist/album/song id
+        '''
+        if kind not in self.__counts:
+            self.__counts[kind] = np.bincount(
+                self.__ids[kind], minlength=len(self.__columns.table(kind)))
+        return self.__counts[kind]
+
+    def top_ids(self, kind, k) -> list[int]:
+        '''
+        Returns the ids of the top `k` items of the given kind, ties broken
+        alphabetically (a `select` for top_k.Ranking)
+        '''
+        counts = self.counts(kind)
+        num_items = len(counts)
+        if 0 < k < num_items:
+            # only the items with at least the k-th largest count can make it
+            kth = np.argpartition(counts, num_items - k)[num_items - k]
+            candidates = np.flatnonzero(counts >= counts[kth])
+        else:
+            candidates = np.arange(num_items)
+        rank = self.__rank(kind)[candidates]
+        order = candidates[np.lexsort((rank, -counts[candidates]))][:k]
+        return order.tolist()
+
+    def most_played(self, kind) -> tuple[list, int]:
+        '''
+        Returns the alphabetically ordered name(s) with the most plays, along
+        with their number of plays
+        '''
+        counts = self.counts(kind)
+        if len(counts) == 0:
+            return [], 0
+        max_count = counts.max()
+        item_ids = np.flatnonzero(counts == max_count)
+        item_ids = item_ids[np.argsort(self.__rank(kind)[item_ids])]
+        label_of = self.__columns.label_of
+        return [label_of(kind, item_id) for item_id in item_ids], \
+            int(max_count)
+
+    def most_streamed_days(self) -> tuple[list, int]:
+        '''
+        Returns the date ordinal(s) with the most scrobbles (chronologically)
+        along with their number of scrobbles
+        '''
+        if self.__day_counts is None:
+            self.__day_counts = np.unique(self.__days, return_counts=True)
+        days, counts = self.__day_counts
+        if len(counts) == 0:
+            return [], 0
+        max_count = counts.max()
+        best_days = days[counts == max_count]
+        return [EPOCH_ORDINAL + int(day) for day in best_days], int(max_count)
+
+    def most_played_in_rows(self, kind, rows:range) -> tuple[list, int]:
+        '''
+        Returns the name(s) with the most plays within the given range of
+        rows (in order of their first play), along with their number of plays
+        '''
+        ids = self.__ids[kind][rows.start:rows.stop]
+        if len(ids) == 0:
+            return [], 0
+        item_ids, first_rows, counts = np.unique(ids, return_index=True,
+                                                 return_counts=True)
+        max_count = counts.max()
+        is_max = counts == max_count
+        item_ids = item_ids[is_max][np.argsort(first_rows[is_max])]
+        label_of = self.__columns.label_of
+        return [label_of(kind, item_id) for item_id in item_ids], \
+            int(max_count)
+
+    def __rank(self, kind):
+        '''
+        Returns every id's position in alphabetical order (same titles by
+        their artist)
+        '''
+        if kind not in self.__ranks:
+            table = self.__columns.table(kind)
+            sorted_ids = sorted(range(len(table)),
+                                key=self.__columns.sort_key(kind))
+            rank = np.empty(len(table), dtype=np.int64)
+            rank[sorted_ids] = np.arange(len(table))
+            self.__ranks[kind] = rank
+        return self.__ranks[kind]
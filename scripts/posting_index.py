@@ -0,0 +1,124 @@
+from array import array
+from bisect import insort
+from itertools import accumulate
+from collections import Counter
+from scrobble_columns import growable
+
+
+class PostingIndex():
+    '''
+    An index over one dictionary-encoded column (artist, album or song ids)
+    of a ScrobbleColumns. Each distinct name gets a posting list of the
+    (oldest-first) rows it was played in. The posting lists are stored back
+    to back in a single array('I'), `offsets[id]:offsets[id + 1]` being the
+    slice for a given id. The ids are also kept in alphabetical order of
+    their names (or in the order of a given sort key) for printing (names
+    are looked up through the columns, see ScrobbleColumns.ids_of). Rows
+    appended with `extend` go to small per-id overflow lists instead, which
+    `to_arrays` folds back in
+    '''
+
+    def __init__(self, ids, names, key=None):
+        '''
+        Build the index for the given id column and its string table, the ids
+        sorted by `key` (by name, if there isn't one)
+        '''
+        self.__names = names
+        # a stable sort of the row numbers by id groups each id's rows
+        # together while keeping them in chronological order
+        self.__rows = array('I', sorted(range(len(ids)), key=ids.__getitem__))
+        self.__view = memoryview(self.__rows)
+        counts = Counter(ids)
+        self.__offsets = array('Q', [0])
+        self.__offsets.extend(accumulate(counts[i] for i in range(len(names))))
+        self.__sorted_ids = array('I', sorted(range(len(names)),
+                                              key=key or names.__getitem__))
+        self.__extra = {}
+
+    @classmethod
+    def from_arrays(cls, arrays:dict, names):
+        '''
+        Restore an index from the arrays saved by to_arrays (e.g. zero-copy
+        views into a snapshot file)
+        '''
+        index = cls.__new__(cls)
+        index.__names = names
+        index.__rows = arrays['rows']
+        index.__view = memoryview(index.__rows)
+        index.__offsets = arrays['offsets']
+        index.__sorted_ids = arrays['sorted_ids']
+        index.__extra = {}
+        return index
+
+    def to_arrays(self) -> dict:
+        if self.__extra:
+            self.__compact()
+        return {'rows': self.__rows, 'offsets': self.__offsets,
+                'sorted_ids': self.__sorted_ids}
+
+    def extend(self, ids, start, names, key=None):
+        '''
+        Indexes the rows of the (extended) id column from `start` on, given
+        its (extended) string table and the key the ids are sorted by, in
+        O(new rows + new ids)
+        '''
+        # (the string table may have grown in place)
+        num_ids = len(self.__sorted_ids)
+        self.__names = names
+        if len(names) > num_ids:
+            # new names are slotted into alphabetical order
+            sorted_ids = self.__sorted_ids = growable(self.__sorted_ids)
+            for item_id in range(num_ids, len(names)):
+                insort(sorted_ids, item_id, key=key or names.__getitem__)
+        extra = self.__extra
+        for row in range(start, len(ids)):
+            rows = extra.get(ids[row])
+            if rows is None:
+                rows = extra[ids[row]] = array('I')
+            rows.append(row)
+
+    def __len__(self):
+        return len(self.__names)
+
+    def name_of(self, item_id) -> str:
+        return self.__names[item_id]
+
+    def rows_of_id(self, item_id):
+        '''
+        Returns the rows (oldest-first) the given id was played in, as a
+        zero-copy view into the shared posting array (or an array, if it was
+        played in rows appended since)
+        '''
+        offsets = self.__offsets
+        extra = self.__extra.get(item_id)
+        if extra is None:
+            return self.__view[offsets[item_id]:offsets[item_id + 1]]
+        if item_id + 1 >= len(offsets):
+            return extra  # only played since the index was built
+        rows = array('I', self.__view[offsets[item_id]:offsets[item_id + 1]])
+        rows.extend(extra)
+        return rows
+
+    def count_of_id(self, item_id) -> int:
+        offsets = self.__offsets
+        count = len(self.__extra.get(item_id, ()))
+        if item_id + 1 < len(offsets):
+            count += offsets[item_id + 1] - offsets[item_id]
+        return count
+
+    def sorted_ids(self):
+        ''' Returns every id, ordered alphabetically (or by the sort key) '''
+        return self.__sorted_ids
+
+    def __compact(self):
+        '''
+        Folds the overflow lists back into a single posting array
+        '''
+        rows = array('I')
+        offsets = array('Q', [0])
+        for item_id in range(len(self.__names)):
+            rows.extend(self.rows_of_id(item_id))
+            offsets.append(len(rows))
+        self.__rows, self.__offsets = rows, offsets
+        self.__view = memoryview(rows)
+        self.__extra = {}
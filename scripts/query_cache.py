@@ -0,0 +1,59 @@
+from collections import Counter, OrderedDict, namedtuple
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class QueryCache():
+    '''
+    A bounded, least-recently-used cache of query results, keyed by a
+    (query name, arguments) tuple. Every result belongs to one version of the
+    data it was computed from: the first lookup under a newer version throws
+    every older result away. Results are shared between callers, so they
+    must not be modified
+    '''
+
+    DEFAULT_MAXSIZE = 256
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.__maxsize = maxsize
+        self.__results = OrderedDict()
+        self.__version = None
+        # counted per query name
+        self.__hits = Counter()
+        self.__misses = Counter()
+
+    def __len__(self):
+        return len(self.__results)
+
+    def get(self, version, key, compute):
+        '''
+        Returns the cached result for `key`, or calls `compute()` and caches
+        what it returns (evicting the least recently used result if full)
+        '''
+        if version != self.__version:
+            self.__results.clear()
+            self.__version = version
+        try:
+            result = self.__results[key]
+        except KeyError:
+            self.__misses[key[0]] += 1
+            result = compute()
+            self.__results[key] = result
+            if len(self.__results) > self.__maxsize:
+                self.__results.popitem(last=False)
+            return result
+        self.__hits[key[0]] += 1
+        self.__results.move_to_end(key)
+        return result
+
+    def info(self, name=None) -> CacheInfo:
+        '''
+        Returns the hit/miss counters (like functools.lru_cache does), either
+        overall or for a single query name
+        '''
+        if name is None:
+            hits = sum(self.__hits.values())
+            misses = sum(self.__misses.values())
+        else:
+            hits, misses = self.__hits[name], self.__misses[name]
+        return CacheInfo(hits, misses, self.__maxsize, len(self.__results))
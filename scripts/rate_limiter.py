@@ -0,0 +1,64 @@
+from threading import Lock
+from time import monotonic, sleep
+
+
+class TokenBucket():
+    '''
+    A thread-safe token bucket used to share a single request rate between
+    several worker threads
+    '''
+
+    def __init__(self, rate, capacity):
+        '''
+        Create a new bucket which refills at `rate` tokens per second and
+        holds at most `capacity` tokens (i.e. the largest allowed burst)
+        '''
+        self.__rate = rate
+        self.__capacity = capacity
+        self.__tokens = capacity
+        self.__last_refill = monotonic()
+        self.__lock = Lock()
+
+    def acquire(self):
+        '''
+        Blocks until a token is available and then consumes it
+        '''
+        while True:
+            with self.__lock:
+                self.__refill()
+                if self.__tokens >= 1:
+                    self.__tokens -= 1
+                    return
+                # not enough tokens yet, figure out how long until there are
+                wait = (1 - self.__tokens) / self.__rate
+            sleep(wait)
+
+    def try_acquire(self) -> bool:
+        '''
+        Consumes a token if one is available, without blocking. Returns a bool
+        indicating if a token was consumed
+        '''
+        with self.__lock:
+            self.__refill()
+            if self.__tokens >= 1:
+                self.__tokens -= 1
+                return True
+            return False
+
+    def pause(self, seconds):
+        '''
+        Empties the bucket and stops it from refilling for the given number of
+        seconds (used when the API tells us we've been rate limited)
+        '''
+        with self.__lock:
+            self.__tokens = 0
+            self.__last_refill = max(self.__last_refill, monotonic() + seconds)
+
+    def __refill(self):
+        now = monotonic()
+        elapsed = max(0, now - self.__last_refill)
+        if elapsed == 0:
+            return  # still paused (or called twice in the same instant)
+        self.__tokens = min(self.__capacity,
+                            self.__tokens + elapsed * self.__rate)
+        self.__last_refill = now
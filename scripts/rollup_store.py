@@ -0,0 +1,314 @@
+import struct
+from sys import argv, byteorder
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from datetime import date
+from heapq import merge, nlargest
+from itertools import groupby
+from operator import itemgetter
+from os import path, replace, fsync
+from day_index import EPOCH_ORDINAL
+from scrobble_columns import ScrobbleColumns
+
+
+'''
+------------------------------------------------------------------------------
+Pre-aggregated month and year play counts (rollups) for every artist, album
+and song, persisted next to a user's columnar file. Each rollup table is
+stored CSR-style: the sorted period keys (`year * 12 + month - 1` for months,
+`year` for years), the offset each period's entries start at, and the
+(id, count) entries themselves, sorted by id within each period. Layout:
+    header          magic, byte order, num rows, num artists/albums/songs
+    for every kind (artist, album, song) and every period (month, year):
+        sizes       uint64[2] num periods, num entries
+        periods     uint32[num periods]
+        offsets     uint64[num periods + 1]
+        ids         uint32[num entries]
+        counts      uint32[num entries]
+The counts for any range of months come from merging the partials of the
+full years and leftover months it covers, never from the scrobbles. Usage:
+    python rollup_store.py <columnar file> [<rollup file>]
+------------------------------------------------------------------------------
+'''
+
+MAGIC = b'FFMROLL1'
+HEADER = struct.Struct('<8s8sQQQQ')
+KINDS = ('artist', 'album', 'song')
+PERIODS = ('month', 'year')
+
+
+class RollupTable():
+    '''
+    The play counts of one kind of item (artist, album or song) for every
+    period (month or year) the user scrobbled in
+    '''
+
+    def __init__(self, periods, offsets, ids, counts):
+        self.periods = periods
+        self.offsets = offsets
+        self.ids = ids
+        self.counts = counts
+
+    def partial(self, i):
+        '''
+        Yields the (id, count) entries of the i-th period, sorted by id
+        '''
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return zip(self.ids[start:end], self.counts[start:end])
+
+    def partials_between(self, first, last) -> list:
+        '''
+        Returns the partials of every period between the given keys (both
+        inclusive)
+        '''
+        lo = bisect_left(self.periods, first)
+        hi = bisect_right(self.periods, last)
+        return [self.partial(i) for i in range(lo, hi)]
+
+    def before(self, key) -> 'RollupTable':
+        '''
+        Returns a copy of the table holding only the periods before the given
+        key
+        '''
+        lo = bisect_left(self.periods, key)
+        end = self.offsets[lo]
+        return RollupTable(self.periods[:lo], self.offsets[:lo + 1],
+                           self.ids[:end], self.counts[:end])
+
+
+class Rollups():
+    '''
+    Month and year rollup tables for every kind of item, answering count and
+    top-N queries over any range of months
+    '''
+
+    def __init__(self, tables, columns:ScrobbleColumns):
+        self.__tables = tables    # {(kind, period): RollupTable}
+        self.__columns = columns  # (names the ids)
+        self.__ranks = {}
+
+    def table(self, kind, period) -> RollupTable:
+        return self.__tables[kind, period]
+
+    def extend(self, start):
+        '''
+        Counts in the rows of the (extended) columns from `start` on. Only
+        the months and years those rows fall in get counted again
+        '''
+        columns = self.__columns
+        uts = columns.uts
+        if start >= len(uts):
+            return
+        first = _month_of(uts[start])
+        month_rows = _month_rows(uts, first)
+        for kind in KINDS:
+            ids = columns.ids(kind)
+            months = [(key, Counter(ids[rows.start:rows.stop]))
+                      for key, rows in month_rows]
+            old_months = self.__tables[kind, 'month']
+            # the months of the first year that come before the new rows
+            # still count towards that year
+            first_year = Counter()
+            for i in range(bisect_left(old_months.periods, first // 12 * 12),
+                           bisect_left(old_months.periods, first)):
+                first_year.update(dict(old_months.partial(i)))
+            years = {first // 12: first_year}
+            for key, counts in months:
+                years.setdefault(key // 12, Counter()).update(counts)
+            self.__tables[kind, 'month'] = _make_table(
+                months, old_months.before(first))
+            self.__tables[kind, 'year'] = _make_table(
+                years.items(), self.__tables[kind, 'year'].before(first // 12))
+        self.__ranks = {}
+
+    def counts_between(self, kind, start:tuple, end:tuple):
+        '''
+        Yields the (id, count) of every item of the given kind played between
+        the given (month, year) periods (both inclusive), sorted by id
+        '''
+        first = _month_key(*start)
+        last = _month_key(*end)
+        if last < first:
+            return iter(())
+        months = self.__tables[kind, 'month']
+        years = self.__tables[kind, 'year']
+        # whole years are read from the year table, the months before the
+        # first and after the last whole year from the month table
+        first_year = -(-first // 12)
+        last_year = (last + 1) // 12 - 1
+        if first_year > last_year:
+            partials = months.partials_between(first, last)
+        else:
+            partials = (months.partials_between(first, first_year * 12 - 1)
+                        + years.partials_between(first_year, last_year)
+                        + months.partials_between((last_year + 1) * 12, last))
+        # a heap merge of the (id-sorted) partials, summed per id
+        merged = merge(*partials, key=itemgetter(0))
+        return ((item_id, sum(count for _, count in group))
+                for item_id, group in groupby(merged, key=itemgetter(0)))
+
+    def top_between(self, kind, n, start:tuple, end:tuple) \
+            -> list[tuple[str, int]]:
+        '''
+        Returns the top `n` (name, playcount) tuples of the given kind between
+        the given (month, year) periods, ties broken alphabetically. Names
+        are as given by ScrobbleColumns.label_of
+        '''
+        rank = self.__rank(kind)
+        top = nlargest(max(0, n), self.counts_between(kind, start, end),
+                       key=lambda entry: (entry[1], -rank[entry[0]]))
+        label_of = self.__columns.label_of
+        return [(label_of(kind, item_id), count) for item_id, count in top]
+
+    def __rank(self, kind):
+        '''
+        Returns every id's position in alphabetical order (same titles by
+        their artist)
+        '''
+        if kind not in self.__ranks:
+            columns = self.__columns
+            num_items = len(columns.table(kind))
+            rank = array('I', bytes(4 * num_items))
+            for position, item_id in enumerate(
+                    sorted(range(num_items), key=columns.sort_key(kind))):
+                rank[item_id] = position
+            self.__ranks[kind] = rank
+        return self.__ranks[kind]
+
+
+def build_rollups(columns:ScrobbleColumns) -> Rollups:
+    '''
+    Aggregates the (oldest-first) columns into month and year rollups, i.e.
+    counts every row into empty rollups
+    '''
+    tables = {(kind, period): _make_table(())
+              for kind in KINDS for period in PERIODS}
+    rollups = Rollups(tables, columns)
+    rollups.extend(0)
+    return rollups
+
+
+def write_rollups(rollups:Rollups, columns:ScrobbleColumns, rollup_file):
+    '''
+    Writes the rollups of the given columns to the given file (atomically,
+    via a temp file)
+    '''
+    temp_file = f'{rollup_file}.tmp'
+    with open(temp_file, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, byteorder.encode().ljust(8, b'\0'),
+                            *_shape(columns)))
+        for kind in KINDS:
+            for period in PERIODS:
+                table = rollups.table(kind, period)
+                sizes = array('Q', [len(table.periods), len(table.ids)])
+                for values in (sizes, table.periods, table.offsets,
+                               table.ids, table.counts):
+                    f.write(values.tobytes())
+        f.flush()
+        fsync(f.fileno())
+    replace(temp_file, rollup_file)
+
+
+def open_rollups(rollup_file, columns:ScrobbleColumns) -> Rollups:
+    '''
+    Reads the rollups of the given columns from a rollup file. Returns None
+    if the file doesn't belong to the columns (e.g. it's left over from an
+    older sync)
+    '''
+    with open(rollup_file, 'rb') as f:
+        data = memoryview(f.read())
+    magic, order, *shape = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f'{rollup_file} is not a rollup file')
+    if tuple(shape) != _shape(columns):
+        return None
+    swap = order.rstrip(b'\0').decode() != byteorder
+    pos = HEADER.size
+
+    def take(typecode, count):
+        nonlocal pos
+        values = array(typecode)
+        values.frombytes(data[pos:pos + count * values.itemsize])
+        pos += count * values.itemsize
+        if swap:
+            values.byteswap()
+        return values
+
+    tables = {}
+    for kind in KINDS:
+        for period in PERIODS:
+            num_periods, num_entries = take('Q', 2)
+            tables[kind, period] = RollupTable(
+                take('I', num_periods), take('Q', num_periods + 1),
+                take('I', num_entries), take('I', num_entries))
+    return Rollups(tables, columns)
+
+
+def default_rollup_file(col_file) -> str:
+    root, _ = path.splitext(col_file)
+    return f'{root}.rollup'
+
+
+def _shape(columns:ScrobbleColumns) -> tuple:
+    ''' The num rows and num artists/albums/songs the rollups belong to '''
+    return len(columns), *(len(columns.table(kind)) for kind in KINDS)
+
+
+def _make_table(period_counts, table:RollupTable=None) -> RollupTable:
+    '''
+    Packs (period key, Counter) pairs, in order of period, into a table (or
+    onto the end of the given table's arrays)
+    '''
+    if table is None:
+        table = RollupTable(array('I'), array('Q', [0]), array('I'),
+                            array('I'))
+    periods, offsets = table.periods, table.offsets
+    ids, counts = table.ids, table.counts
+    for key, counter in period_counts:
+        periods.append(key)
+        for item_id in sorted(counter):
+            ids.append(item_id)
+            counts.append(counter[item_id])
+        offsets.append(len(ids))
+    return table
+
+
+def _month_rows(uts, key) -> list[tuple[int, range]]:
+    '''
+    Returns the (month key, rows) of every month from the given one on that
+    has rows. Each month is a contiguous range of rows, found by binary search
+    '''
+    month_rows = []
+    start = bisect_left(uts, _month_start(key))
+    while start < len(uts):
+        end = bisect_left(uts, _month_start(key + 1), start)
+        if end > start:
+            month_rows.append((key, range(start, end)))
+        key, start = key + 1, end
+    return month_rows
+
+
+def _month_start(key) -> int:
+    ''' The `uts` the month with the given key starts at '''
+    year, month = divmod(key, 12)
+    return (date(year, month + 1, 1).toordinal() - EPOCH_ORDINAL) * 86400
+
+
+def _month_of(uts) -> int:
+    ''' The key of the month the given `uts` falls in '''
+    day = date.fromordinal(EPOCH_ORDINAL + uts // 86400)
+    return _month_key(day.month, day.year)
+
+
+def _month_key(month, year) -> int:
+    return year * 12 + month - 1
+
+
+if __name__ == '__main__':
+    from columnar_store import open_columns
+    col_file = argv[1]
+    rollup_file = argv[2] if len(argv) > 2 else default_rollup_file(col_file)
+    columns = open_columns(col_file)
+    write_rollups(build_rollups(columns), columns, rollup_file)
+    print(f'Wrote rollups of {len(columns):,} scrobbles to {rollup_file}')
@@ -0,0 +1,144 @@
+from array import array
+from bisect import bisect_left, insort
+from itertools import islice, takewhile
+from posting_index import PostingIndex
+from scrobble_columns import growable
+
+
+class RunLengthIndex():
+    '''
+    A run-length encoding of one dictionary-encoded column (artist, album or
+    song ids), i.e. every streak of consecutive plays of the same item. Runs
+    are numbered chronologically: run `r` is `lengths[r]` plays of `ids[r]`
+    starting at row `starts[r]`. Built in a single pass over the column
+    '''
+
+    def __init__(self, ids, names):
+        '''
+        Build the index for the given id column and its string table
+        '''
+        num_rows = len(ids)
+        self.__starts = array('I', [0] if num_rows else [])
+        # a new run starts wherever an id differs from the previous one
+        self.__starts.extend(
+            row for row, (prev, curr)
+            in enumerate(zip(ids, islice(ids, 1, None)), start=1)
+            if prev != curr)
+        self.__ids = array('I', (ids[start] for start in self.__starts))
+        ends = islice(self.__starts, 1, None)
+        self.__lengths = array('I', (end - start for start, end
+                                     in zip(self.__starts, ends)))
+        if num_rows:
+            self.__lengths.append(num_rows - self.__starts[-1])
+        self.__names = names
+        self.__runs_by_item = None
+        self.__runs_by_length = None
+
+    @classmethod
+    def from_arrays(cls, arrays:dict, names):
+        ''' Restore an index from the arrays saved by to_arrays '''
+        index = cls.__new__(cls)
+        index.__starts = arrays['starts']
+        index.__ids = arrays['ids']
+        index.__lengths = arrays['lengths']
+        index.__names = names
+        index.__runs_by_item = None
+        index.__runs_by_length = arrays['by_length']
+        return index
+
+    def to_arrays(self) -> dict:
+        '''
+        Returns the arrays the index can be restored from (including the
+        runs sorted by length, which get sorted now if they weren't yet)
+        '''
+        return {'starts': self.__starts, 'ids': self.__ids,
+                'lengths': self.__lengths, 'by_length': self.__by_length()}
+
+    def extend(self, ids, start, names):
+        '''
+        Adds the rows of the (extended) id column from `start` on, given its
+        (extended) string table, in O(new rows). The last run goes on if the
+        first new row plays the same item. The runs sorted by length and by
+        item are kept up to date if they've been built
+        '''
+        starts = self.__starts = growable(self.__starts)
+        run_ids = self.__ids = growable(self.__ids)
+        lengths = self.__lengths = growable(self.__lengths)
+        self.__names = names
+        by_length = self.__runs_by_length
+        if by_length is not None:
+            by_length = self.__runs_by_length = growable(by_length)
+        by_length_key = lambda run: (-lengths[run], run)
+        first_new_run = len(run_ids)
+        changed = []
+        for row in range(start, len(ids)):
+            if run_ids and run_ids[-1] == ids[row]:
+                if not changed:
+                    # the last run goes on, so it moves up by length
+                    changed.append(len(run_ids) - 1)
+                    if by_length is not None:
+                        del by_length[bisect_left(by_length, by_length_key(
+                            changed[0]), key=by_length_key)]
+                lengths[-1] += 1
+            else:
+                starts.append(row)
+                run_ids.append(ids[row])
+                lengths.append(1)
+                changed.append(len(run_ids) - 1)
+        if by_length is not None:
+            for run in changed:
+                insort(by_length, run, key=by_length_key)
+        if self.__runs_by_item is not None:
+            self.__runs_by_item.extend(run_ids, first_new_run, names)
+
+    def __len__(self):
+        ''' Returns the number of runs '''
+        return len(self.__ids)
+
+    def item_id(self, run) -> int:
+        return self.__ids[run]
+
+    def length(self, run) -> int:
+        return self.__lengths[run]
+
+    def rows(self, run) -> range:
+        ''' Returns the rows the given run spans '''
+        start = self.__starts[run]
+        return range(start, start + self.__lengths[run])
+
+    def longest(self) -> list[int]:
+        '''
+        Returns every run of the longest length, chronologically
+        '''
+        by_length = self.__by_length()
+        if not by_length:
+            return []
+        max_length = self.__lengths[by_length[0]]
+        return list(takewhile(lambda run: self.__lengths[run] == max_length,
+                              by_length))
+
+    def top(self, n) -> list[int]:
+        '''
+        Returns the `n` longest runs, longest first (ties chronologically)
+        '''
+        return list(self.__by_length()[:max(0, n)])
+
+    def runs_of(self, item_id) -> list[int]:
+        '''
+        Returns every run of the given item id, chronologically
+        '''
+        if self.__runs_by_item is None:
+            # posting lists of run numbers, grouped by item id
+            self.__runs_by_item = PostingIndex(self.__ids, self.__names)
+        return list(self.__runs_by_item.rows_of_id(item_id))
+
+    def __by_length(self) -> array:
+        '''
+        Every run, longest first (sorted on first use). The sort is stable, so
+        equally long runs stay in chronological order
+        '''
+        if self.__runs_by_length is None:
+            self.__runs_by_length = array('I', sorted(
+                range(len(self)), key=self.__lengths.__getitem__,
+                reverse=True))
+        return self.__runs_by_length
@@ -1,67 +1,79 @@
-from datetime import datetime, date, time
+from sys import intern
+from datetime import datetime, date, time, timedelta
 from track_info import TrackInfo
 
+EPOCH = datetime(1970, 1, 1)
+MONTHS = {month: i for i, month in enumerate(
+    ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct',
+     'Nov', 'Dec'], start=1)}
+
 
 class Scrobble:
     '''
-    A class to represent a Scrobble object (contains track and datetime info)
+    A class to represent a Scrobble object (contains track and datetime info).
+    Only the unix timestamp and a (possibly shared) TrackInfo are stored, the
+    datetime, date and time are derived when they're asked for
     '''
 
+    __slots__ = ('__uts', '__track')
+
     def __init__(self, input):
         '''
-        Initialize a new Scrobble object, contains information regarding
-        datetime (year, month, day, hour, minute) and TrackInfo (artist,
-        album, song) for a given Scrobble
+        Initialize a new Scrobble object from a line of scrobbled_data text,
+        contains information regarding datetime (year, month, day, hour,
+        minute) and TrackInfo (artist, album, song) for a given Scrobble
         '''
         data = input.split()
-        
+
         # extract datetime information
         day = int(data[0])
-        month = self.__convert_month_to_int(data[1])
+        month = MONTHS[data[1]]
         year = int(data[2][:4])  # ignores trailing comma
         hour = int(data[3][:2])
         minute = int(data[3][3:5])
-    
+
         # extract track information
         data = input.split('\t')
-        self.is_valid = True  # start by assuming all track info is present
+        self.__track = None  # stays None if any track info is missing
         if '' not in data:
             # success case: all necessary track info is present
-            artist = data[1]
-            album = data[2]
-            song = data[3][:-1]  # removes the \n from song
-        else:
-            # edge-case: input is missing necessary track info
-            self.is_valid = False
-            
-        # store instance variables
-        if self.is_valid:
-            self.__term = datetime(year, month, day, hour, minute)
-            self.__date = date(year, month, day)
-            self.__time = time(hour, minute)
+            artist = intern(data[1])
+            album = intern(data[2])
+            song = intern(data[3][:-1])  # removes the \n from song
             self.__track = TrackInfo(artist, album, song)
+        days = date(year, month, day).toordinal() - EPOCH.toordinal()
+        self.__uts = days * 86400 + hour * 3600 + minute * 60
 
-    def __convert_month_to_int(self, tgt):
+    @classmethod
+    def from_uts(cls, uts, track:TrackInfo):
         '''
-        Convert a month's string representation to its int equivalent
+        Create a new (valid) Scrobble from a unix timestamp and a TrackInfo,
+        skipping the text parsing done by __init__
         '''
-        MONTHS = ['', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 
-                  'Sep', 'Oct', 'Nov', 'Dec']
-        return MONTHS.index(tgt)
-    
+        scrob = cls.__new__(cls)
+        scrob.__uts = uts
+        scrob.__track = track
+        return scrob
+
+    @property
+    def is_valid(self) -> bool:
+        ''' False if the scrobble was missing any track info '''
+        return self.__track is not None
+
     def get_track(self) -> TrackInfo:
         return self.__track
-    
+
     def get_term(self) -> datetime:
-        return self.__term
-    
+        return EPOCH + timedelta(seconds=self.__uts)
+
     def get_date(self) -> date:
-        return self.__date
-    
+        return date.fromordinal(EPOCH.toordinal() + self.__uts // 86400)
+
     def get_time(self) -> time:
-        return self.__time
-    
+        minutes = self.__uts % 86400 // 60
+        return time(minutes // 60, minutes % 60)
+
     def __str__(self):
         TEMPLATE = '%-d %b %Y, %I:%M %p'
-        formatted_term = self.__term.strftime(TEMPLATE)
+        formatted_term = self.get_term().strftime(TEMPLATE)
         return f'{formatted_term}\t{self.__track}'
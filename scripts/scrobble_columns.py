@@ -0,0 +1,219 @@
+from array import array
+from datetime import datetime, timedelta
+from scrobble import Scrobble, EPOCH
+from track_info import TrackInfo
+
+
+class ScrobbleColumns():
+    '''
+    A user's scrobbles stored column-wise, oldest-first. Timestamps are unix
+    epoch seconds (int64) and artist, album and song names are dictionary
+    encoded as uint32 ids into separate string tables. Albums and songs are
+    keyed on (title, artist), so their tables may repeat a title, and
+    `album_artist_ids`/`song_artist_ids` hold the artist of every album/song
+    id. The columns can be any sequences of ints (`array`s or zero-copy
+    `memoryview`s over a mapped columnar file) and the string tables any
+    sequences of str. Newer scrobbles can be appended with `extend`
+    '''
+
+    KINDS = ('artist', 'album', 'song')
+
+    def __init__(self, uts, artist_ids, album_ids, song_ids, artists, albums,
+                 songs, album_artist_ids, song_artist_ids):
+        self.uts = uts
+        self.artist_ids = artist_ids
+        self.album_ids = album_ids
+        self.song_ids = song_ids
+        self.artists = artists
+        self.albums = albums
+        self.songs = songs
+        self.album_artist_ids = album_artist_ids
+        self.song_artist_ids = song_artist_ids
+        self.__name_to_ids = {}
+        self.__key_to_id = {}
+        self.__tracks = {}
+        self.__codes = None
+
+    def __len__(self):
+        return len(self.uts)
+
+    def table(self, kind):
+        '''
+        Returns the string table for 'artist', 'album' or 'song'
+        '''
+        return {'artist': self.artists, 'album': self.albums,
+                'song': self.songs}[kind]
+
+    def ids(self, kind):
+        '''
+        Returns the id column for 'artist', 'album' or 'song'
+        '''
+        return {'artist': self.artist_ids, 'album': self.album_ids,
+                'song': self.song_ids}[kind]
+
+    def artist_id_of(self, kind, item_id) -> int:
+        '''
+        Returns the artist id of an artist/album/song id
+        '''
+        if kind == 'artist':
+            return item_id
+        if kind == 'album':
+            return self.album_artist_ids[item_id]
+        return self.song_artist_ids[item_id]
+
+    def label_of(self, kind, item_id) -> str:
+        '''
+        Returns the name of an artist/album/song id as shown to the user.
+        Album and song titles come with their artist ("title — artist"), as
+        different artists' albums/songs may share a title
+        '''
+        if kind == 'artist':
+            return self.artists[item_id]
+        artist = self.artists[self.artist_id_of(kind, item_id)]
+        return f'{self.table(kind)[item_id]} — {artist}'
+
+    def sort_key(self, kind):
+        '''
+        Returns a key function that puts artist/album/song ids in
+        alphabetical order, albums/songs of the same title by their artist
+        '''
+        table = self.table(kind)
+        if kind == 'artist':
+            return table.__getitem__
+        artists = self.artists
+        artist_ids = (self.album_artist_ids if kind == 'album'
+                      else self.song_artist_ids)
+        return lambda item_id: (table[item_id], artists[artist_ids[item_id]])
+
+    def ids_of(self, kind, name, artist=None) -> list[int]:
+        '''
+        Returns the id(s) of an artist/album/song name, only the one by the
+        given artist if there is one (empty if it never appears in the
+        columns). The reverse lookups are built on first use
+        '''
+        if artist is not None and kind != 'artist':
+            if kind not in self.__key_to_id:
+                artists = self.artists
+                self.__key_to_id[kind] = {
+                    (name, artists[self.artist_id_of(kind, i)]): i
+                    for i, name in enumerate(self.table(kind))}
+            item_id = self.__key_to_id[kind].get((name, artist))
+            return [] if item_id is None else [item_id]
+        if kind not in self.__name_to_ids:
+            # a secondary index from every title to its (title, artist) ids
+            name_to_ids = {}
+            for i, title in enumerate(self.table(kind)):
+                name_to_ids.setdefault(title, []).append(i)
+            self.__name_to_ids[kind] = name_to_ids
+        return self.__name_to_ids[kind].get(name, [])
+
+    def extend(self, other:'ScrobbleColumns') -> range:
+        '''
+        Appends newer columns (e.g. freshly parsed scrobbles) to these ones
+        in O(len(other)), re-encoding their ids into these columns' string
+        tables. Returns the range of rows that were added. Mapped columns
+        are read-only, so they're copied into arrays the first time around
+        '''
+        if len(self) and len(other) and other.uts[0] < self.uts[-1]:
+            raise ValueError('only scrobbles newer than the last one can be '
+                             'appended')
+        if self.__codes is None:
+            self.__make_growable()
+        # every id of the other columns -> the id of the same name here
+        artist_map = [self.__encode('artist', name) for name in other.artists]
+        album_map = [
+            self.__encode('album', (title, artist_map[artist_id]))
+            for title, artist_id in zip(other.albums, other.album_artist_ids)]
+        song_map = [
+            self.__encode('song', (title, artist_map[artist_id]))
+            for title, artist_id in zip(other.songs, other.song_artist_ids)]
+        start = len(self)
+        self.uts.extend(other.uts)
+        self.artist_ids.extend(artist_map[i] for i in other.artist_ids)
+        self.album_ids.extend(album_map[i] for i in other.album_ids)
+        self.song_ids.extend(song_map[i] for i in other.song_ids)
+        return range(start, len(self))
+
+    def __make_growable(self):
+        '''
+        Copies mapped columns and string tables into arrays and lists, and
+        builds the name -> id encodings new names are checked against
+        '''
+        for name in ('uts', 'artist_ids', 'album_ids', 'song_ids',
+                     'album_artist_ids', 'song_artist_ids'):
+            setattr(self, name, growable(getattr(self, name)))
+        for name in ('artists', 'albums', 'songs'):
+            if not isinstance(getattr(self, name), list):
+                setattr(self, name, list(getattr(self, name)))
+        self.__codes = {
+            'artist': {name: i for i, name in enumerate(self.artists)},
+            'album': {key: i for i, key in enumerate(
+                zip(self.albums, self.album_artist_ids))},
+            'song': {key: i for i, key in enumerate(
+                zip(self.songs, self.song_artist_ids))}
+        }
+
+    def __encode(self, kind, key) -> int:
+        '''
+        Returns the id of an artist name or (title, artist id) key, handing
+        out the next id (and updating the reverse lookups) if it's new
+        '''
+        codes = self.__codes[kind]
+        item_id = codes.get(key)
+        if item_id is not None:
+            return item_id
+        item_id = codes[key] = len(codes)
+        if kind == 'artist':
+            name = key
+            self.artists.append(name)
+        else:
+            name, artist_id = key
+            self.table(kind).append(name)
+            if kind == 'album':
+                self.album_artist_ids.append(artist_id)
+            else:
+                self.song_artist_ids.append(artist_id)
+            if kind in self.__key_to_id:
+                artist = self.artists[artist_id]
+                self.__key_to_id[kind][name, artist] = item_id
+        if kind in self.__name_to_ids:
+            self.__name_to_ids[kind].setdefault(name, []).append(item_id)
+        return item_id
+
+    def scrobble(self, i) -> Scrobble:
+        '''
+        Materializes the i-th (oldest-first) row as a Scrobble object
+        '''
+        return Scrobble.from_uts(self.uts[i], self.track(i))
+
+    def track(self, i) -> TrackInfo:
+        '''
+        Returns the TrackInfo of the i-th row. There's a single (flyweight)
+        TrackInfo per distinct (artist, album, song), shared by all its plays
+        '''
+        key = (self.artist_ids[i], self.album_ids[i], self.song_ids[i])
+        track = self.__tracks.get(key)
+        if track is None:
+            track = TrackInfo(self.artists[key[0]], self.albums[key[1]],
+                              self.songs[key[2]])
+            self.__tracks[key] = track
+        return track
+
+
+def growable(values) -> array:
+    '''
+    Returns a column as an array that can be appended to: arrays are
+    returned as they are, (zero-copy) memoryviews get copied
+    '''
+    if isinstance(values, array):
+        return values
+    copy = array(values.format)
+    copy.frombytes(values.cast('B'))
+    return copy
+
+
+def to_datetime(uts) -> datetime:
+    '''
+    Converts epoch seconds back into the naive datetime Last.fm displayed
+    '''
+    return EPOCH + timedelta(seconds=uts)
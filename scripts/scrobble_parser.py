@@ -0,0 +1,263 @@
+from array import array
+from datetime import date
+from itertools import chain
+from os import cpu_count, path
+from locale import getpreferredencoding
+from concurrent.futures import ProcessPoolExecutor
+from scrobble import MONTHS
+from scrobble_columns import ScrobbleColumns
+try:
+    import numpy as np
+except ImportError:
+    np = None  # merged shards' ids are remapped in pure Python instead
+
+
+'''
+------------------------------------------------------------------------------
+Bulk parser for scrobbled_data text. Rather than building a Scrobble (with
+its own datetime, date, time and TrackInfo objects) per line, whole files or
+chunks are parsed in one pass straight into ScrobbleColumns:
+    -  months are looked up in a precomputed table
+    -  each distinct 'DD Mon YYYY' is converted to epoch seconds only once
+    -  names are interned, each distinct name is stored (and encoded) once
+    -  songs and albums are keyed on (title, artist), so an 'Intro' by two
+       different artists gets two ids
+Files are streamed in fixed-size byte chunks (see iter_file_lines) rather
+than read whole, so parsing never holds more than a chunk of text on top of
+the (compact) columns. Large files are split into shards at line boundaries
+and parsed by a pool of processes (see parse_files), each shard into its own
+columns and string tables, which are then merged
+------------------------------------------------------------------------------
+'''
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+CHUNK_SIZE = 1 << 20  # bytes
+PARSE_WORKERS = cpu_count() or 1  # size of the process pool parse_files uses
+PARALLEL_MIN_BYTES = 16 << 20  # smaller inputs are parsed serially
+
+
+def parse_file(txt_file) -> ScrobbleColumns:
+    '''
+    Parses a single scrobbled_data txt file (newest-first) into columns
+    '''
+    return parse_lines(iter_file_lines(txt_file))
+
+
+def parse_files(txt_files, workers=PARSE_WORKERS) -> ScrobbleColumns:
+    '''
+    Parses scrobbled_data txt files (newest-first, e.g. a user's segments)
+    into one set of columns, exactly like parsing their lines one after the
+    other would. Unless the files are small (or there's a single worker),
+    they're split into about one shard per worker, the shards are parsed in
+    a process pool and their columns merged
+    '''
+    total_size = sum(path.getsize(txt_file) for txt_file in txt_files)
+    if workers <= 1 or total_size < PARALLEL_MIN_BYTES:
+        return parse_lines(chain.from_iterable(
+            iter_file_lines(txt_file) for txt_file in txt_files))
+    shards = []
+    for txt_file in txt_files:
+        num_shards = max(1, round(workers * path.getsize(txt_file)
+                                  / total_size))
+        offsets = shard_offsets(txt_file, num_shards)
+        shards.extend((txt_file, start, end)
+                      for start, end in zip(offsets, offsets[1:]))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return merge_shards(list(executor.map(_parse_shard, shards)))
+
+
+def shard_offsets(txt_file, num_shards) -> list[int]:
+    '''
+    Returns the byte offsets splitting a txt file into (at most) the given
+    number of shards of about the same size, each moved up to the start of
+    a line. Shard `i` is `offsets[i]:offsets[i + 1]`
+    '''
+    size = path.getsize(txt_file)
+    offsets = [0]
+    with open(txt_file, 'rb') as f:
+        for i in range(1, num_shards):
+            # the line going on at the split point belongs to this shard
+            f.seek(max(offsets[-1], size * i // num_shards - 1))
+            f.readline()
+            if f.tell() >= size:
+                break
+            if f.tell() > offsets[-1]:
+                offsets.append(f.tell())
+    offsets.append(size)
+    return offsets
+
+
+def merge_shards(shards:list) -> ScrobbleColumns:
+    '''
+    Merges the columns of consecutive shards of newest-first text (newest
+    shard first) into the columns of the whole text. Names get their ids in
+    order of first appearance across the shards, the same ids parse_lines
+    hands out, and every shard's ids are remapped to them
+    '''
+    artists, albums, songs = {}, {}, {}
+    id_maps = []
+    for shard in shards:
+        artist_map = _intern(artists, shard.artists)
+        album_map = _intern(albums, zip(
+            shard.albums, _remap(artist_map, shard.album_artist_ids)))
+        song_map = _intern(songs, zip(
+            shard.songs, _remap(artist_map, shard.song_artist_ids)))
+        id_maps.append((artist_map, album_map, song_map))
+    uts = array('q')
+    artist_ids = array('I')
+    album_ids = array('I')
+    song_ids = array('I')
+    # columns are oldest-first, so the oldest shard's rows go first
+    for shard, (artist_map, album_map, song_map) in zip(reversed(shards),
+                                                        reversed(id_maps)):
+        uts.extend(shard.uts)
+        artist_ids.extend(_remap(artist_map, shard.artist_ids))
+        album_ids.extend(_remap(album_map, shard.album_ids))
+        song_ids.extend(_remap(song_map, shard.song_ids))
+    return _make_columns(uts, artist_ids, album_ids, song_ids, artists,
+                         albums, songs)
+
+
+def iter_file_lines(txt_file, chunk_size=CHUNK_SIZE, start=0, end=None):
+    '''
+    Yields the lines of a scrobbled_data txt file (without their newlines),
+    or of its bytes `start:end`, reading `chunk_size` bytes at a time. Each
+    chunk is cut after its last newline and the partial line left over is
+    carried into the next one
+    '''
+    # the encoding open() reads text files with by default
+    encoding = getpreferredencoding(False)
+    with open(txt_file, 'rb') as f:
+        f.seek(start)
+        remaining = float('inf') if end is None else end - start
+        carry = b''
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            if carry:
+                chunk = carry + chunk
+            end = chunk.rfind(b'\n') + 1
+            carry = chunk[end:]
+            if end:
+                # (a newline byte never falls inside a multi-byte character)
+                yield from _split_lines(str(memoryview(chunk)[:end],
+                                            encoding))
+        if carry:
+            yield from _split_lines(str(carry, encoding))
+
+
+def parse_lines(lines_of_text) -> ScrobbleColumns:
+    '''
+    Parses lines of scrobbled_data text (newest-first, with or without their
+    trailing newlines) into columns. Lines missing track info are skipped
+    '''
+    uts = array('q')
+    artist_ids = array('I')
+    album_ids = array('I')
+    song_ids = array('I')
+    artists, albums, songs = {}, {}, {}
+    day_cache = {}
+    # bind everything used in the loop to locals
+    append_uts = uts.append
+    append_artist = artist_ids.append
+    append_album = album_ids.append
+    append_song = song_ids.append
+    for line in lines_of_text:
+        fields = line.split('\t')
+        if len(fields) < 4 or '' in fields:
+            continue  # missing necessary track info
+        term, artist, album, song = fields[0], fields[1], fields[2], fields[3]
+        if song[-1:] == '\n':
+            song = song[:-1]
+            if not song:
+                continue
+        # 'DD Mon YYYY, HH:MM' -> the day is cached, the time is cheap
+        day = term[:-7]
+        day_secs = day_cache.get(day)
+        if day_secs is None:
+            day_secs = _day_to_epoch_secs(day)
+            day_cache[day] = day_secs
+        append_uts(day_secs + int(term[-5:-3]) * 3600 + int(term[-2:]) * 60)
+        # intern each name, handing out ids in order of first appearance
+        artist_id = artists.get(artist)
+        if artist_id is None:
+            artist_id = artists[artist] = len(artists)
+        append_artist(artist_id)
+        album_id = albums.get((album, artist_id))
+        if album_id is None:
+            album_id = albums[album, artist_id] = len(albums)
+        append_album(album_id)
+        song_id = songs.get((song, artist_id))
+        if song_id is None:
+            song_id = songs[song, artist_id] = len(songs)
+        append_song(song_id)
+    # the text is newest-first, columns are oldest-first
+    for column in (uts, artist_ids, album_ids, song_ids):
+        column.reverse()
+    return _make_columns(uts, artist_ids, album_ids, song_ids, artists,
+                         albums, songs)
+
+
+def _make_columns(uts, artist_ids, album_ids, song_ids, artists:dict,
+                  albums:dict, songs:dict) -> ScrobbleColumns:
+    '''
+    Packs id columns and the dicts that interned their names (artist ->
+    id, (album/song, artist id) -> id, in order of id) into ScrobbleColumns
+    '''
+    return ScrobbleColumns(uts, artist_ids, album_ids, song_ids,
+                           list(artists), [album for album, _ in albums],
+                           [song for song, _ in songs],
+                           array('I', (artist_id for _, artist_id in albums)),
+                           array('I', (artist_id for _, artist_id in songs)))
+
+
+def _intern(codes:dict, keys) -> array:
+    '''
+    Interns a shard's (distinct) names or (title, artist id) keys, in order
+    of id, into the merged {key: id} dict. Returns the id each one maps to
+    '''
+    keys = list(keys)
+    new_keys = [key for key in keys if key not in codes]
+    codes.update(zip(new_keys, range(len(codes), len(codes) + len(new_keys))))
+    return array('I', map(codes.__getitem__, keys))
+
+
+def _remap(id_map:array, ids:array) -> array:
+    '''
+    Returns `id_map[i]` for every id `i` (a single gather, with NumPy)
+    '''
+    if np is None:
+        return array('I', map(id_map.__getitem__, ids))
+    remapped = array('I')
+    remapped.frombytes(np.frombuffer(id_map, dtype=np.uint32)[
+        np.frombuffer(ids, dtype=np.uint32)].tobytes())
+    return remapped
+
+
+def _parse_shard(shard:tuple) -> ScrobbleColumns:
+    ''' Parses a (txt file, start, end) shard, in a worker process '''
+    txt_file, start, end = shard
+    return parse_lines(iter_file_lines(txt_file, start=start, end=end))
+
+
+def _split_lines(text) -> list[str]:
+    '''
+    Splits text into lines, treating '\r\n' like text mode files do
+    '''
+    if '\r' in text:
+        text = text.replace('\r\n', '\n')
+    lines = text.split('\n')
+    if not lines[-1]:
+        lines.pop()  # the text ended with a newline
+    return lines
+
+
+def _day_to_epoch_secs(day) -> int:
+    '''
+    Converts a 'DD Mon YYYY' string to the epoch seconds of its midnight
+    '''
+    dd, month, year = day.split()
+    ordinal = date(int(year), MONTHS[month], int(dd)).toordinal()
+    return (ordinal - EPOCH_ORDINAL) * 86400
@@ -0,0 +1,127 @@
+import json
+from os import path, replace, remove, fsync, truncate, open as os_open, \
+    close as os_close, O_RDONLY
+
+
+class ScrobbleWriter():
+    '''
+    The writer stage of the fetching process. Buffers whole pages of formatted
+    scrobbles and writes them in large blocks to a staging file, which is then
+    atomically committed (fsync + rename) over the user's scrobbled_data txt
+    file. Every flush also records a checkpoint so that an interrupted fetch
+    can resume from the last flushed page rather than starting over
+    '''
+
+    def __init__(self, target_file, buffer_size=2000):
+        '''
+        Create a new writer for the given txt file. `buffer_size` is the
+        number of scrobbles held in memory before they're flushed to disk
+        '''
+        self.__target_file = target_file
+        root, _ = path.splitext(target_file)
+        self.__staging_file = f'{root}.staging.txt'
+        self.__checkpoint_file = f'{root}.checkpoint.json'
+        self.__buffer_size = buffer_size
+        self.__buffer = []
+        self.__progress = None
+
+    def resume(self):
+        '''
+        Returns the progress dict saved by the last flush of an interrupted
+        fetch (or None if there isn't one). The staging file is truncated back
+        to what was written at that checkpoint, discarding any partial block
+        '''
+        if not path.exists(self.__checkpoint_file):
+            self.discard()
+            return None
+        try:
+            with open(self.__checkpoint_file, 'r') as f:
+                checkpoint = json.load(f)
+            staged_size = checkpoint['staged_size']
+            if path.getsize(self.__staging_file) < staged_size:
+                raise ValueError('staging file is shorter than checkpoint')
+        except (OSError, ValueError, KeyError):
+            # unreadable or inconsistent checkpoint, start from scratch
+            self.discard()
+            return None
+        truncate(self.__staging_file, staged_size)
+        self.__progress = checkpoint['progress']
+        return self.__progress
+
+    def write_page(self, lines, progress):
+        '''
+        Buffers a page of formatted scrobble lines. `progress` is a dict which
+        describes how far along the fetch is once this page has been written;
+        it's what resume() hands back after an interruption
+        '''
+        self.__buffer.extend(lines)
+        self.__progress = progress
+        if len(self.__buffer) >= self.__buffer_size:
+            self.flush()
+
+    def flush(self):
+        '''
+        Writes all buffered lines to the staging file as a single block, then
+        records a checkpoint for the data that's now safely on disk
+        '''
+        if self.__progress is None:
+            return
+        with open(self.__staging_file, 'a') as f:
+            if self.__buffer:
+                f.write('\n'.join(self.__buffer) + '\n')
+            f.flush()
+            fsync(f.fileno())
+        self.__buffer = []
+        checkpoint = {
+            'staged_size': path.getsize(self.__staging_file),
+            'progress': self.__progress
+        }
+        temp_file = f'{self.__checkpoint_file}.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump(checkpoint, f)
+            f.flush()
+            fsync(f.fileno())
+        replace(temp_file, self.__checkpoint_file)
+
+    def commit(self):
+        '''
+        Flushes the buffer and atomically replaces the target txt file with
+        the staging file
+        '''
+        self.flush()
+        if not path.exists(self.__staging_file):
+            # nothing was fetched at all
+            self.discard()
+            return
+        replace(self.__staging_file, self.__target_file)
+        self.__fsync_dir()
+        self.__remove(self.__checkpoint_file)
+        self.__progress = None
+
+    def discard(self):
+        '''
+        Throws away any staged data and checkpoint
+        '''
+        self.__buffer = []
+        self.__progress = None
+        self.__remove(self.__staging_file)
+        self.__remove(self.__checkpoint_file)
+
+    def __remove(self, file):
+        if path.exists(file):
+            remove(file)
+
+    def __fsync_dir(self):
+        '''
+        Makes the rename durable (not supported on every platform)
+        '''
+        try:
+            fd = os_open(path.dirname(self.__target_file), O_RDONLY)
+        except OSError:
+            return
+        try:
+            fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os_close(fd)
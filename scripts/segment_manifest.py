@@ -0,0 +1,138 @@
+import json
+from os import path, replace, remove, fsync
+from scrobble_parser import iter_file_lines
+
+
+class SegmentManifest():
+    '''
+    A user's scrobbled data is stored as a series of segment txt files. The
+    oldest segment is the user's original scrobbled_data txt file, and every
+    incremental sync adds a new (newer) segment. The manifest lists the
+    segments newest-first together with the `uts` of the newest saved
+    scrobble, so a sync never has to reread or rewrite older segments
+    '''
+
+    MAX_SEGMENTS = 32  # merge the newer segments once there are this many
+
+    def __init__(self, txt_file):
+        '''
+        Load the manifest for the given scrobbled_data txt file (the base
+        segment). If there's no manifest yet, the base file is the only segment
+        '''
+        self.__dir = path.dirname(txt_file)
+        self.__base_name = path.basename(txt_file)
+        self.__root, _ = path.splitext(self.__base_name)
+        self.__manifest_file = path.join(self.__dir,
+                                         f'{self.__root}.manifest.json')
+        if path.exists(self.__manifest_file):
+            with open(self.__manifest_file, 'r') as f:
+                j_manifest = json.load(f)
+            self.__segments = j_manifest['segments']
+            self.__newest_uts = j_manifest['newest_uts']
+            self.__next_seq = j_manifest['next_seq']
+        else:
+            # a brand new user (or one synced before manifests existed)
+            self.__segments = [self.__make_entry(self.__base_name, None, None)]
+            self.__newest_uts = None
+            self.__next_seq = 1
+
+    def get_newest_uts(self):
+        '''
+        Returns the `uts` of the newest saved scrobble, or None if unknown
+        '''
+        return self.__newest_uts
+
+    def next_segment_file(self) -> str:
+        '''
+        Returns the path that the next incremental sync should write to
+        '''
+        name = f'{self.__root}.{self.__next_seq:04d}.txt'
+        return path.join(self.__dir, name)
+
+    def segment_files(self) -> list[str]:
+        '''
+        Returns the paths of every segment, newest-first
+        '''
+        return [path.join(self.__dir, seg['file']) for seg in self.__segments]
+
+    def set_base(self, count, newest_uts):
+        '''
+        Records the result of a full fetch, which always replaces the base
+        segment (and makes any newer segments obsolete)
+        '''
+        obsolete = self.segment_files()[:-1]
+        self.__segments = [self.__make_entry(self.__base_name, count,
+                                             newest_uts)]
+        self.__newest_uts = newest_uts
+        self.save()
+        for segment_file in obsolete:
+            if path.exists(segment_file):
+                remove(segment_file)
+
+    def add_segment(self, segment_file, count, newest_uts):
+        '''
+        Prepends a newly committed segment (containing `count` scrobbles, the
+        newest of which has the given `uts`) to the manifest
+        '''
+        entry = self.__make_entry(path.basename(segment_file), count,
+                                  newest_uts)
+        self.__segments.insert(0, entry)
+        self.__newest_uts = newest_uts
+        self.__next_seq += 1
+        if len(self.__segments) >= self.MAX_SEGMENTS:
+            self.__compact()
+        self.save()
+
+    def iter_lines(self):
+        '''
+        Yields every saved scrobble line across all segments, newest-first
+        (without their newlines). Segments are streamed in chunks, never read
+        whole
+        '''
+        for segment_file in self.segment_files():
+            if not path.exists(segment_file):
+                continue
+            yield from iter_file_lines(segment_file)
+
+    def save(self):
+        '''
+        Atomically writes the manifest to disk
+        '''
+        j_manifest = {
+            'segments': self.__segments,
+            'newest_uts': self.__newest_uts,
+            'next_seq': self.__next_seq
+        }
+        temp_file = f'{self.__manifest_file}.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump(j_manifest, f, indent=2)
+            f.flush()
+            fsync(f.fileno())
+        replace(temp_file, self.__manifest_file)
+
+    def __compact(self):
+        '''
+        Merges every segment newer than the base segment into one. Only the
+        (small) incremental segments get rewritten, never the base segment
+        '''
+        newer = self.__segments[:-1]
+        merged_file = self.next_segment_file()
+        self.__next_seq += 1
+        with open(merged_file, 'w') as dst:
+            for seg in newer:
+                with open(path.join(self.__dir, seg['file']), 'r') as src:
+                    dst.write(src.read())
+            dst.flush()
+            fsync(dst.fileno())
+        counts = [seg['count'] for seg in newer]
+        count = None if None in counts else sum(counts)
+        entry = self.__make_entry(path.basename(merged_file), count,
+                                  newer[0]['newest_uts'])
+        self.__segments = [entry, self.__segments[-1]]
+        # the manifest must point at the merged file before the old ones go
+        self.save()
+        for seg in newer:
+            remove(path.join(self.__dir, seg['file']))
+
+    def __make_entry(self, file, count, newest_uts):
+        return {'file': file, 'count': count, 'newest_uts': newest_uts}
@@ -0,0 +1,124 @@
+import mmap
+import struct
+from sys import byteorder
+from array import array
+from hashlib import blake2b
+from os import path, replace, fsync, stat
+
+
+'''
+------------------------------------------------------------------------------
+A snapshot of the indexes a Catalog has built, stored next to its columnar
+file so launching fetchfm on unchanged data doesn't rebuild them. A snapshot
+is a bag of named arrays (every index saves its arrays under its own prefix,
+e.g. 'song_index.rows'), along with a fingerprint of the txt files it was
+built from. Layout (every section starts on an 8 byte boundary):
+    header          magic, byte order, fingerprint, num sections
+    contents        name, typecode, offset, length of every section
+    sections        the arrays themselves
+Like columnar files, snapshots are opened with mmap and every array is a
+zero-copy memoryview. The fingerprint covers the size, mtime and a hash of
+the first and last blocks of every source file, so appending to (or
+rewriting) the history invalidates the snapshot without having to read the
+whole file
+------------------------------------------------------------------------------
+'''
+
+MAGIC = b'FFMSNAP2'
+HEADER = struct.Struct('<8s8s32sQ')
+SECTION = struct.Struct('<48s8sQQ')
+ALIGNMENT = 8
+BLOCK_SIZE = 64 * 1024
+
+
+def source_fingerprint(files) -> bytes:
+    '''
+    Fingerprints the given files by their size, mtime and the hash of their
+    first and last blocks
+    '''
+    digest = blake2b(digest_size=32)
+    for file in files:
+        info = stat(file)
+        digest.update(struct.pack('<QQ', info.st_size, info.st_mtime_ns))
+        with open(file, 'rb') as f:
+            digest.update(f.read(BLOCK_SIZE))
+            if info.st_size > BLOCK_SIZE:
+                f.seek(max(BLOCK_SIZE, info.st_size - BLOCK_SIZE))
+                digest.update(f.read(BLOCK_SIZE))
+    return digest.digest()
+
+
+def write_snapshot(snapshot_file, fingerprint:bytes, arrays:dict):
+    '''
+    Writes the given {name: array} to the snapshot file (atomically, via a
+    temp file)
+    '''
+    temp_file = f'{snapshot_file}.tmp'
+    sections = list(arrays.items())
+    pos = _align(HEADER.size + SECTION.size * len(sections))
+    contents = []
+    for name, values in sections:
+        # arrays restored from a snapshot are memoryviews, not arrays
+        typecode = getattr(values, 'typecode', None) or values.format
+        contents.append(SECTION.pack(name.encode(), typecode.encode(),
+                                     pos, len(values)))
+        pos = _align(pos + len(values) * values.itemsize)
+    with open(temp_file, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, byteorder.encode().ljust(8, b'\0'),
+                            fingerprint, len(sections)))
+        f.write(b''.join(contents))
+        for _, values in sections:
+            f.write(b'\0' * (_align(f.tell()) - f.tell()))
+            f.write(values.tobytes())
+        f.flush()
+        fsync(f.fileno())
+    replace(temp_file, snapshot_file)
+
+
+def read_fingerprint(snapshot_file):
+    '''
+    Returns the fingerprint a snapshot was built with, or None if there's no
+    (readable) snapshot
+    '''
+    if not path.exists(snapshot_file):
+        return None
+    with open(snapshot_file, 'rb') as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    magic, order, fingerprint, _ = HEADER.unpack(header)
+    if magic != MAGIC or order.rstrip(b'\0').decode() != byteorder:
+        return None
+    return fingerprint
+
+
+def open_snapshot(snapshot_file) -> dict:
+    '''
+    Maps the snapshot file into memory and returns its arrays grouped by
+    prefix, as {prefix: {name: memoryview}}
+    '''
+    with open(snapshot_file, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(buffer)
+    magic, order, _, num_sections = HEADER.unpack_from(view)
+    if magic != MAGIC or order.rstrip(b'\0').decode() != byteorder:
+        raise ValueError(f'{snapshot_file} is not a snapshot for this machine')
+    groups = {}
+    for i in range(num_sections):
+        name, typecode, offset, length = SECTION.unpack_from(
+            view, HEADER.size + i * SECTION.size)
+        typecode = typecode.rstrip(b'\0').decode()
+        size = length * array(typecode).itemsize
+        prefix, _, field = name.rstrip(b'\0').decode().partition('.')
+        groups.setdefault(prefix, {})[field] = \
+            view[offset:offset + size].cast(typecode)
+    return groups
+
+
+def default_snapshot_file(col_file) -> str:
+    root, _ = path.splitext(col_file)
+    return f'{root}.snapshot'
+
+
+def _align(pos):
+    return -(-pos // ALIGNMENT) * ALIGNMENT
@@ -0,0 +1,48 @@
+from heapq import nlargest
+from posting_index import PostingIndex
+
+
+class Ranking():
+    '''
+    The ids of one kind of item (artist, album or song) in descending order
+    of playcount, ties broken alphabetically (the same order most_played_*
+    reports ties in). Only as much of the ranking as has been asked for is
+    computed: `select(k)` picks the top k ids (a heap or a partition, never a
+    full sort unless k covers everything) and the ranked prefix is cached,
+    growing geometrically as later pages are requested. A ranking belongs to
+    one version of its catalog's data
+    '''
+
+    MIN_SELECT = 32
+
+    def __init__(self, select, num_items, version):
+        self.__select = select
+        self.__num_items = num_items
+        self.__ranked = []
+        self.version = version
+
+    def __len__(self):
+        return self.__num_items
+
+    def top(self, n, start=0) -> list[int]:
+        '''
+        Returns the ids ranked `start + 1` to `start + n` (`n` follows slice
+        semantics, so a negative `n` leaves out the last -n ids)
+        '''
+        stop = start + n if n >= 0 else self.__num_items + n
+        if stop > len(self.__ranked) and \
+                len(self.__ranked) < self.__num_items:
+            k = max(stop, 2 * len(self.__ranked), self.MIN_SELECT)
+            self.__ranked = self.__select(min(k, self.__num_items))
+        return self.__ranked[start:stop]
+
+
+def heap_select(index:PostingIndex):
+    '''
+    Returns a `select(k)` for a Ranking over the given PostingIndex, picking
+    the top k ids with a heap in O(n log k). nlargest is stable, so feeding
+    it the ids alphabetically keeps ties in alphabetical order
+    '''
+    def select(k) -> list[int]:
+        return nlargest(k, index.sorted_ids(), key=index.count_of_id)
+    return select
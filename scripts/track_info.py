@@ -1,8 +1,11 @@
 class TrackInfo:
     '''
-    A class to store a Scrobble object's artist, album, and song info
+    A class to store a Scrobble object's artist, album, and song info. Every
+    play of the same track can share a single (immutable) TrackInfo
     '''
 
+    __slots__ = ('__artist', '__album', '__song')
+
     def __init__(self, artist, album, song):
         self.__artist = artist
         self.__album = album
@@ -10,14 +13,13 @@ class TrackInfo:
 
     def get_artist(self) -> str:
         return self.__artist
-    
+
     def get_album(self) -> str:
         return self.__album
-    
+
     def get_song(self) -> str:
         return self.__song
-    
+
     def __str__(self):
         FORMAT = '{}    {}    {}'
         return FORMAT.format(self.__artist, self.__album, self.__song)
-    
\ No newline at end of file
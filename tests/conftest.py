@@ -0,0 +1,74 @@
+import sys
+from os import environ, path
+
+# the scripts are flat modules, imported the way fetchfm.py imports them
+sys.path.insert(0, path.join(path.dirname(__file__), '..', 'scripts'))
+# api_handler reads these on import, the tests only ever talk to the stand-in
+environ.setdefault('LASTFM_API_KEY', 'standin')
+environ.setdefault('LASTFM_USER_AGENT', 'standin')
+
+import pytest
+
+
+@pytest.fixture
+def standin(tmp_path, monkeypatch):
+    '''
+    Points api_handler at a stand-in Last.fm server (see lastfm_standin.py)
+    serving a synthetic history, with its data saved under a temp directory.
+    Yields the (started) server, whose `history` can be added to
+    '''
+    import api_handler
+    from lastfm_client import LastfmClient
+    from lastfm_standin import StandinServer, SyntheticHistory
+    server = StandinServer(SyntheticHistory(3000, seed=1)).start()
+    client = LastfmClient(server.url, 'standin', 'standin', max_retries=0)
+    monkeypatch.setattr(api_handler, 'DATA_DIR', str(tmp_path))
+    monkeypatch.setattr(api_handler, 'client', client)
+    yield server
+    client.close()
+    server.stop()
+
+
+@pytest.fixture
+def fail_recent_tracks(monkeypatch):
+    '''
+    Makes every `user.getRecentTracks` request after the first `num_ok`
+    fail (as if the connection dropped), until `num_ok` is set to None
+    '''
+    import api_handler
+    lastfm_get = api_handler._lastfm_get
+
+    class Failure():
+        num_ok = None
+        num_requests = 0
+
+    def failing_get(payload):
+        if payload['method'] == 'user.getRecentTracks':
+            Failure.num_requests += 1
+            if Failure.num_ok is not None and \
+                    Failure.num_requests > Failure.num_ok:
+                return None
+        return lastfm_get(payload)
+
+    monkeypatch.setattr(api_handler, '_lastfm_get', failing_get)
+    return Failure
+
+
+@pytest.fixture
+def saved_lines(standin):
+    '''
+    Returns a function listing every line saved for a user (newest-first,
+    across all of their segments)
+    '''
+    import api_handler
+    from segment_manifest import SegmentManifest
+
+    def lines_of(username) -> list[str]:
+        txt_file = api_handler.get_path('scrobbled_data', f'{username}.txt')
+        lines = []
+        for segment_file in SegmentManifest(txt_file).segment_files():
+            if path.exists(segment_file):
+                with open(segment_file, 'r') as f:
+                    lines.extend(f)
+        return lines
+    return lines_of
@@ -0,0 +1,76 @@
+from os import path
+import api_handler
+from segment_manifest import SegmentManifest
+
+
+def test_full_fetch_saves_the_whole_history(standin, saved_lines, capsys):
+    api_handler.fetch_scrobbled_data('standin')
+    assert saved_lines('standin') == standin.history.lines()
+
+
+def test_newest_window_includes_to_uts():
+    windows = api_handler._split_into_windows(1000, 2000, 4)
+    assert windows[0][1] == 2001  # newest-first, half-open
+    assert windows[-1][0] == 0
+    assert all(newer[0] == older[1]
+               for newer, older in zip(windows, windows[1:]))
+
+
+def test_oldest_window_never_asks_for_negative_timestamps(standin,
+                                                          monkeypatch, capsys):
+    payloads = []
+    lastfm_get = api_handler._lastfm_get
+
+    def recording_get(payload):
+        payloads.append(payload)
+        return lastfm_get(payload)
+    monkeypatch.setattr(api_handler, '_lastfm_get', recording_get)
+    api_handler.fetch_scrobbled_data('standin')
+    window_froms = [payload['from'] for payload in payloads
+                    if payload['method'] == 'user.getRecentTracks'
+                    and 'from' in payload]
+    assert min(window_froms) == 0
+
+
+def test_full_fetch_progress_bar_ends_at_its_total(standin, monkeypatch,
+                                                   capsys):
+    prog_bars = []
+
+    class RecordingBar(api_handler.tqdm):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            prog_bars.append(self)
+    monkeypatch.setattr(api_handler, 'tqdm', RecordingBar)
+    # skew the page estimate so each window's real count has to replace it
+    monkeypatch.setattr(api_handler, 'FETCH_WORKERS', 7)
+    api_handler.fetch_scrobbled_data('standin')
+    assert prog_bars[0].n == prog_bars[0].total
+
+
+def test_failed_page_count_keeps_the_checkpoint(standin, saved_lines,
+                                                fail_recent_tracks, capsys):
+    api_handler.fetch_scrobbled_data('standin')
+    txt_file = api_handler.get_path('scrobbled_data', 'standin.txt')
+    newest_uts = SegmentManifest(txt_file).get_newest_uts()
+    standin.history.add_scrobbles(500)
+    # the sync gets the page count and the first page, then fails
+    fail_recent_tracks.num_requests = 0
+    fail_recent_tracks.num_ok = 2
+    api_handler.fetch_scrobbled_data('standin')
+    checkpoint_file = path.join(path.dirname(txt_file),
+                                'standin.0001.checkpoint.json')
+    assert path.exists(checkpoint_file)
+    # resuming, the page count itself fails
+    fail_recent_tracks.num_requests = 0
+    fail_recent_tracks.num_ok = 0
+    api_handler.fetch_scrobbled_data('standin')
+    manifest = SegmentManifest(txt_file)
+    assert len(manifest.segment_files()) == 1
+    assert manifest.get_newest_uts() == newest_uts
+    assert path.exists(checkpoint_file)
+    assert 'request to Last.fm failed' in capsys.readouterr().out
+    # once Last.fm is back, the sync picks up where it left off
+    fail_recent_tracks.num_ok = None
+    api_handler.fetch_scrobbled_data('standin')
+    assert saved_lines('standin') == standin.history.lines()
+    assert not path.exists(checkpoint_file)
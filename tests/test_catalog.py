@@ -0,0 +1,149 @@
+import pytest
+from datetime import datetime
+import catalog
+from catalog import Catalog
+from lastfm_standin import SyntheticHistory
+
+
+@pytest.fixture(params=['numpy', 'pure python'])
+def engine(request, monkeypatch):
+    ''' Runs a test with and without the NumPy engine '''
+    if request.param == 'pure python':
+        monkeypatch.setattr(catalog, 'numpy_available', lambda: False)
+    return request.param
+
+
+@pytest.fixture(scope='module')
+def lines():
+    return SyntheticHistory(5000, seed=1, end_uts=1_700_000_000).lines()
+
+
+def test_same_titles_are_named_with_their_artist(engine, lines):
+    cat = Catalog('standin', lines)
+    for kind in ('songs', 'albums'):
+        top = getattr(cat, f'top_{kind}')(200)
+        names = [name for name, _ in top]
+        assert len(set(names)) == len(names)
+        assert all(' — Artist ' in name for name in names)
+        titles = [name.split(' — ')[0] for name in names]
+        assert len(set(titles)) < len(titles)
+    result, _ = cat.most_played_song()
+    assert all(' — Artist ' in name for name in result)
+    assert [name for name, _ in cat.top_artists(3)][0].startswith('Artist ')
+
+
+def test_most_played_matches_the_top_items(engine, lines):
+    cat = Catalog('standin', lines)
+    for kind in ('song', 'artist', 'album'):
+        result, num_plays = getattr(cat, f'most_played_{kind}')()
+        top = getattr(cat, f'top_{kind}s')(len(result))
+        assert sorted(result) == sorted(name for name, _ in top)
+        assert {count for _, count in top} == {num_plays}
+
+
+def test_snapshot_only_holds_the_indexes_built_so_far(tmp_path, lines):
+    from columnar_store import convert_txt_file
+    from snapshot_store import open_snapshot
+    txt_file = tmp_path / 'standin.txt'
+    txt_file.write_text(''.join(lines))
+    col_file = convert_txt_file(str(txt_file))
+    snapshot_file = str(tmp_path / 'standin.snapshot')
+    cat = Catalog.open('standin', col_file)
+    cat.save_snapshot(snapshot_file, b'fingerprint')
+    assert set(open_snapshot(snapshot_file)) == {'catalog'}
+    expected = cat.num_plays_for_artist('Artist 1')
+    cat.save_snapshot(snapshot_file, b'fingerprint')
+    assert set(open_snapshot(snapshot_file)) == {'catalog', 'artist_index'}
+    # indexes restored from the snapshot are carried over into the next one
+    cat = Catalog.open('standin', col_file)
+    cat.most_consecutive_song()
+    cat.save_snapshot(snapshot_file, b'fingerprint')
+    assert set(open_snapshot(snapshot_file)) == \
+        {'catalog', 'artist_index', 'song_runs'}
+    assert Catalog.open('standin', col_file) \
+        .num_plays_for_artist('Artist 1') == expected
+
+
+def _answers(cat, lines, capsys) -> list:
+    '''
+    Asks the catalog a round of queries covering every index, returning the
+    answers (including the printed catalogs)
+    '''
+    days = [datetime.strptime(line[:11], '%d %b %Y')
+            for line in (lines[0], lines[len(lines) // 2], lines[-1])]
+    answers = [cat.get_total_num_scrobbles(),
+               cat.get_total_num_distinct_days(),
+               cat.most_streamed_day_overall()]
+    for kind in ('song', 'artist', 'album'):
+        answers += [getattr(cat, f'top_{kind}s')(100),
+                    getattr(cat, f'top_{kind}s')(10, 5),
+                    getattr(cat, f'most_played_{kind}')(),
+                    getattr(cat, f'most_consecutive_{kind}')(),
+                    getattr(cat, f'top_consecutive_{kind}s')(20)]
+        for day in days:
+            answers += [
+                getattr(cat, f'most_played_{kind}_on_date')(
+                    day.month, day.day, day.year),
+                getattr(cat, f'top_{kind}s_in_year')(20, day.year),
+                getattr(cat, f'top_{kind}s_between_months')(
+                    20, days[-1].month, days[-1].year, day.month, day.year)]
+    for song, album, artist in (('Song 1', 'Album 1', 'Artist 1'),
+                                ('Song 3', 'Album 0', 'Artist 2')):
+        answers += [cat.num_plays_for_song(song),
+                    cat.num_plays_for_song(song, artist),
+                    cat.num_plays_for_album(album),
+                    cat.num_plays_for_artist(artist),
+                    cat.streaks_for_song(song),
+                    cat.streaks_for_album(album, 2, artist),
+                    cat.most_streamed_day_for_song(song),
+                    cat.most_streamed_day_for_artist(artist)]
+        for day in days:
+            answers += [cat.num_plays_for_song_on_date(
+                            song, day.month, day.day, day.year),
+                        cat.num_plays_for_artist_on_date(
+                            artist, day.month, day.day, day.year)]
+    capsys.readouterr()
+    cat.print_song_catalog()
+    cat.print_artist_catalog()
+    cat.print_album_catalog()
+    answers.append(capsys.readouterr().out)
+    return answers
+
+
+@pytest.mark.parametrize('num_older', [300, 4000])
+@pytest.mark.parametrize('warm', [False, True])
+def test_appended_catalog_matches_a_fresh_build(engine, lines, num_older,
+                                                warm, capsys):
+    expected = _answers(Catalog('standin', lines), lines, capsys)
+    # the newest lines get appended to a catalog of the older ones, with its
+    # indexes either already built or not built yet
+    cat = Catalog('standin', lines[-num_older:])
+    if warm:
+        _answers(cat, lines[-num_older:], capsys)
+    assert cat.append(lines[:-num_older]) == len(lines) - num_older
+    assert _answers(cat, lines, capsys) == expected
+
+
+def test_sync_appends_to_the_saved_catalog(standin, monkeypatch, capsys):
+    import fetchfm
+    import api_handler
+    from columnar_store import needs_conversion
+    monkeypatch.setattr(fetchfm, 'USERNAME', 'standin')
+    fetchfm._create_catalog(api_handler.fetch_scrobbled_data('standin'))
+    history = standin.history
+    _answers(fetchfm.CATALOG, history.lines(), capsys)
+    fetchfm._save_catalog_snapshot()
+    # the next sync's scrobbles are appended, not converted from scratch
+    history.add_scrobbles(700)
+    new_segment_file = api_handler.fetch_scrobbled_data('standin')
+    assert new_segment_file.endswith('standin.0001.txt')
+    monkeypatch.setattr(fetchfm, 'convert_txt_file', None)
+    fetchfm._create_catalog(new_segment_file)
+    lines = history.lines()
+    expected = _answers(Catalog('standin', lines), lines, capsys)
+    assert _answers(fetchfm.CATALOG, lines, capsys) == expected
+    # and so is what was saved for the next launch
+    txt_file = api_handler.get_path('scrobbled_data', 'standin.txt')
+    assert not needs_conversion(txt_file)
+    fetchfm._create_catalog()
+    assert _answers(fetchfm.CATALOG, lines, capsys) == expected
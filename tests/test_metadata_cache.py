@@ -0,0 +1,21 @@
+from metadata_cache import MetadataCache
+
+
+def test_entry_count_tracks_puts_and_evictions(tmp_path):
+    cache = MetadataCache(str(tmp_path / 'cache.db'), max_entries=10)
+    for i in range(10):
+        cache.put('track.getInfo', f'Song {i}', 'Artist', i)
+    # overwriting a cached entry doesn't add a row
+    cache.put('track.getInfo', 'Song 0', 'Artist', 100)
+    assert cache.stats()['entries'] == 10
+    assert cache.get('track.getInfo', 'Song 0', 'Artist') == (True, 100)
+    # going past the limit evicts down to 90% of it
+    cache.put('track.getInfo', 'Song 10', 'Artist', 10)
+    stats = cache.stats()
+    assert stats['entries'] == 9
+    assert stats['evictions'] == 2
+    cache.close()
+    # the count is picked back up when the cache is reopened
+    cache = MetadataCache(str(tmp_path / 'cache.db'), max_entries=10)
+    assert cache.stats()['entries'] == 9
+    cache.close()
@@ -0,0 +1,37 @@
+import pytest
+from lastfm_standin import SyntheticHistory
+from rollup_store import KINDS, PERIODS, build_rollups
+from scrobble_parser import parse_lines
+
+
+def _counts(rollups, columns) -> dict:
+    '''
+    Returns every rollup entry as {(kind, period, key, name): count}, since
+    the ids depend on the order the columns were built in
+    '''
+    counts = {}
+    for kind in KINDS:
+        for period in PERIODS:
+            table = rollups.table(kind, period)
+            for i, key in enumerate(table.periods):
+                for item_id, count in table.partial(i):
+                    name = columns.label_of(kind, item_id)
+                    counts[kind, period, key, name] = count
+    return counts
+
+
+@pytest.mark.parametrize('num_older', [1, 2500, 7999])
+def test_extended_rollups_match_a_fresh_build(num_older):
+    # ~3 scrobbles a day over 2 years and a bit, so the new rows start
+    # partway through a month (and year) that's already been counted
+    lines = SyntheticHistory(8000, seed=2, end_uts=1_700_000_000,
+                             avg_gap_secs=9000).lines()
+    fresh = parse_lines(lines)
+    expected = build_rollups(fresh)
+    columns = parse_lines(lines[-num_older:])
+    rollups = build_rollups(columns)
+    rows = columns.extend(parse_lines(lines[:-num_older]))
+    rollups.extend(rows.start)
+    assert _counts(rollups, columns) == _counts(expected, fresh)
+    assert rollups.top_between('song', 10, (1, 2022), (6, 2023)) == \
+        expected.top_between('song', 10, (1, 2022), (6, 2023))
@@ -0,0 +1,73 @@
+import pytest
+from locale import getpreferredencoding
+import scrobble_parser
+from lastfm_standin import SyntheticHistory
+from scrobble_parser import parse_files, parse_lines, shard_offsets, \
+    iter_file_lines
+
+
+def _columns(columns) -> tuple:
+    ''' Everything a ScrobbleColumns holds, as comparable lists '''
+    return tuple(list(values) for values in (
+        columns.uts, columns.artist_ids, columns.album_ids, columns.song_ids,
+        columns.artists, columns.albums, columns.songs,
+        columns.album_artist_ids, columns.song_artist_ids))
+
+
+@pytest.fixture
+def segments(tmp_path) -> list:
+    '''
+    Writes a history, with some multi-byte names, as 3 segments of
+    different sizes (newest-first). Returns their paths and lines
+    '''
+    lines = [line.replace('Artist 1', 'Ärtist 1 ✓')
+             .replace('Song 2', 'Sông 2 ♪')
+             for line in SyntheticHistory(3000, seed=3).lines()]
+    files = []
+    for i, (start, end) in enumerate(((0, 200), (200, 900), (900, None))):
+        txt_file = tmp_path / f'standin.{i}.txt'
+        txt_file.write_text(''.join(lines[start:end]),
+                            encoding=getpreferredencoding(False))
+        files.append(str(txt_file))
+    return files, lines
+
+
+@pytest.mark.parametrize('workers', [2, 3, 7])
+def test_process_pool_parse_matches_a_serial_parse(segments, workers,
+                                                   monkeypatch):
+    files, lines = segments
+    # shard even these small files, so that the pool is what's tested
+    monkeypatch.setattr(scrobble_parser, 'PARALLEL_MIN_BYTES', 0)
+    expected = _columns(parse_lines(lines))
+    assert _columns(parse_files(files, workers=1)) == expected
+    assert _columns(parse_files(files, workers=workers)) == expected
+
+
+@pytest.mark.parametrize('num_shards', [1, 2, 5, 16, 4000])
+def test_shards_split_at_line_starts(segments, num_shards):
+    files, _ = segments
+    txt_file = files[2]
+    with open(txt_file, 'rb') as f:
+        data = f.read()
+    offsets = shard_offsets(txt_file, num_shards)
+    assert offsets[0] == 0 and offsets[-1] == len(data)
+    assert offsets == sorted(set(offsets))
+    assert len(offsets) - 1 <= num_shards
+    # the split points (which mostly fall mid-line) are moved up to the
+    # start of the next line
+    assert all(data[offset - 1:offset] == b'\n' for offset in offsets[1:-1])
+    expected = list(iter_file_lines(txt_file))
+    # a small chunk size puts chunk boundaries mid-line (and mid-character)
+    for chunk_size in (7, 64, 1 << 20):
+        lines = [line for start, end in zip(offsets, offsets[1:])
+                 for line in iter_file_lines(txt_file, chunk_size, start, end)]
+        assert lines == expected
+
+
+def test_file_lines_are_streamed_in_chunks(tmp_path):
+    txt_file = tmp_path / 'standin.txt'
+    txt_file.write_bytes('añb\r\n\nc ✓ d\nno newline'.encode(
+        getpreferredencoding(False)))
+    for chunk_size in (1, 2, 3, 5, 100):
+        assert list(iter_file_lines(str(txt_file), chunk_size)) == \
+            ['añb', '', 'c ✓ d', 'no newline']
@@ -0,0 +1,57 @@
+from os import path
+import api_handler
+from scrobble_writer import ScrobbleWriter
+
+
+def test_resumed_fetch_matches_an_uninterrupted_one(standin, saved_lines,
+                                                    fail_recent_tracks,
+                                                    monkeypatch, capsys):
+    # small windows fetched one at a time, so the fetch fails after a few
+    # windows have been written
+    monkeypatch.setattr(api_handler, 'FETCH_WORKERS', 1)
+    monkeypatch.setattr(api_handler, 'PAGES_PER_WINDOW', 2)
+    api_handler.fetch_scrobbled_data('uninterrupted')
+    # interrupt the full fetch a few pages in, then resume it
+    fail_recent_tracks.num_requests = 0
+    fail_recent_tracks.num_ok = 6
+    api_handler.fetch_scrobbled_data('interrupted')
+    txt_file = api_handler.get_path('scrobbled_data', 'interrupted.txt')
+    assert path.exists(path.join(path.dirname(txt_file),
+                                 'interrupted.checkpoint.json'))
+    assert saved_lines('interrupted') == []
+    fail_recent_tracks.num_ok = None
+    api_handler.fetch_scrobbled_data('interrupted')
+    assert saved_lines('interrupted') == saved_lines('uninterrupted')
+    assert saved_lines('interrupted') == standin.history.lines()
+
+
+def test_resume_drops_what_was_written_after_the_checkpoint(tmp_path):
+    target_file = tmp_path / 'user.txt'
+    target_file.write_text('old\n')
+    writer = ScrobbleWriter(str(target_file), buffer_size=2)
+    writer.write_page(['c', 'b'], {'page': 1})
+    writer.write_page(['a'], {'page': 2})  # still buffered
+    # a crash mid-write leaves a partial block past the checkpoint
+    with open(tmp_path / 'user.staging.txt', 'a') as f:
+        f.write('partial blo')
+    writer = ScrobbleWriter(str(target_file), buffer_size=2)
+    assert writer.resume() == {'page': 1}
+    assert (tmp_path / 'user.staging.txt').read_text() == 'c\nb\n'
+    # the target file is only replaced on commit
+    assert target_file.read_text() == 'old\n'
+    writer.write_page(['a'], {'page': 2})
+    writer.commit()
+    assert target_file.read_text() == 'c\nb\na\n'
+    assert not (tmp_path / 'user.staging.txt').exists()
+    assert not (tmp_path / 'user.checkpoint.json').exists()
+    assert ScrobbleWriter(str(target_file)).resume() is None
+
+
+def test_discard_leaves_the_target_file_alone(tmp_path):
+    target_file = tmp_path / 'user.txt'
+    target_file.write_text('old\n')
+    writer = ScrobbleWriter(str(target_file), buffer_size=1)
+    writer.write_page(['new'], {'page': 1})
+    writer.discard()
+    assert target_file.read_text() == 'old\n'
+    assert ScrobbleWriter(str(target_file)).resume() is None
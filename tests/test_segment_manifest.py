@@ -0,0 +1,50 @@
+from segment_manifest import SegmentManifest
+
+
+def _add_segment(manifest, lines, newest_uts):
+    segment_file = manifest.next_segment_file()
+    with open(segment_file, 'w') as f:
+        f.writelines(f'{line}\n' for line in lines)
+    manifest.add_segment(segment_file, len(lines), newest_uts)
+    return segment_file
+
+
+def test_segments_are_numbered_in_order(tmp_path):
+    base_file = tmp_path / 'user.txt'
+    base_file.write_text('base\n')
+    manifest = SegmentManifest(str(base_file))
+    assert manifest.segment_files() == [str(base_file)]
+    first = _add_segment(manifest, ['one'], 1)
+    second = _add_segment(manifest, ['two'], 2)
+    assert first == str(tmp_path / 'user.0001.txt')
+    assert second == str(tmp_path / 'user.0002.txt')
+    assert manifest.next_segment_file() == str(tmp_path / 'user.0003.txt')
+    # the manifest on disk lists the segments newest-first
+    manifest = SegmentManifest(str(base_file))
+    assert manifest.segment_files() == [second, first, str(base_file)]
+    assert manifest.get_newest_uts() == 2
+    assert list(manifest.iter_lines()) == ['two', 'one', 'base']
+
+
+def test_newer_segments_are_compacted_at_max_segments(tmp_path):
+    base_file = tmp_path / 'user.txt'
+    base_file.write_text('base\n')
+    manifest = SegmentManifest(str(base_file))
+    max_segments = SegmentManifest.MAX_SEGMENTS
+    for i in range(1, max_segments - 1):
+        _add_segment(manifest, [f'line {i}'], i)
+    assert len(manifest.segment_files()) == max_segments - 1
+    # one more segment reaches the limit and merges everything but the base
+    _add_segment(manifest, [f'line {max_segments - 1}'], max_segments - 1)
+    merged_file = str(tmp_path / f'user.{max_segments:04d}.txt')
+    assert manifest.segment_files() == [merged_file, str(base_file)]
+    assert sorted(p.name for p in tmp_path.glob('*.txt')) == \
+        [f'user.{max_segments:04d}.txt', 'user.txt']
+    expected = [f'line {i}' for i in range(max_segments - 1, 0, -1)]
+    assert list(manifest.iter_lines()) == expected + ['base']
+    assert base_file.read_text() == 'base\n'
+    manifest = SegmentManifest(str(base_file))
+    assert manifest.segment_files() == [merged_file, str(base_file)]
+    assert manifest.get_newest_uts() == max_segments - 1
+    assert manifest.next_segment_file() == \
+        str(tmp_path / f'user.{max_segments + 1:04d}.txt')